@@ -1,3 +1,20 @@
 from .games import *
 from .mcts_tree import *
-from .alphago import *
+
+# alphago.alphago imports TensorFlow, so its names are only imported when
+# first used. Importing a submodule, e.g. alphago.numpy_estimator in a
+# self-play worker, then doesn't import TensorFlow.
+_alphago_names = ["train_alphago", "self_play", "batched_self_play",
+                  "process_self_play_data", "process_training_data",
+                  "GatingResult", "evaluate_model"]
+
+
+def __getattr__(name):
+    if name in _alphago_names:
+        from . import alphago
+        return getattr(alphago, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_alphago_names))
@@ -1,16 +1,25 @@
+import os
 from collections import OrderedDict
+from typing import NamedTuple, Optional
 
-import numpy as np
 from tqdm import tqdm
 import tensorflow as tf
 
-from .player import MCTSPlayer, RandomPlayer, OptimalPlayer
-from .evaluator import evaluate
-from .mcts_tree import MCTSNode, mcts
-from .utilities import sample_distribution
+from .evaluator import (evaluate_estimators_in_both_positions,
+                        evaluate_mcts_against_optimal_player,
+                        evaluate_mcts_against_random_player, play_sprt_match)
+from .game_store import GameStore
+from .replay_buffer import PrioritizedReplayBuffer, ReplayBuffer
+from .self_play_games import (batched_self_play, canonical_estimate_fn,
+                              process_self_play_data, self_play)
+from .self_play_pool import SelfPlayPool
+from .sprt import SPRT
+from .training_state import (SnapshotWriter, capture_training_state,
+                             load_training_state, restore_training_state)
 
-__all__ = ["train_alphago", "self_play", "process_self_play_data",
-           "process_training_data"]
+__all__ = ["train_alphago", "self_play", "batched_self_play",
+           "process_self_play_data", "process_training_data", "GatingResult",
+           "evaluate_model"]
 
 
 def compute_checkpoint_name(step, path):
@@ -22,7 +31,12 @@ def train_alphago(game, create_estimator, self_play_iters, training_iters,
                   evaluate_every=1, batch_size=32, mcts_iters=100, c_puct=1.0,
                   replay_length=100000, num_evaluate_games=500,
                   win_rate=0.55, verbose=True, restore_step=None,
-                  self_play_file_path=None):
+                  self_play_file_path=None, num_self_play_workers=0,
+                  num_parallel_games=1, sprt_margin=0.05, sprt_alpha=0.05,
+                  sprt_beta=0.05, num_random_games=0, snapshot_path=None,
+                  snapshot_every=1, deduplicate_positions=False,
+                  canonicalize_positions=False, prioritized_replay=False,
+                  full_search_fraction=1.0, fast_mcts_iters=None):
     """Trains AlphaGo on the game.
 
     Parameters
@@ -54,7 +68,8 @@ def train_alphago(game, create_estimator, self_play_iters, training_iters,
         The amount of training data to use. Only train on the most recent
         training data.
     num_evaluate_games: int
-        Number of games to evaluate the players for.
+        Number of games to evaluate the players for, in each position.
+        With sequential gating this is the maximum.
     win_rate: float
         Number between 0 and 1. Only update self-play player when training
         player beats self-play player by at least this rate.
@@ -63,9 +78,68 @@ def train_alphago(game, create_estimator, self_play_iters, training_iters,
     restore_step: int or None
         If given, restore the network from the checkpoint at this step.
     self_play_file_path: str or None
-        Where to load self play data from, if given.
+        If given, a directory in which to store all self-play positions
+        (see `alphago.game_store`). Positions already stored there are
+        loaded into the replay buffer at the start, so training can be
+        resumed with the data of an earlier run.
+    num_self_play_workers: int
+        If greater than 0, self-play games are played in parallel by
+        this many worker processes. The estimator must have a NumPy
+        counterpart (see `alphago.numpy_estimator`).
+    num_parallel_games: int
+        If greater than 1 (and no worker processes are used), this many
+        self-play games are played in lockstep, evaluating the leaves of
+        their searches in a single batch.
+    sprt_margin: float or None
+        If given, gating stops as soon as a sequential probability ratio
+        test decides whether the training player's win + draw rate is
+        above win_rate + sprt_margin or below win_rate - sprt_margin.
+        If None, all num_evaluate_games games are played.
+    sprt_alpha, sprt_beta: float
+        The error rates of the sequential test: the probabilities of
+        accepting a player below, and rejecting a player above, the
+        indifference region.
+    num_random_games: int
+        Number of games, in each position, to play the training player
+        against a random player at each evaluation. If 0, this check is
+        skipped.
+    snapshot_path: str or None
+        If given, a file to which the full training state (both nets,
+        the optimiser's momentum, the replay buffer and the random
+        states, see `alphago.training_state`) is written in the
+        background every snapshot_every steps. If the file exists, the
+        run resumes from the step after the snapshot, taking precedence
+        over restore_step and self_play_file_path, and runs only the
+        steps remaining of the alphago_steps, so that an interrupted and
+        resumed run ends at the same step as an uninterrupted one.
+        Self-play worker processes draw fresh seeds for their games
+        after a resume.
+    snapshot_every: int
+        Write a snapshot every snapshot_every steps.
+    deduplicate_positions: bool
+        Whether the replay buffer merges repeated positions, sampling
+        them in proportion to their number of occurrences (see
+        `alphago.replay_buffer`).
+    canonicalize_positions: bool
+        Whether self-play positions are stored with canonical states,
+        so that symmetric positions are merged too. The nets then only
+        learn canonical states, so self-play and evaluation also
+        evaluate each state in its canonical orientation.
+    prioritized_replay: bool
+        Whether to sample training positions by their most recent loss,
+        correcting the loss with importance-sampling weights (see
+        `alphago.replay_buffer.PrioritizedReplayBuffer`).
+    full_search_fraction: float
+        The fraction of self-play moves that get a full search of
+        mcts_iters iterations and are used as policy targets. The other
+        moves get a fast search and only train the value (see
+        `self_play`).
+    fast_mcts_iters: int or None
+        Number of iterations of a fast search, at least 2. Defaults to a
+        sixth of mcts_iters.
     """
-    # TODO: Do self-play, training and evaluating in parallel.
+    # See alphago.async_training for a version that does self-play,
+    # training and evaluation in parallel.
 
     # We use a fixed estimator (the best one that's been trained) to
     # generate self-play training data. We then train the training estimator
@@ -108,90 +182,217 @@ def train_alphago(game, create_estimator, self_play_iters, training_iters,
         training_estimator.restore(restore_path)
 
     all_losses = []
-    self_play_data = None
+    # Only the most recent replay_length positions are trained on.
+    replay_buffer_class = PrioritizedReplayBuffer if prioritized_replay else ReplayBuffer
+    replay_buffer = replay_buffer_class(replay_length,
+                                        deduplicate=deduplicate_positions)
+    game_store = None
+    if self_play_file_path is not None:
+        game_store = GameStore(self_play_file_path)
+        game_store.fill_replay_buffer(replay_buffer)
+        if verbose:
+            print("Loaded {} positions from {}.".format(len(replay_buffer),
+                                                        self_play_file_path))
 
     initial_step = restore_step + 1 if restore_step else 0
-    for alphago_step in range(initial_step, initial_step + alphago_steps):
-
-        self_play_data = generate_self_play_data(
-            game, self_play_estimator, mcts_iters, c_puct, self_play_iters,
-            verbose=verbose, data=self_play_data)
-
-        training_data = process_training_data(self_play_data, replay_length)
-        if len(training_data) < 100:
-            continue
-        optimise_estimator(training_estimator, training_data, batch_size,
-                           training_iters, writer=writer, verbose=verbose)
-
-        # Evaluate the players and choose the best.
-        if alphago_step % evaluate_every == 0:
-            success_rate, success_rate_random = \
-                evaluate_model(game, self_play_estimator,
-                               training_estimator, mcts_iters, c_puct,
-                               num_evaluate_games, verbose=verbose)
-
-            summary = sess.run(merged_summary,
-                               feed_dict=
-                               {tf_success_rate: success_rate,
-                                tf_success_rate_random: success_rate_random})
-            writer.add_summary(summary, training_estimator.global_step)
-
-            checkpoint_model(training_estimator, alphago_step, checkpoint_path)
-
-            # If training player beats self-play player by a large enough
-            # margin, then it becomes the new best estimator.
-            if success_rate > win_rate:
-                # Create a new self player, with the weights of the most
-                # recent training_estimator.
-                if verbose:
-                    print("Updating self-play player.")
-                    print("Restoring from step: {}".format(alphago_step))
-                self_play_estimator = create_estimator()
-                restore_path = compute_checkpoint_name(alphago_step,
-                                                       checkpoint_path)
-                self_play_estimator.restore(restore_path)
+    # A run resumed from a snapshot stops where the uninterrupted run would.
+    final_step = initial_step + alphago_steps
+    snapshot_writer = None
+    if snapshot_path is not None:
+        if snapshot_every < 1:
+            raise ValueError("`snapshot_every` must be at least 1.")
+        if os.path.exists(snapshot_path):
+            replay_buffer = replay_buffer_class(
+                replay_length, deduplicate=deduplicate_positions)
+            initial_step = 1 + restore_training_state(
+                load_training_state(snapshot_path), training_estimator,
+                self_play_estimator, replay_buffer)
+            if verbose:
+                print("Resumed from the snapshot after step {}.".format(
+                    initial_step - 1))
+        snapshot_writer = SnapshotWriter()
+
+    pool = None
+    if num_self_play_workers > 0:
+        pool = SelfPlayPool(game, num_self_play_workers, mcts_iters, c_puct,
+                            canonicalize=canonicalize_positions,
+                            full_search_fraction=full_search_fraction,
+                            fast_mcts_iters=fast_mcts_iters)
+    try:
+        for alphago_step in range(initial_step, final_step):
+
+            generate_self_play_data(
+                game, self_play_estimator, mcts_iters, c_puct, self_play_iters,
+                verbose=verbose, replay_buffer=replay_buffer, pool=pool,
+                num_parallel_games=num_parallel_games, game_store=game_store,
+                canonicalize=canonicalize_positions,
+                full_search_fraction=full_search_fraction,
+                fast_mcts_iters=fast_mcts_iters)
+
+            # Training starts once there are enough positions.
+            if len(replay_buffer) >= 100:
+                prefetch_stats = optimise_estimator(
+                    training_estimator, replay_buffer, batch_size, training_iters,
+                    writer=writer, verbose=verbose)
+                if verbose and prefetch_stats is not None:
+                    print("Waited for training batches on {:.0%} of steps.".format(
+                        prefetch_stats.starvation_fraction))
+
+                # Evaluate the players and choose the best.
+                if alphago_step % evaluate_every == 0:
+                    sprt = None
+                    if sprt_margin is not None:
+                        sprt = SPRT.for_win_rate(win_rate, sprt_margin,
+                                                 alpha=sprt_alpha, beta=sprt_beta)
+                    gating_result = evaluate_model(
+                        game, self_play_estimator, training_estimator, mcts_iters,
+                        c_puct, num_evaluate_games, verbose=verbose,
+                        win_rate=win_rate, sprt=sprt,
+                        num_random_games=num_random_games,
+                        canonicalize=canonicalize_positions)
+
+                    if gating_result.success_rate_random is not None:
+                        summary = sess.run(merged_summary, feed_dict={
+                            tf_success_rate: gating_result.success_rate,
+                            tf_success_rate_random: gating_result.success_rate_random})
+                    else:
+                        summary = sess.run(success_rate_summary, feed_dict={
+                            tf_success_rate: gating_result.success_rate})
+                    writer.add_summary(summary, training_estimator.global_step)
+
+                    checkpoint_model(training_estimator, alphago_step, checkpoint_path)
+
+                    # If training player beats self-play player by a large enough
+                    # margin, then it becomes the new best estimator.
+                    if gating_result.accepted:
+                        # Copy the weights of the most recent training_estimator
+                        # into the self-play estimator in place.
+                        if verbose:
+                            print("Updating self-play player.")
+                            print("Copying weights from step: {}".format(alphago_step))
+                        self_play_estimator.copy_from(training_estimator)
+
+            if (snapshot_writer is not None and
+                    (alphago_step + 1) % snapshot_every == 0):
+                snapshot_writer.write(
+                    capture_training_state(alphago_step, training_estimator,
+                                           self_play_estimator, replay_buffer),
+                    snapshot_path)
+    finally:
+        if pool is not None:
+            pool.close()
+        if snapshot_writer is not None:
+            snapshot_writer.close()
 
     return all_losses
 
 
 def optimise_estimator(estimator, training_data, batch_size, training_iters,
-                       mode='reinforcement', writer=None, verbose=True):
-    summary = estimator.train(training_data, batch_size, training_iters,
-                              mode=mode, writer=writer, verbose=verbose)
-    return summary
+                       mode='reinforcement', writer=None, verbose=True,
+                       prefetch=2):
+    prefetch_stats = estimator.train(training_data, batch_size, training_iters,
+                                     mode=mode, writer=writer, verbose=verbose,
+                                     prefetch=prefetch)
+    return prefetch_stats
+
+
+class GatingResult(NamedTuple):
+    success_rate: float
+    success_rate_random: Optional[float]
+    accepted: bool
+    games_played: int
+    games_saved: int
 
 
 def evaluate_model(game, player1, player2, mcts_iters, c_puct, num_games,
-                   verbose=True):
-    # Checkpoint the model.
-    # TODO: Implement evaluation
+                   verbose=True, win_rate=0.55, sprt=None, num_random_games=0,
+                   canonicalize=False):
+    """Decides whether the training estimator, player2, should replace
+    the self-play estimator, player1.
+
+    Parameters
+    ----------
+    game: Game
+        The game to evaluate on.
+    player1, player2:
+        The self-play and training estimators.
+    mcts_iters: int
+        Number of iterations to run MCTS for.
+    c_puct: float
+        Parameter for MCTS.
+    num_games: int
+        The number of games to play in each position. If sprt is given,
+        this is the maximum.
+    verbose: bool
+        Whether or not to output progress.
+    win_rate: float
+        player2 is accepted if its win + draw rate exceeds this.
+    sprt: SPRT or None
+        If given, the players alternate positions and the match stops as
+        soon as the sequential test decides. If the test is still
+        undecided after num_games games in each position, the success
+        rate is compared to win_rate.
+    num_random_games: int
+        The number of games in each position to play player2 against a
+        random player, as a sanity check. If 0, this is skipped.
+    canonicalize: bool
+        Whether the players evaluate each state in its canonical
+        orientation, for estimators trained on canonical states.
+
+    Returns
+    -------
+    GatingResult:
+        The win + draw rate of player2, its win + draw rate against the
+        random player (or None), whether player2 is accepted, the number
+        of games played, and the number of games saved compared to
+        playing num_games games in each position both against player1
+        and against the random player.
+    """
     # TODO: Choose tau more systematically.
+    estimate_fn1 = player1.create_estimate_fn()
+    estimate_fn2 = player2.create_estimate_fn()
+    if canonicalize:
+        estimate_fn1 = canonical_estimate_fn(game, estimate_fn1)
+        estimate_fn2 = canonical_estimate_fn(game, estimate_fn2)
 
     if verbose:
         print("Evaluating. Self-player vs training, then training vs "
               "self-player")
-    wins1, wins2, draws = evaluate_estimators_in_both_positions(
-        game, player1.create_estimate_fn(), player2.create_estimate_fn(),
-        mcts_iters, c_puct, num_games, tau=0.01, verbose=verbose)
+    if sprt is not None:
+        wins1, wins2, draws = play_sprt_match(
+            game, estimate_fn1, estimate_fn2, mcts_iters, c_puct, 2 * num_games,
+            sprt, tau=0.01, verbose=verbose)
+    else:
+        wins1, wins2, draws = evaluate_estimators_in_both_positions(
+            game, estimate_fn1, estimate_fn2, mcts_iters, c_puct, num_games,
+            tau=0.01, verbose=verbose)
+    games_played = wins1 + wins2 + draws
 
     if verbose:
         print("Self-play player wins: {}, Training player wins: {}, "
               "Draws: {}".format(wins1, wins2, draws))
 
-    success_rate = (wins2 + draws) / (wins1 + wins2 + draws)
+    success_rate = (wins2 + draws) / games_played
+    if sprt is not None and sprt.decision is not None:
+        accepted = sprt.decision
+    else:
+        accepted = success_rate > win_rate
     if verbose:
         print("Win + draw rate for training player: {}".format(
               success_rate))
 
     # Also evaluate against a random player
-    wins1, wins2, draws = evaluate_mcts_against_random_player(
-        game, player2.create_estimate_fn(), mcts_iters, c_puct, num_games,
-        tau=0.01, verbose=verbose)
-    success_rate_random = (wins1 + draws) / (wins1 + wins2 + draws)
-
-    if verbose:
-        print("Training player vs random. Wins: {}, Losses: {}, "
-              "Draws: {}".format(wins1, wins2, draws))
+    success_rate_random = None
+    if num_random_games > 0:
+        wins1, wins2, draws = evaluate_mcts_against_random_player(
+            game, estimate_fn2, mcts_iters, c_puct, num_random_games,
+            tau=0.01, verbose=verbose)
+        success_rate_random = (wins1 + draws) / (wins1 + wins2 + draws)
+        games_played += wins1 + wins2 + draws
+
+        if verbose:
+            print("Training player vs random. Wins: {}, Losses: {}, "
+                  "Draws: {}".format(wins1, wins2, draws))
 
     ## Also evaluate against an optimal player
     #wins1, wins2, draws = evaluate_mcts_against_optimal_player(
@@ -203,8 +404,13 @@ def evaluate_model(game, player1, player2, mcts_iters, c_puct, num_games,
     #    print("Training player vs optimal. Wins: {}, Losses: {}, "
     #          "Draws: {}".format(wins1, wins2, draws))
 
-    #return success_rate, success_rate_random, success_rate_optimal
-    return success_rate, success_rate_random
+    games_saved = 4 * num_games - games_played
+    if verbose:
+        print("Played {} evaluation games, saving {}.".format(
+            games_played, games_saved))
+
+    return GatingResult(success_rate, success_rate_random, accepted,
+                        games_played, games_saved)
 
 
 def checkpoint_model(player, step, path):
@@ -214,88 +420,36 @@ def checkpoint_model(player, step, path):
     player.save(checkpoint_name)
 
 
-def evaluate_mcts_against_optimal_player(game, estimator, mcts_iters,
-                                         c_puct, num_evaluate_games, tau,
-                                         verbose=True):
-    # Evaluate estimator1 vs estimator2.
-    players = {1: MCTSPlayer(game, estimator, mcts_iters, c_puct, tau=tau),
-               2: OptimalPlayer(game)}
-    player1_results, _ = evaluate(game, players, num_evaluate_games,
-                                  verbose=verbose)
-    wins1 = player1_results[1]
-    wins2 = player1_results[-1]
-    draws = player1_results[0]
-
-    # Evaluate estimator2 vs estimator1.
-    players = {1: OptimalPlayer(game),
-               2: MCTSPlayer(game, estimator, mcts_iters, c_puct, tau=tau)}
-    player1_results, _ = evaluate(game, players, num_evaluate_games,
-                                  verbose=verbose)
-    wins1 += player1_results[-1]
-    wins2 += player1_results[1]
-    draws += player1_results[0]
-
-    return wins1, wins2, draws
-
-
-def evaluate_mcts_against_random_player(game, estimator, mcts_iters,
-                                        c_puct, num_evaluate_games, tau,
-                                        verbose=True):
-    # Evaluate estimator1 vs estimator2.
-    players = {1: MCTSPlayer(game, estimator, mcts_iters, c_puct, tau=tau),
-               2: RandomPlayer(game)}
-    player1_results, _ = evaluate(game, players, num_evaluate_games,
-                                  verbose=verbose)
-    wins1 = player1_results[1]
-    wins2 = player1_results[-1]
-    draws = player1_results[0]
-
-    # Evaluate estimator2 vs estimator1.
-    players = {1: RandomPlayer(game),
-               2: MCTSPlayer(game, estimator, mcts_iters, c_puct, tau=tau)}
-    player1_results, _ = evaluate(game, players, num_evaluate_games,
-                                  verbose=verbose)
-    wins1 += player1_results[-1]
-    wins2 += player1_results[1]
-    draws += player1_results[0]
-
-    return wins1, wins2, draws
-
-
-def evaluate_estimators_in_both_positions(game, estimator1, estimator2,
-                                          mcts_iters, c_puct,
-                                          num_evaluate_games, tau,
-                                          verbose=True):
-    # Evaluate estimator1 vs estimator2.
-    players = {1: MCTSPlayer(game, estimator1, mcts_iters, c_puct, tau=tau),
-               2: MCTSPlayer(game, estimator2, mcts_iters, c_puct, tau=tau)}
-    player1_results, _ = evaluate(game, players, num_evaluate_games,
-                                  verbose=verbose)
-    wins1 = player1_results[1]
-    wins2 = player1_results[-1]
-    draws = player1_results[0]
-
-    # Evaluate estimator2 vs estimator1.
-    players = {1: MCTSPlayer(game, estimator2, mcts_iters, c_puct, tau=tau),
-               2: MCTSPlayer(game, estimator1, mcts_iters, c_puct, tau=tau)}
-    player1_results, _ = evaluate(game, players, num_evaluate_games,
-                                  verbose=verbose)
-    wins1 += player1_results[-1]
-    wins2 += player1_results[1]
-    draws += player1_results[0]
-
-    return wins1, wins2, draws
-
-
 def generate_self_play_data(game, estimator, mcts_iters, c_puct, num_iters,
-                            data=None, verbose=True):
+                            data=None, verbose=True, replay_buffer=None,
+                            pool=None, num_parallel_games=1, game_store=None,
+                            canonicalize=False, full_search_fraction=1.0,
+                            fast_mcts_iters=None):
     """Generates self play data for a number of iterations for a given
-    estimator. Saves to save_file_path, if given.
+    estimator.
+
+    If replay_buffer is given, the positions from each game are added to
+    it, and it is returned. Otherwise, the game logs are added to data,
+    a dictionary with keys the game indices, which is returned.
+
+    If pool, a SelfPlayPool, is given, the games are played by its
+    worker processes, and the game logs are added in the order the games
+    finish. Otherwise, if num_parallel_games is greater than 1, that many
+    games are played in lockstep by `batched_self_play`.
+
+    If game_store, a GameStore, is given, each game is also appended to
+    it, tagged with the estimator's weights version, and the store is
+    flushed once all the games have been played.
+
+    If canonicalize is True, the positions are stored with canonical
+    states (see `process_self_play_data`), and states are evaluated in
+    their canonical orientation. If full_search_fraction is
+    less than 1, only that fraction of moves get a full search and a
+    policy target, and the rest get a fast search of fast_mcts_iters
+    iterations (see `self_play`). A pool uses its own settings for
+    both.
     """
-    # if save_file_path is not None:
-    #     with open(save_file_path, 'r') as f:
-    #         data = json.load(save_file_path)
-    #     index = max(data.keys()) + 1
+    weights_version = getattr(estimator, 'weights_version', 0)
     if data is not None:
         index = max(data.keys()) + 1
     else:
@@ -303,76 +457,35 @@ def generate_self_play_data(game, estimator, mcts_iters, c_puct, num_iters,
         index = 0
 
     # Collect self-play training data using the best estimator.
-    disable_tqdm = False if verbose else True
-    for _ in tqdm(range(num_iters), disable=disable_tqdm):
-        data[index] = self_play(
-            game, estimator.create_estimate_fn(), mcts_iters, c_puct)
-        index += 1
-
-    # if save_file_path is not None:
-    #     with open(save_file_path, 'w') as f:
-    #         json.dump(data, f)
-
-    return data
-
-
-def self_play(game, estimator, mcts_iters, c_puct):
-    """Plays a single game using MCTS to choose actions for both players.
-
-    Parameters
-    ----------
-    game: Game
-        An object representing the game to be played.
-    estimator: func
-        An estimate function.
-    mcts_iters: int
-        Number of iterations to run MCTS for.
-    c_puct: float
-        Parameter for MCTS.
-
-    Returns
-    -------
-    game_state_list: list
-        A list of game states encountered in the self-play game. Starts
-        with the initial state and ends with a terminal state.
-    action_probs_list: list
-        A list of action probability dictionaries, as returned by MCTS
-        each time the algorithm has to take an action. The ith action
-        probabilities dictionary corresponds to the ith game_state, and
-        action_probs_list has length one less than game_state_list,
-        since we don't have to move in a terminal state.
-    """
-    node = MCTSNode(game.initial_state, game.current_player(game.initial_state))
-
-    game_state_list = [node.game_state]
-    action_probs_list = []
-    action_list = []
-
-    move_count = 0
-
-    while not node.is_terminal:
-        # TODO: Choose this better.
-        tau = 1
-        if move_count >= 10:
-            tau = 1 / (move_count - 10 + 1)
-
-        # First run MCTS to compute action probabilities.
-        action_probs = mcts(node, game, estimator, mcts_iters, c_puct, tau=tau)
-
-        # Choose the action according to the action probabilities.
-        action = sample_distribution(action_probs)
-        action_list.append(action)
+    if pool is not None:
+        game_logs = pool.play(estimator, num_iters)
+    elif num_parallel_games > 1:
+        game_logs = batched_self_play(
+            game, estimator, mcts_iters, c_puct, num_iters, num_parallel_games,
+            canonicalize=canonicalize, full_search_fraction=full_search_fraction,
+            fast_mcts_iters=fast_mcts_iters)
+    else:
+        game_logs = (self_play(game, estimator.create_estimate_fn(), mcts_iters,
+                               c_puct, canonicalize=canonicalize,
+                               full_search_fraction=full_search_fraction,
+                               fast_mcts_iters=fast_mcts_iters)
+                     for _ in range(num_iters))
 
-        # Play the action
-        node = node.children[action]
+    disable_tqdm = False if verbose else True
+    for game_log in tqdm(game_logs, total=num_iters, disable=disable_tqdm):
+        if game_store is not None:
+            game_store.append_game(game_log, weights_version)
+        if replay_buffer is not None:
+            replay_buffer.extend(game_log, weights_version)
+        else:
+            data[index] = game_log
+            index += 1
 
-        # Add the action probabilities and game state to the list.
-        action_probs_list.append(action_probs)
-        game_state_list.append(node.game_state)
-        move_count += 1
+    if game_store is not None:
+        game_store.flush()
 
-    data = process_self_play_data(game_state_list, action_list,
-                                  action_probs_list, game, game.action_indices)
+    if replay_buffer is not None:
+        return replay_buffer
 
     return data
 
@@ -393,7 +506,7 @@ def process_training_data(self_play_data, replay_length=None):
     """
     training_data = []
     for index, game_log in self_play_data.items():
-        for (state, action, probs_vector, z) in game_log:
+        for (state, action, probs_vector, z, *_) in game_log:
             training_data.append((state, probs_vector, z))
     
     print("Training data length: {}".format(len(training_data)))
@@ -403,64 +516,3 @@ def process_training_data(self_play_data, replay_length=None):
         training_data = training_data[-replay_length:]
 
     return training_data
-
-
-def process_self_play_data(states_, actions_, action_probs_, game,
-                           action_indices):
-    """Takes a list of states and action probabilities, as returned by
-    play, and creates training data from this. We build up a list
-    consisting of (state, probs, z) tuples, where player is the player
-    in state 'state', and 'z' is the utility to 'player' in 'last_state'.
-
-    We omit the terminal state from the list as there are no probabilities to
-    train. TODO: Potentially include the terminal state in order to train the
-    value. # TODO: why the underscores in the parameter names?
-
-    Parameters
-    ----------
-    states_: list
-        A list of n states, with the last being terminal.
-    actions_: list
-        A list of n-1 actions, being the action taken in the corresponding
-        state.
-    action_probs_: list
-        A list of n-1 dictionaries containing action probabilities. The ith
-        dictionary applies to the ith state, representing the probabilities
-        returned by play of taking each available action in the state.
-    game: Game
-        An object representing the game to be played.
-    action_indices: dict
-        A dictionary mapping actions (in the form of the legal_actions
-        function) to action indices (to be used for training the neural
-        network).
-
-    Returns
-    -------
-    training_data: list
-        A list consisting of (state, action, probs, z) tuples, where player
-        is the player in state 'state', and 'z' is the utility to 'player' in
-        'last_state'.
-    """
-
-    # Get the outcome for the game. This should be the last state in states_.
-    last_state = states_.pop()
-    outcome = game.utility(last_state)
-
-    # Now action_probs_ and states_ are the same length.
-    training_data = []
-    for state, action, probs in zip(states_, actions_, action_probs_):
-        # Get the player in the state, and the value to this player of the
-        # terminal state.
-        player = game.current_player(state)
-        z = outcome[player]
-
-        # Convert the probs dictionary to a numpy array using action_indices.
-        probs_vector = np.zeros(len(action_indices))
-        for a, prob in probs.items():
-            probs_vector[action_indices[a]] = prob
-
-        non_nan_state = np.nan_to_num(state)
-
-        training_data.append((non_nan_state, action, probs_vector, z))
-
-    return training_data
@@ -0,0 +1,349 @@
+"""Asynchronous AlphaGo training
+
+This module runs the three parts of AlphaGo training at the same time,
+rather than one after another as `train_alphago` does:
+
+* Actor processes repeatedly play self-play games with the most recently
+  accepted weights, tagging each game with the version of the weights
+  that played it.
+* The learner, in the calling process, adds the games to the replay
+  buffer as they arrive and trains on the buffer continuously.
+* An evaluator process plays each candidate sent by the learner against
+  the accepted weights, and accepts the candidate if it wins by a large
+  enough margin. The actors pick up the new weights before their next
+  game.
+
+Weights are passed between processes as NumPy .npz files (see
+`alphago.numpy_estimator`), so only the learner uses TensorFlow. The
+accepted weights with version v are stored in ``accepted{v}.npz``, and
+version 0 is the learner's initial weights.
+
+Because the actors never wait for the learner, the games in the replay
+buffer may have been played by weights several versions older than the
+latest. This staleness is reported in `AsyncTrainingStats`.
+
+The actors and the evaluator only stop when the learner does, so if one
+of them exits early, e.g. because it raised an exception, the learner
+raises rather than waiting for games or results that will never come.
+
+Classes
+-------
+GameRecord
+    A self-play game together with the weights version that played it.
+EvaluationRecord
+    The result of evaluating a candidate.
+AsyncTrainingStats
+    A summary of an asynchronous training run.
+
+Functions
+---------
+train_alphago_async
+    Train AlphaGo with asynchronous actors, learner and evaluator.
+"""
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import tempfile
+from typing import Any, List, NamedTuple, Tuple
+
+import numpy as np
+
+from .evaluator import evaluate_estimators_in_both_positions
+from .numpy_estimator import to_numpy_estimator
+from .replay_buffer import ReplayBuffer
+from .self_play_games import batched_self_play, self_play
+
+__all__ = ["GameRecord", "EvaluationRecord", "AsyncTrainingStats",
+           "train_alphago_async"]
+
+# How long the learner waits for a game before checking that the actors
+# and the evaluator are still running, in seconds.
+_POLL_INTERVAL = 1.0
+
+
+class GameRecord(NamedTuple):
+    weights_version: int
+    actor: int
+    game_log: List[Tuple]
+
+
+class EvaluationRecord(NamedTuple):
+    training_step: int
+    success_rate: float
+    accepted: bool
+    weights_version: int
+
+
+class AsyncTrainingStats(NamedTuple):
+    games: int
+    positions: int
+    training_steps: int
+    weights_version: int
+    evaluations: List[EvaluationRecord]
+    mean_game_staleness: float
+    max_game_staleness: int
+
+
+def _accepted_weights_file(weights_path: str, version: int) -> str:
+    return os.path.join(weights_path, 'accepted{}.npz'.format(version))
+
+
+def _check_processes(processes: List[Any]) -> None:
+    """Raise if any of the processes has exited."""
+    for process in processes:
+        if not process.is_alive():
+            raise RuntimeError("{} exited unexpectedly with exit code {}.".format(
+                process.name, process.exitcode))
+
+
+def _run_actor(actor, game, estimator_class, action_indices, weights_path,
+               accepted_version, stop, games, mcts_iters, c_puct,
+               num_parallel_games, seed) -> None:
+    """Play self-play games with the latest accepted weights until
+    stopped."""
+    random.seed(seed)
+    np.random.seed(seed)
+
+    version, estimator = None, None
+    while not stop.is_set():
+        if accepted_version.value != version:
+            version = accepted_version.value
+            estimator = estimator_class.load(
+                _accepted_weights_file(weights_path, version), action_indices)
+
+        if num_parallel_games > 1:
+            game_logs = batched_self_play(game, estimator, mcts_iters, c_puct,
+                                          num_parallel_games, num_parallel_games)
+        else:
+            game_logs = [self_play(game, estimator.create_estimate_fn(),
+                                   mcts_iters, c_puct)]
+        for game_log in game_logs:
+            games.put(GameRecord(version, actor, game_log))
+
+
+def _run_evaluator(game, estimator_class, action_indices, weights_path,
+                   accepted_version, candidates, evaluations, mcts_iters,
+                   c_puct, num_evaluate_games, win_rate, seed) -> None:
+    """Evaluate candidates against the accepted weights, accepting those
+    that win often enough, until a None candidate is received."""
+    random.seed(seed)
+    np.random.seed(seed)
+
+    while True:
+        candidate = candidates.get()
+        if candidate is None:
+            return
+        candidate_file, training_step = candidate
+
+        version = accepted_version.value
+        accepted = estimator_class.load(
+            _accepted_weights_file(weights_path, version), action_indices)
+        challenger = estimator_class.load(candidate_file, action_indices)
+        wins1, wins2, draws = evaluate_estimators_in_both_positions(
+            game, accepted.create_estimate_fn(), challenger.create_estimate_fn(),
+            mcts_iters, c_puct, num_evaluate_games, tau=0.01, verbose=False)
+        success_rate = (wins2 + draws) / (wins1 + wins2 + draws)
+
+        if success_rate > win_rate:
+            version += 1
+            os.replace(candidate_file,
+                       _accepted_weights_file(weights_path, version))
+            accepted_version.value = version
+        else:
+            os.remove(candidate_file)
+        evaluations.put(EvaluationRecord(training_step, success_rate,
+                                         success_rate > win_rate, version))
+
+
+def train_alphago_async(game, create_estimator, training_steps, training_iters,
+                        checkpoint_path, num_actors=2, batch_size=32,
+                        mcts_iters=100, c_puct=1.0, replay_length=100000,
+                        min_replay_length=100, num_evaluate_games=500,
+                        win_rate=0.55, num_parallel_games=1, weights_path=None,
+                        seed=None, verbose=True) -> AsyncTrainingStats:
+    """Trains AlphaGo on the game, with self-play, training and
+    evaluation running concurrently.
+
+    Parameters
+    ----------
+    game: Game
+        The game to train on. It must be picklable.
+    create_estimator: func
+        Creates a trainable estimator for the game. The estimator must
+        have a NumPy counterpart (see `alphago.numpy_estimator`).
+    training_steps: int
+        The number of times the learner trains for training_iters
+        iterations. After each, it adds any finished games to the
+        replay buffer and, if the evaluator is idle, sends it the
+        current weights as a candidate.
+    training_iters: int
+        Number of training iterations in each training step.
+    checkpoint_path: str
+        Where to save a checkpoint of each candidate to.
+    num_actors: int
+        The number of self-play processes.
+    batch_size: int
+        Batch size to train with.
+    mcts_iters: int
+        Number of iterations to run MCTS for.
+    c_puct: float
+        Parameter for MCTS.
+    replay_length: int
+        Only train on the most recent replay_length positions.
+    min_replay_length: int
+        The number of positions to wait for before training starts.
+    num_evaluate_games: int
+        Number of games to evaluate each candidate for, in each
+        position.
+    win_rate: float
+        Accept a candidate if its win + draw rate against the accepted
+        weights exceeds this.
+    num_parallel_games: int
+        If greater than 1, each actor plays this many games in lockstep
+        with `batched_self_play`.
+    weights_path: str or None
+        The directory to exchange weights through. If None, a temporary
+        directory is used.
+    seed: int or None
+        Seeds the actors and evaluator.
+    verbose: bool
+        Whether or not to output progress.
+
+    Returns
+    -------
+    AsyncTrainingStats:
+        The number of games and positions received, the number of
+        training steps taken, the final accepted weights version, the
+        result of each evaluation, and the mean and maximum number of
+        versions by which the weights that played each game lagged
+        behind the accepted weights when the game was received.
+
+    Raises
+    ------
+    RuntimeError:
+        If an actor or the evaluator exits before training finishes.
+    """
+    from .alphago import checkpoint_model
+
+    if num_actors < 1:
+        raise ValueError("`num_actors` must be at least 1.")
+
+    training_estimator = create_estimator()
+    initial_weights = to_numpy_estimator(training_estimator)
+    estimator_class = type(initial_weights)
+    action_indices = training_estimator.action_indices
+
+    remove_weights_path = weights_path is None
+    if remove_weights_path:
+        weights_path = tempfile.mkdtemp(prefix='async_weights')
+    initial_weights.save(_accepted_weights_file(weights_path, 0))
+
+    seeds = np.random.RandomState(seed).randint(2 ** 31, size=num_actors + 1)
+    context = multiprocessing.get_context('spawn')
+    accepted_version = context.Value('i', 0)
+    stop = context.Event()
+    games = context.Queue()  # type: Any
+    candidates = context.Queue()  # type: Any
+    evaluations = context.Queue()  # type: Any
+
+    actors = [context.Process(target=_run_actor, name='Actor{}'.format(actor),
+                              daemon=True,
+                              args=(actor, game, estimator_class, action_indices,
+                                    weights_path, accepted_version, stop, games,
+                                    mcts_iters, c_puct, num_parallel_games,
+                                    int(seeds[actor])))
+              for actor in range(num_actors)]
+    evaluator = context.Process(
+        target=_run_evaluator, name='Evaluator', daemon=True,
+        args=(game, estimator_class, action_indices, weights_path,
+              accepted_version, candidates, evaluations, mcts_iters, c_puct,
+              num_evaluate_games, win_rate, int(seeds[-1])))
+    for process in actors + [evaluator]:
+        process.start()
+
+    replay_buffer = ReplayBuffer(replay_length)
+    game_staleness = []  # type: List[int]
+    evaluation_records = []  # type: List[EvaluationRecord]
+    evaluating = False
+
+    def add_game(record: GameRecord) -> None:
+        replay_buffer.extend(record.game_log, record.weights_version)
+        game_staleness.append(accepted_version.value - record.weights_version)
+
+    try:
+        for step in range(training_steps):
+            # Wait for enough positions before the first training step,
+            # then take whatever games have finished.
+            while len(replay_buffer) < min_replay_length:
+                try:
+                    add_game(games.get(timeout=_POLL_INTERVAL))
+                except queue.Empty:
+                    _check_processes(actors + [evaluator])
+            while True:
+                try:
+                    add_game(games.get_nowait())
+                except queue.Empty:
+                    break
+            _check_processes(actors + [evaluator])
+
+            training_estimator.train(replay_buffer, batch_size, training_iters,
+                                     verbose=False)
+
+            while True:
+                try:
+                    record = evaluations.get_nowait()
+                except queue.Empty:
+                    break
+                evaluating = False
+                evaluation_records.append(record)
+                if verbose:
+                    print("Candidate from step {} {} with success rate {:.3f}; "
+                          "weights version {}.".format(
+                              record.training_step,
+                              'accepted' if record.accepted else 'rejected',
+                              record.success_rate, record.weights_version))
+
+            if not evaluating:
+                # Checkpoint each candidate, so that accepted candidates
+                # can be restored from the checkpoint of their step.
+                checkpoint_model(training_estimator, step, checkpoint_path)
+                candidate_file = os.path.join(
+                    weights_path, 'candidate{}.npz'.format(step))
+                to_numpy_estimator(training_estimator).save(candidate_file)
+                candidates.put((candidate_file, step))
+                evaluating = True
+
+            if verbose:
+                mean_lag, max_lag = replay_buffer.staleness(accepted_version.value)
+                print("Step {}: {} games, buffer staleness mean {:.2f}, "
+                      "max {}.".format(step, len(game_staleness), mean_lag,
+                                       max_lag))
+    finally:
+        stop.set()
+        # Abandon any evaluation in progress, since its result would no
+        # longer be used.
+        evaluator.terminate()
+        evaluator.join()
+        # Let the actors finish their current games, draining the queue
+        # so that no actor blocks on a full pipe.
+        for process in actors:
+            while process.is_alive():
+                process.join(timeout=0.1)
+                try:
+                    while True:
+                        games.get_nowait()
+                except queue.Empty:
+                    pass
+        if remove_weights_path:
+            shutil.rmtree(weights_path, ignore_errors=True)
+
+    return AsyncTrainingStats(
+        games=len(game_staleness),
+        positions=replay_buffer.num_added,
+        training_steps=training_steps,
+        weights_version=accepted_version.value,
+        evaluations=evaluation_records,
+        mean_game_staleness=float(np.mean(game_staleness)) if game_staleness else 0.0,
+        max_game_staleness=max(game_staleness, default=0))
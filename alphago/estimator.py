@@ -6,6 +6,9 @@ import tensorflow as tf
 from tqdm import tqdm
 
 from .games import Game
+from .games.features import bitboard_features
+from .prefetch import BatchPrefetcher
+from .replay_buffer import PrioritizedReplayBuffer, ReplayBuffer
 
 
 def create_trivial_estimator(game: Game):
@@ -80,68 +83,151 @@ class AbstractNeuralNetEstimator(abc.ABC):
         self.learning_rate = learning_rate
         self.l2_weight = l2_weight
         self.value_weight = value_weight
+        # Incremented whenever the weights change, so that anything
+        # caching the output of the net knows to discard it.
+        self.weights_version = 0
         self._initialise_net()
 
     @abc.abstractmethod
     def _initialise_net(self):
         """Initialise the neural network and all associated tensors."""
 
+    def _build_loss(self, outcomes, value, pi, log_probs):
+        """Builds the loss of the net, given the tensors of the outcomes,
+        the value head, the target probabilities and the log
+        probabilities of the policy head.
+
+        Each position's loss is weighted by the `sample_weights`
+        placeholder, which defaults to 1, so that importance-sampling
+        weights can be fed when training on a prioritised replay buffer.
+
+        Returns
+        -------
+        sample_weights:
+            The placeholder for the weight of each position.
+        sample_losses:
+            The unweighted loss of each position, used as its priority.
+        loss, loss_value, loss_probs:
+            The weighted mean of the total, value and probability
+            losses over the batch.
+        """
+        sample_weights = tf.placeholder_with_default(
+            tf.ones_like(outcomes[:, 0]), shape=(None,), name='sample_weights')
+
+        sample_loss_value = tf.reduce_mean(tf.squared_difference(outcomes, value), axis=1)
+        # The mean over the actions keeps the scale of the unweighted loss.
+        sample_loss_probs = -tf.reduce_mean(tf.multiply(pi, log_probs), axis=1)
+        sample_losses = self.value_weight * sample_loss_value + sample_loss_probs
+
+        loss_value = tf.reduce_mean(sample_weights * sample_loss_value)
+        loss_probs = tf.reduce_mean(sample_weights * sample_loss_probs)
+        loss = self.value_weight * loss_value + loss_probs
+        return sample_weights, sample_losses, loss, loss_value, loss_probs
+
     @abc.abstractmethod
     def _state_to_vector(self, state):
         """Map the state to a vector suitable for input to the
         neural network estimator."""
 
+    def _states_to_vectors(self, states):
+        """Map a sequence of states to an array, with one row per state,
+        suitable for input to the neural network estimator."""
+        return np.concatenate([self._state_to_vector(state)
+                               for state in states])
+
+    def predict_batch(self, states):
+        """Evaluates the network on a batch of states, fetching both the
+        probabilities and the values in a single session run.
+
+        Parameters
+        ----------
+        states: sequence
+            The states to evaluate.
+
+        Returns
+        -------
+        probs: ndarray
+            An array of shape (len(states), #actions) with ith row the
+            probabilities for the ith state. The columns are indexed by
+            self.action_indices.
+        values: ndarray
+            An array of shape (len(states),) with ith entry the value of
+            the ith state.
+        """
+        state_vectors = self._states_to_vectors(states)
+        probs, values = self.sess.run(
+            [self.tensors['probs'], self.tensors['value']],
+            feed_dict={
+                self.tensors['state_vector']: state_vectors,
+                self.tensors['is_training']: False})
+        return probs, values.ravel()
+
     def __call__(self, state):
         """Returns the result of the neural net applied to the state. This is
         'probs' and 'value'
 
         Parameters
         ----------
-        state: ndarray
-            The input state to the network. Should be a numpy array.
+        state:
+            The state to evaluate.
 
         Returns
         -------
         probs: dict
             The probabilities returned by the net as a dictionary. The keys
-            are the actions and the .
-        value: ndarray
+            are the actions and the values their probabilities.
+        value: float
             The value returned by the net.
         """
-        # Reshape the state if necessary so that it's 1 x game_state_shape. We
-        # should only be evaluating one state at a time in this function.
-        state = self._state_to_vector(state)
-
-        # Evaluate the network at the state
-        probs = self.sess.run(
-            self.tensors['probs'],
-            feed_dict={
-                self.tensors['state_vector']: state,
-                self.tensors['is_training']: False})
-        value = self.sess.run(
-            self.tensors['value'],
-            feed_dict={
-                self.tensors['state_vector']: state,
-                self.tensors['is_training']: False})
-
-        # value is currently an np array, so extract the float.
-        probs = probs.ravel()
-        [value] = value.ravel()
+        probs, values = self.predict_batch([state])
 
         # probs is currently an np array. Put the value into a
         # dictionary with keys the actions and values the probs.
-        probs_dict = {action: probs[index] for
+        probs_dict = {action: probs[0, index] for
                       action, index in self.action_indices.items()}
 
-        return probs_dict, value
+        return probs_dict, values[0]
 
+    def _training_arrays(self, data, indices=None):
+        """Converts training data to arrays of the state vectors, target
+        probabilities and outcomes, encoding each state exactly once.
+
+        Parameters
+        ----------
+        data: list or ReplayBuffer
+            A list consisting of (state, probs, z) tuples, or a
+            ReplayBuffer of such positions.
+        indices: ndarray or None
+            If given, only convert the positions of the ReplayBuffer
+            with these indices.
+
+        Returns
+        -------
+        state_vectors: ndarray
+            An array with ith row the network input for the ith state.
+        pis: ndarray
+            An array with ith row the target probabilities.
+        zs: ndarray
+            An array of shape (len(data), 1) of the outcomes.
+        """
+        if isinstance(data, ReplayBuffer):
+            if indices is None:
+                indices = np.arange(len(data))
+            states, pis, zs = data.gather(indices)
+        else:
+            states = [x[0] for x in data]
+            pis = np.array([x[1] for x in data])
+            zs = np.array([x[2] for x in data])
+
+        state_vectors = self._states_to_vectors(states)
+        return state_vectors, pis, np.reshape(zs, (-1, 1))
 
     def loss(self, data, batch_size):
         """Computes the loss of the network on the data.
 
         Parameters
         ----------
-        data: list
+        data: list or ReplayBuffer
             A list consisting of (state, probs, z) tuples, where player is the
             player in the state and z is the utility to player in the last state
             from the corresponding self-play game.
@@ -156,26 +242,23 @@ class AbstractNeuralNetEstimator(abc.ABC):
         loss_probs: float
             The loss of the probability part of the network.
         """
+        state_vectors, pis, zs = self._training_arrays(data)
+
         iters = int(len(data) / batch_size)
         losses = []
         loss_value_list = []
         loss_probs_list = []
         for i in range(iters):
-            batch_indices = range(i, i + batch_size)
-            batch_data = [data[i] for i in batch_indices]
-
-            # Set up the states, probs, zs arrays.
-            states = np.array([x[0] for x in batch_data])
-            pis = np.array([x[1] for x in batch_data])
-            zs = np.array([x[2] for x in batch_data])
-            zs = zs[:, np.newaxis]
+            # The batches are contiguous slices, so are views of the
+            # arrays rather than copies.
+            batch = slice(i * batch_size, (i + 1) * batch_size)
 
             loss, loss_value, loss_probs = self.sess.run(
                 [self.tensors['loss'], self.tensors['loss_value'],
                  self.tensors['loss_probs']], feed_dict={
-                    self.tensors['state_vector']: states,
-                    self.tensors['pi']: pis,
-                    self.tensors['outcomes']: zs,
+                    self.tensors['state_vector']: state_vectors[batch],
+                    self.tensors['pi']: pis[batch],
+                    self.tensors['outcomes']: zs[batch],
                     self.tensors['is_training']: False
                 })
             losses.append(loss)
@@ -201,36 +284,75 @@ class AbstractNeuralNetEstimator(abc.ABC):
         summary:
             The summary tensor, run on the batch.
         """
-        # Set up the states, probs, zs arrays.
-        states = np.array([x[0] for x in batch])
-        pis = np.array([x[1] for x in batch])
-        zs = np.array([x[2] for x in batch])
-        zs = zs[:, np.newaxis]
-
-        summary, value, probs, loss, _ = self.sess.run(
-            [self.tensors['summary'], self.tensors['value'],
-             self.tensors['probs'], self.tensors['loss'],
-             self.train_op],
-            feed_dict={self.tensors['state_vector']: states,
-                       self.tensors['pi']: pis,
-                       self.tensors['outcomes']: zs,
-                       self.tensors['is_training']: True})
+        state_vectors, pis, zs = self._training_arrays(batch)
+        return self.train_step_arrays(state_vectors, pis, zs,
+                                      return_summary=return_summary)
+
+    def train_step_arrays(self, state_vectors, pis, zs, return_summary=False,
+                          sample_weights=None, return_losses=False):
+        """Trains the network on a batch given as arrays.
+
+        Parameters
+        ----------
+        state_vectors: ndarray
+            The encoded states, as returned by _states_to_vectors.
+        pis: ndarray
+            The target probabilities, one row per state.
+        zs: ndarray
+            The outcomes, of shape (batch_size, 1).
+        return_summary: bool
+            Whether to return the TensforFlow summary tensor for use in
+            Tensorboard.
+        sample_weights: ndarray or None
+            If given, the weight of each position in the loss, e.g. the
+            importance-sampling weights of a PrioritizedReplayBuffer.
+        return_losses: bool
+            Whether to return the unweighted loss of each position,
+            computed before the update.
+        Returns
+        -------
+        summary:
+            The summary tensor, run on the batch, if return_summary.
+        sample_losses: ndarray
+            The loss of each position, if return_losses.
+        """
+        feed_dict = {self.tensors['state_vector']: state_vectors,
+                     self.tensors['pi']: pis,
+                     self.tensors['outcomes']: zs,
+                     self.tensors['is_training']: True}
+        if sample_weights is not None:
+            feed_dict[self.tensors['sample_weights']] = sample_weights
+        summary, sample_losses, _ = self.sess.run(
+            [self.tensors['summary'], self.tensors['sample_losses'],
+             self.train_op], feed_dict=feed_dict)
 
         # Update the global step
         self.global_step += 1
+        self.weights_version += 1
+        if return_summary and return_losses:
+            return summary, sample_losses
         if return_summary:
             return summary
+        if return_losses:
+            return sample_losses
 
     def train(self, training_data, batch_size, training_iters,
-              mode='reinforcement', writer=None, verbose=True):
+              mode='reinforcement', writer=None, verbose=True, prefetch=2):
         """Trains the net on the training data.
 
+        The states are encoded once up front, and each batch is then
+        gathered from the resulting arrays. Batches are assembled in a
+        background thread while the previous batch is being trained on.
+
         Parameters
         ----------
-        training_data: list
+        training_data: list or ReplayBuffer
             A list consisting of (state, probs, z) tuples, where player
             is the player in the state and z is the utility to player in
-            the last state from the corresponding self-play game.
+            the last state from the corresponding self-play game. In
+            reinforcement mode, a PrioritizedReplayBuffer is sampled by
+            priority, with the loss weighted by the importance-sampling
+            weights, and the priorities are updated with the losses.
         batch_size: int
         training_iters: int
             The number of training iterations to run, where a training
@@ -248,6 +370,16 @@ class AbstractNeuralNetEstimator(abc.ABC):
             A FileWriter object for writing TensorFlow summaries to.
         verbose: bool
             Print out progress if True, else don't print anything.
+        prefetch: int
+            The number of batches to assemble ahead of the training
+            step. If 0, batches are assembled in the training loop.
+
+        Returns
+        -------
+        PrefetchStats or None:
+            How often training waited for a batch to be assembled, if
+            prefetching was used. A starvation fraction close to 1 means
+            training is input-bound.
         """
         # TODO: This concrete implementation of two cases probably shouldn't be in ABC
 
@@ -258,57 +390,121 @@ class AbstractNeuralNetEstimator(abc.ABC):
             if training_iters == -1:
                 raise ValueError("`training_iters` must be > 1 for "
                                  "reinforcement mode.")
-            self._train_reinforcement(training_data, batch_size, training_iters,
-                                      writer, verbose)
+            batch_fn, num_batches = self._reinforcement_batches(
+                training_data, batch_size, training_iters)
         elif mode == 'supervised':
-            self._train_supervised(training_data, batch_size, training_iters,
-                                   writer, verbose)
+            batch_fn, num_batches = self._supervised_batches(
+                training_data, batch_size, training_iters)
 
-    def _train_reinforcement(self, training_data, batch_size, training_iters,
-                             writer, verbose):
-        """Train the net in reinforcement learning mode.
+        prioritized_buffer = None
+        if (mode == 'reinforcement' and
+                isinstance(training_data, PrioritizedReplayBuffer)):
+            prioritized_buffer = training_data
+        return self._train_on_batches(batch_fn, num_batches, writer, verbose,
+                                      prefetch, prioritized_buffer)
+
+    def _reinforcement_batches(self, training_data, batch_size, training_iters):
+        """Returns a function building the batches for reinforcement
+        learning mode, and the number of batches.
 
         In this case, a random batch is sampled for the data every
         training iteration. This may mean that the same data points are
         trained on multiple times before the every data point is in the
-        training data is considered.
+        training data is considered. A ReplayBuffer chooses the indices
+        itself, so that merged duplicates are sampled in proportion to
+        their counts. Batches from a PrioritizedReplayBuffer also hold
+        the importance-sampling weights and the indices, so that the
+        priorities can be updated after the training step.
+
+        Only the sampled positions of a ReplayBuffer are encoded, so the
+        cost of training doesn't grow with the size of the buffer. A
+        list is encoded once up front.
         """
-        disable_tqdm = False if verbose else True
-        for _ in tqdm(range(training_iters), disable=disable_tqdm):
+        if isinstance(training_data, ReplayBuffer):
+            def batch_fn(_):
+                batch_indices = training_data.sample_indices(batch_size)
+                batch = list(self._training_arrays(training_data, batch_indices))
+                if isinstance(training_data, PrioritizedReplayBuffer):
+                    batch += [training_data.importance_weights(batch_indices),
+                              batch_indices]
+                return batch
+
+            return batch_fn, training_iters
+
+        arrays = self._training_arrays(training_data)
+
+        def batch_fn(_):
             batch_indices = np.random.choice(len(training_data), batch_size)
-            batch = [training_data[ix] for ix in batch_indices]
-            summary = self.train_step(batch, return_summary=True)
-            if writer is not None:
-                writer.add_summary(summary, self.global_step)
+            return [np.take(array, batch_indices, axis=0) for array in arrays]
 
-    def _train_supervised(self, training_data, batch_size, training_iters,
-                          writer, verbose):
-        """Train the net in supervised learning mode.
+        return batch_fn, training_iters
+
+    def _supervised_batches(self, training_data, batch_size, training_iters):
+        """Returns a function building the batches for supervised
+        learning mode, and the number of batches.
 
         In this case, the training data are randomly shuffled and then
         they are processed sequentially in batches. The number of
         batches trained on is equal to the number training iterations.
         """
         size = len(training_data)
-        training_indices = [i for i in range(size)]
-        random.shuffle(training_indices)
+        training_indices = np.random.permutation(size)
+
+        # Shuffle the arrays once, so that each batch is a contiguous
+        # slice (a view, rather than a copy) of the shuffled arrays.
+        arrays = [np.take(array, training_indices, axis=0)
+                  for array in self._training_arrays(training_data)]
 
         # calculate training iterations for single epoch if required
         if training_iters == -1:
             training_iters = (len(training_data) + batch_size - 1) // batch_size
 
-        # generate batch indices, the final batch may be smaller if
-        # `batch_size` doesn't evenly divide into size of training data
-        batch_indices_list = [
-            training_indices[i * batch_size:min(size, (i + 1) * batch_size)]
-            for i in range(training_iters)]
-
+        # The final batch may be smaller if `batch_size` doesn't evenly
+        # divide into size of training data
+        def batch_fn(i):
+            batch_slice = slice(i * batch_size, min(size, (i + 1) * batch_size))
+            return [array[batch_slice] for array in arrays]
+
+        return batch_fn, training_iters
+
+    def _train_on_batches(self, batch_fn, num_batches, writer, verbose, prefetch,
+                          prioritized_buffer=None):
+        """Runs a training step on each batch built by batch_fn,
+        prefetching batches in a background thread if prefetch > 0.
+        If prioritized_buffer is given, each batch also holds the
+        importance-sampling weights and indices of its positions, whose
+        priorities are set to their losses."""
         disable_tqdm = False if verbose else True
-        for batch_indices in tqdm(batch_indices_list, disable=disable_tqdm):
-            batch = [training_data[ix] for ix in batch_indices]
-            summary = self.train_step(batch, return_summary=True)
-            if writer is not None:
-                writer.add_summary(summary, self.global_step)
+        if prefetch:
+            batches = BatchPrefetcher(batch_fn, num_batches, queue_size=prefetch)
+        else:
+            batches = (batch_fn(i) for i in range(num_batches))
+
+        try:
+            for batch in tqdm(batches, total=num_batches, disable=disable_tqdm):
+                if prioritized_buffer is not None:
+                    state_vectors, pis, zs, sample_weights, indices = batch
+                    summary, sample_losses = self.train_step_arrays(
+                        state_vectors, pis, zs, return_summary=True,
+                        sample_weights=sample_weights, return_losses=True)
+                    prioritized_buffer.update_priorities(indices, sample_losses)
+                else:
+                    summary = self.train_step_arrays(*batch, return_summary=True)
+                if writer is not None:
+                    writer.add_summary(summary, self.global_step)
+        finally:
+            if prefetch:
+                batches.close()
+
+        if not prefetch:
+            return None
+
+        stats = batches.stats()
+        if writer is not None:
+            writer.add_summary(tf.Summary(value=[tf.Summary.Value(
+                tag='prefetch/starvation_fraction',
+                simple_value=stats.starvation_fraction)]), self.global_step)
+        return stats
 
     def create_estimate_fn(self):
         """Returns an evaluator function corresponding to the neural network.
@@ -325,6 +521,111 @@ class AbstractNeuralNetEstimator(abc.ABC):
 
         return self.__call__
 
+    def _weight_variables(self, include_optimizer=False):
+        """Returns a dictionary mapping the names of the variables of the
+        net to the variables, in the order they were created.
+        Optimiser slots are only included if include_optimizer is True.
+        """
+        with self.graph.as_default():
+            variables = tf.global_variables()
+        return {variable.op.name: variable for variable in variables
+                if include_optimizer or
+                'Momentum' not in variable.op.name.split('/')}
+
+    def _get_assign_ops(self):
+        """Returns a dictionary mapping the name of each variable to a
+        pair (placeholder, assign_op) that sets the variable to the
+        value fed to the placeholder. The ops are built on the first call
+        and reused, so that setting weights never grows the graph.
+        """
+        if getattr(self, '_assign_ops', None) is None:
+            self._assign_ops = {}
+            with self.graph.as_default():
+                variables = self._weight_variables(include_optimizer=True)
+                for name, variable in variables.items():
+                    placeholder = tf.placeholder(
+                        variable.dtype.base_dtype, shape=variable.get_shape())
+                    self._assign_ops[name] = (placeholder,
+                                              variable.assign(placeholder))
+        return self._assign_ops
+
+    def get_weights(self, include_optimizer=False):
+        """Returns the values of the variables of the net.
+
+        Parameters
+        ----------
+        include_optimizer: bool
+            Whether to include the optimiser's slot variables (e.g. the
+            momentum accumulators) as well as the weights.
+
+        Returns
+        -------
+        weights: dict
+            A dictionary mapping the names of the variables to their
+            values.
+        """
+        variables = self._weight_variables(include_optimizer)
+        values = self.sess.run(list(variables.values()))
+        return dict(zip(variables.keys(), values))
+
+    def set_weights(self, weights):
+        """Sets the variables of the net in place, in a single session
+        run, without building any new ops after the first call.
+
+        Parameters
+        ----------
+        weights: dict
+            A dictionary mapping variable names to values, as returned by
+            get_weights. Any variables not in the dictionary, e.g. the
+            optimiser slots, are left unchanged.
+
+        Raises
+        ------
+        ValueError:
+            If a name in weights isn't a variable of the net.
+        """
+        assign_ops = self._get_assign_ops()
+        unknown = set(weights) - set(assign_ops)
+        if unknown:
+            raise ValueError("Unknown variables: {}.".format(sorted(unknown)))
+
+        feed_dict = {assign_ops[name][0]: value
+                     for name, value in weights.items()}
+        self.sess.run([assign_ops[name][1] for name in weights],
+                      feed_dict=feed_dict)
+        self.weights_version += 1
+
+    def copy_from(self, other, include_optimizer=False):
+        """Copies the weights of another estimator with the same
+        architecture into this one, in memory.
+        """
+        self.set_weights(other.get_weights(include_optimizer))
+
+    def export_weights(self):
+        """Returns the values of the variables of the net, grouped by
+        layer, for use by a NumPy estimator (see
+        `alphago.numpy_estimator`).
+
+        Optimiser slots are excluded, and batch normalisation layers
+        include their moving mean and variance.
+
+        Returns
+        -------
+        layer_params: list
+            A list with one dictionary per layer, in the order the layers
+            were created in the graph. Each dictionary maps the names of
+            the layer's parameters (e.g. 'weights', 'biases', 'beta',
+            'moving_mean') to their values.
+        """
+        layer_variables = {}
+        for name, variable in self._weight_variables().items():
+            layer, _, param = name.rpartition('/')
+            layer_variables.setdefault(layer, {})[param] = variable
+
+        # Dictionaries preserve insertion order, which is the order the
+        # variables were created in.
+        return self.sess.run(list(layer_variables.values()))
+
     def save(self, save_file):
         """Saves the net to save_file.
         """
@@ -334,6 +635,7 @@ class AbstractNeuralNetEstimator(abc.ABC):
         """Restore the net from save_file.
         """
         self.saver.restore(self.sess, save_file)
+        self.weights_version += 1
 
 
 class NACNetEstimator(AbstractNeuralNetEstimator):
@@ -414,10 +716,8 @@ class NACNetEstimator(AbstractNeuralNetEstimator):
             log_sum_exp = tf.log(tf.reduce_sum(tf.exp(prob_logits), axis=1))
             log_probs = prob_logits - tf.expand_dims(log_sum_exp, 1)
 
-            loss_value = tf.losses.mean_squared_error(outcomes, value)
-            loss_probs = -tf.reduce_mean(tf.multiply(pi, log_probs))
-
-            loss = self.value_weight * loss_value + loss_probs
+            sample_weights, sample_losses, loss, loss_value, loss_probs = \
+                self._build_loss(outcomes, value, pi, log_probs)
 
             # Set up the training op
             self.train_op = \
@@ -438,15 +738,20 @@ class NACNetEstimator(AbstractNeuralNetEstimator):
         self.global_step = 0
 
         tensors = [state_vector, outcomes, pi, value, prob_logits, probs,
-                   loss, loss_value, loss_probs, is_training, summary]
+                   loss, loss_value, loss_probs, is_training, summary,
+                   sample_weights, sample_losses]
         names = ("state_vector outcomes pi value prob_logits probs loss "
-                 "loss_value loss_probs is_training summary").split()
+                 "loss_value loss_probs is_training summary "
+                 "sample_weights sample_losses").split()
         self.tensors = {name: tensor for name, tensor in zip(names, tensors)}
 
     def _state_to_vector(self, state):
         state = np.array(state).reshape((-1, 9))
         return np.nan_to_num(state)
 
+    def _states_to_vectors(self, states):
+        return self._state_to_vector(states)
+
 
 class NAC3x6NetEstimator(AbstractNeuralNetEstimator):
     game_state_shape = (1, 36)
@@ -455,130 +760,12 @@ class NAC3x6NetEstimator(AbstractNeuralNetEstimator):
         super().__init__(learning_rate, l2_weight, value_weight)
         self.action_indices = action_indices
 
-    @staticmethod
-    def _binary_state_to_array(state):
-        player1_board = [int(i) for i in '{0:018b}'.format(state[0])]
-        player2_board = [int(i) for i in '{0:018b}'.format(state[1])]
-        return player1_board + player2_board
-
-    def train_step(self, batch, return_summary=False):
-        """Trains the network on the batch.
-
-        Parameters
-        ----------
-        batch: list
-            A list consisting of (state, probs, z) tuples, where player
-            is the player in the state and z is the utility to player in
-            the last state from the corresponding self-play game.
-        return_summary: bool
-            Whether to return the TensforFlow summary tensor for use in
-            Tensorboard.
-        Returns
-        -------
-        summary:
-            The summary tensor, run on the batch.
-        """
-        # Set up the states, probs, zs arrays.
-        states = np.array([self._binary_state_to_array(x[0])
-                           for x in batch])
-        pis = np.array([x[1] for x in batch])
-
-        zs = np.array([x[2] for x in batch])
-        zs = zs[:, np.newaxis]
-
-        summary, value, probs, loss, _ = self.sess.run(
-            [self.tensors['summary'], self.tensors['value'],
-             self.tensors['probs'], self.tensors['loss'],
-             self.train_op],
-            feed_dict={self.tensors['state_vector']: states,
-                       self.tensors['pi']: pis,
-                       self.tensors['outcomes']: zs,
-                       self.tensors['is_training']: True})
-
-        # Update the global step
-        self.global_step += 1
-        if return_summary:
-            return summary
-
-    def loss(self, data, batch_size):
-        """Computes the loss of the network on the data.
-
-        Parameters
-        ----------
-        data: list
-            A list consisting of (state, probs, z) tuples, where player is the
-            player in the state and z is the utility to player in the last state
-            from the corresponding self-play game.
-        batch_size: int
-
-        Returns
-        -------
-        loss: float
-            The loss of the network on the given data.
-        loss_value: float
-            The loss of the value part of the network.
-        loss_probs: float
-            The loss of the probability part of the network.
-        """
-        iters = int(len(data) / batch_size)
-        losses = []
-        loss_value_list = []
-        loss_probs_list = []
-        for i in range(iters):
-            batch_indices = range(i, i + batch_size)
-            batch_data = [data[i] for i in batch_indices]
-
-            # Set up the states, probs, zs arrays.
-            states = np.array([self._binary_state_to_array(x[0])
-                               for x in batch_data])
-            pis = np.array([x[1] for x in batch_data])
-            zs = np.array([x[2] for x in batch_data])
-            zs = zs[:, np.newaxis]
-
-            loss, loss_value, loss_probs = self.sess.run(
-                [self.tensors['loss'], self.tensors['loss_value'],
-                 self.tensors['loss_probs']], feed_dict={
-                    self.tensors['state_vector']: states,
-                    self.tensors['pi']: pis,
-                    self.tensors['outcomes']: zs,
-                    self.tensors['is_training']: False
-                })
-            losses.append(loss)
-            loss_value_list.append(loss_value)
-            loss_probs_list.append(loss_probs)
-
-        return np.mean(losses), np.mean(loss_value_list), np.mean(loss_probs_list)
-
-    def create_estimate_fn(self):
-        """Returns an evaluator function corresponding to the neural network.
-
-        Note that we expect self.action_indices to be a dictionary with keys
-        the available actions and values the index of that action. Indices
-        must be unique in 0, 1, .., #actions-1.
-
-        Returns
-        -------
-        estimate: func
-            A function that evaluates states.
-        """
-
-        def estimate_fn(state):
-            # Reshape the state if necessary so that it's 1 x 9. We should
-            # only be evaluating one state at a time in this function.
-            state = np.reshape(self._binary_state_to_array(state), (1, 36))
-            state = np.nan_to_num(state)
-
-            # Evaluate the network at the state
-            probs, [value] = self(state)
-
-            # probs is currently an np array. Put the value into a
-            # dictionary with keys the actions and values the probs.
-            probs_dict = {action: probs[self.action_indices[action]] for
-                          action in self.action_indices}
-
-            return probs_dict, value
+    def _state_to_vector(self, state):
+        return self._states_to_vectors([state])
 
-        return estimate_fn
+    def _states_to_vectors(self, states):
+        # The bits of each board, most significant first.
+        return bitboard_features(states, num_bits=18)
 
     def _initialise_net(self):
         # TODO: test reshape recreates game properly
@@ -709,10 +896,8 @@ class NAC3x6NetEstimator(AbstractNeuralNetEstimator):
             log_sum_exp = tf.log(tf.reduce_sum(tf.exp(prob_logits), axis=1))
             log_probs = prob_logits - tf.expand_dims(log_sum_exp, 1)
 
-            loss_value = tf.losses.mean_squared_error(outcomes, value)
-            loss_probs = -tf.reduce_mean(tf.multiply(pi, log_probs))
-
-            loss = self.value_weight * loss_value + loss_probs
+            sample_weights, sample_losses, loss, loss_value, loss_probs = \
+                self._build_loss(outcomes, value, pi, log_probs)
 
             # Set up the training op
             self.train_op = \
@@ -733,9 +918,11 @@ class NAC3x6NetEstimator(AbstractNeuralNetEstimator):
         self.global_step = 0
 
         tensors = [state_vector, outcomes, pi, value, prob_logits, probs,
-                   loss, loss_value, loss_probs, is_training, summary]
+                   loss, loss_value, loss_probs, is_training, summary,
+                   sample_weights, sample_losses]
         names = ("state_vector outcomes pi value prob_logits probs loss "
-                 "loss_value loss_probs is_training summary").split()
+                 "loss_value loss_probs is_training summary "
+                 "sample_weights sample_losses").split()
         self.tensors = {name: tensor for name, tensor in zip(names, tensors)}
 
 
@@ -816,10 +1003,8 @@ class ConnectFourNet(AbstractNeuralNetEstimator):
             log_sum_exp = tf.log(tf.reduce_sum(tf.exp(prob_logits), axis=1))
             log_probs = prob_logits - tf.expand_dims(log_sum_exp, 1)
 
-            loss_value = tf.losses.mean_squared_error(outcomes, value)
-            loss_probs = -tf.reduce_mean(tf.multiply(pi, log_probs))
-
-            loss = self.value_weight * loss_value + loss_probs
+            sample_weights, sample_losses, loss, loss_value, loss_probs = \
+                self._build_loss(outcomes, value, pi, log_probs)
 
             # Set up the training op
             self.train_op = \
@@ -841,10 +1026,15 @@ class ConnectFourNet(AbstractNeuralNetEstimator):
         self.global_step = 0
 
         tensors = [state_vector, outcomes, pi, value, prob_logits, probs,
-                   loss, loss_value, loss_probs, is_training, summary]
+                   loss, loss_value, loss_probs, is_training, summary,
+                   sample_weights, sample_losses]
         names = "state_vector outcomes pi value prob_logits probs loss " \
-                "loss_value loss_probs is_training summary".split()
+                "loss_value loss_probs is_training summary " \
+                "sample_weights sample_losses".split()
         self.tensors = {name: tensor for name, tensor in zip(names, tensors)}
 
     def _state_to_vector(self, state):
         return np.array(state).reshape((-1, 42))
+
+    def _states_to_vectors(self, states):
+        return self._state_to_vector(states)
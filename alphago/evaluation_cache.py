@@ -0,0 +1,133 @@
+"""Caching network evaluations
+
+This module provides a cache for the output of an estimator, so that
+positions which recur across moves and games (especially openings) are
+only sent to the network once.
+
+Classes
+-------
+EvaluationCache
+    An LRU cache wrapping an estimator.
+EvaluationCacheStats
+    A summary of the lookups made in an evaluation cache.
+"""
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from .games import Game
+from .utilities import DEFAULT_CACHE_MAXSIZE, LRUCache
+
+__all__ = ["EvaluationCache", "EvaluationCacheStats"]
+
+
+class EvaluationCacheStats(NamedTuple):
+    hits: int
+    misses: int
+    hit_rate: float
+    evictions: int
+    invalidations: int
+    currsize: int
+    maxsize: Optional[int]
+
+
+class EvaluationCache:
+    """An LRU cache of the prior probabilities and values returned by an
+    estimator, keyed on the game's compact state key.
+
+    If ``canonicalize`` is True, each state is mapped onto its canonical
+    representative under the symmetries of the board before it is
+    looked up or evaluated, so that all the symmetric images of a
+    position share one entry. The cached prior probabilities are then
+    mapped back onto the actions of the original state.
+
+    The cache is cleared whenever the estimator's ``weights_version``
+    changes, which happens after a training step or a restore, so stale
+    evaluations are never returned. Estimators without a
+    ``weights_version`` (e.g. the trivial estimator) are assumed to be
+    fixed.
+
+    Parameters
+    ----------
+    game: Game
+        The game whose states are being evaluated.
+    estimator: callable
+        A function taking a state and returning a pair (prior_probs,
+        value).
+    maxsize: int or None
+        The maximum number of states to cache, or None for no limit.
+    canonicalize: bool
+        Whether to share entries between symmetric states.
+
+    Examples
+    --------
+    >>> cached_estimator = EvaluationCache(game, estimator, canonicalize=True)
+    >>> action_probs = mcts(root, game, cached_estimator, mcts_iters, c_puct)
+    >>> cached_estimator.stats().hit_rate
+    """
+
+    def __init__(self, game: Game, estimator, maxsize: Optional[int] = DEFAULT_CACHE_MAXSIZE,
+                 canonicalize: bool = False) -> None:
+        self.game = game
+        self.estimator = estimator
+        self.canonicalize = canonicalize
+        self._cache = LRUCache(maxsize=maxsize)
+        self._weights_version = self._current_weights_version()
+        self._invalidations = 0
+
+    def _current_weights_version(self) -> int:
+        return getattr(self.estimator, 'weights_version', 0)
+
+    def __call__(self, state) -> Tuple[Dict[Any, float], float]:
+        """Evaluate the state, using the cached evaluation if there is
+        one.
+
+        Returns
+        -------
+        prior_probs: dict
+            A dictionary from actions to probabilities.
+        value: float
+            The value of the state.
+        """
+        weights_version = self._current_weights_version()
+        if weights_version != self._weights_version:
+            self.invalidate()
+            self._weights_version = weights_version
+
+        if self.canonicalize:
+            state, transform = self.game.canonicalize(state)
+
+        key = self.game.state_key(state)
+        evaluation = self._cache.get(key)
+        if evaluation is None:
+            evaluation = self.estimator(state)
+            self._cache.put(key, evaluation)
+        prior_probs, value = evaluation
+
+        if self.canonicalize and transform:
+            inverse_transform_action = self.game.inverse_transform_action
+            prior_probs = {inverse_transform_action(action, transform): prob
+                           for action, prob in prior_probs.items()}
+        else:
+            prior_probs = dict(prior_probs)
+
+        return prior_probs, value
+
+    def invalidate(self) -> None:
+        """Discard all cached evaluations, keeping the statistics."""
+        self._cache.clear(reset_stats=False)
+        self._invalidations += 1
+
+    def stats(self) -> EvaluationCacheStats:
+        """Returns the number of hits and misses, the hit rate, the
+        number of entries evicted, the number of times the cache has been
+        invalidated and the current and maximum size of the cache."""
+        info = self._cache.info()
+        lookups = info.hits + info.misses
+        return EvaluationCacheStats(
+            hits=info.hits, misses=info.misses,
+            hit_rate=info.hits / lookups if lookups else 0.0,
+            evictions=info.evictions, invalidations=self._invalidations,
+            currsize=info.currsize, maxsize=info.maxsize)
+
+    def __repr__(self):
+        return "{0}({1}, {2})".format(self.__class__.__name__, self.game,
+                                      self.estimator)
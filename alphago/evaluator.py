@@ -5,7 +5,7 @@ from typing import Dict, List, Tuple
 from tqdm import tqdm
 
 from .games import Game
-from .player import Player
+from .player import MCTSPlayer, OptimalPlayer, Player, RandomPlayer
 
 GameLog = namedtuple("GameLog", "result actions game_states".split())
 Position, PlayerNo = int, int
@@ -243,3 +243,114 @@ def update_results(player1_no: int, player2_no: int,
         results[(player1_no, player2_no)] += 1
     else:  # utility[2] == 1
         results[(player2_no, player1_no)] += 1
+
+
+def play_sprt_match(game, estimator1, estimator2, mcts_iters, c_puct,
+                    max_games, sprt, tau, verbose=True):
+    """Plays estimator2 against estimator1, alternating positions,
+    until the sequential test decides whether estimator2's win + draw
+    rate is high enough, or max_games games have been played.
+
+    Returns
+    -------
+    wins1, wins2, draws: int
+        The number of wins of each estimator, and the number of draws.
+    """
+    players = {1: MCTSPlayer(game, estimator1, mcts_iters, c_puct, tau=tau),
+               2: MCTSPlayer(game, estimator2, mcts_iters, c_puct, tau=tau)}
+    swapped_players = {1: players[2], 2: players[1]}
+
+    wins1, wins2, draws = 0, 0, 0
+    disable_tqdm = False if verbose else True
+    with tqdm(total=max_games, disable=disable_tqdm) as pbar:
+        for game_no in range(max_games):
+            # estimator2 plays second in even games and first in odd games.
+            position2 = 2 if game_no % 2 == 0 else 1
+            *_, utility = play(game, players if position2 == 2 else swapped_players)
+
+            result = utility[position2]
+            if result == 1:
+                wins2 += 1
+            elif result == -1:
+                wins1 += 1
+            else:
+                draws += 1
+            pbar.update(1)
+
+            if sprt.update(result >= 0) is not None:
+                break
+
+    return wins1, wins2, draws
+
+
+def evaluate_mcts_against_optimal_player(game, estimator, mcts_iters,
+                                         c_puct, num_evaluate_games, tau,
+                                         verbose=True):
+    # Evaluate estimator1 vs estimator2.
+    players = {1: MCTSPlayer(game, estimator, mcts_iters, c_puct, tau=tau),
+               2: OptimalPlayer(game)}
+    player1_results, _ = evaluate(game, players, num_evaluate_games,
+                                  verbose=verbose)
+    wins1 = player1_results[1]
+    wins2 = player1_results[-1]
+    draws = player1_results[0]
+
+    # Evaluate estimator2 vs estimator1.
+    players = {1: OptimalPlayer(game),
+               2: MCTSPlayer(game, estimator, mcts_iters, c_puct, tau=tau)}
+    player1_results, _ = evaluate(game, players, num_evaluate_games,
+                                  verbose=verbose)
+    wins1 += player1_results[-1]
+    wins2 += player1_results[1]
+    draws += player1_results[0]
+
+    return wins1, wins2, draws
+
+
+def evaluate_mcts_against_random_player(game, estimator, mcts_iters,
+                                        c_puct, num_evaluate_games, tau,
+                                        verbose=True):
+    # Evaluate estimator1 vs estimator2.
+    players = {1: MCTSPlayer(game, estimator, mcts_iters, c_puct, tau=tau),
+               2: RandomPlayer(game)}
+    player1_results, _ = evaluate(game, players, num_evaluate_games,
+                                  verbose=verbose)
+    wins1 = player1_results[1]
+    wins2 = player1_results[-1]
+    draws = player1_results[0]
+
+    # Evaluate estimator2 vs estimator1.
+    players = {1: RandomPlayer(game),
+               2: MCTSPlayer(game, estimator, mcts_iters, c_puct, tau=tau)}
+    player1_results, _ = evaluate(game, players, num_evaluate_games,
+                                  verbose=verbose)
+    wins1 += player1_results[-1]
+    wins2 += player1_results[1]
+    draws += player1_results[0]
+
+    return wins1, wins2, draws
+
+
+def evaluate_estimators_in_both_positions(game, estimator1, estimator2,
+                                          mcts_iters, c_puct,
+                                          num_evaluate_games, tau,
+                                          verbose=True):
+    # Evaluate estimator1 vs estimator2.
+    players = {1: MCTSPlayer(game, estimator1, mcts_iters, c_puct, tau=tau),
+               2: MCTSPlayer(game, estimator2, mcts_iters, c_puct, tau=tau)}
+    player1_results, _ = evaluate(game, players, num_evaluate_games,
+                                  verbose=verbose)
+    wins1 = player1_results[1]
+    wins2 = player1_results[-1]
+    draws = player1_results[0]
+
+    # Evaluate estimator2 vs estimator1.
+    players = {1: MCTSPlayer(game, estimator2, mcts_iters, c_puct, tau=tau),
+               2: MCTSPlayer(game, estimator1, mcts_iters, c_puct, tau=tau)}
+    player1_results, _ = evaluate(game, players, num_evaluate_games,
+                                  verbose=verbose)
+    wins1 += player1_results[-1]
+    wins2 += player1_results[1]
+    draws += player1_results[0]
+
+    return wins1, wins2, draws
@@ -0,0 +1,192 @@
+"""On-disk self-play data
+
+This module provides an append-only store of self-play positions, so
+that self-play data survives the training process and can be analysed
+offline.
+
+Positions are written to numbered shards, ``shard000000.npy``,
+``shard000001.npy``, ..., in a directory. Each shard is a NumPy array
+with a structured dtype and one record per position, with the fields
+
+* ``game``: the index of the game the position is from,
+* ``weights_version``: the version of the weights that played the game,
+* ``state``: the state,
+* ``probs``: the target action probabilities,
+* ``outcome``: the outcome z for the player to play in the state,
+* ``full_search``: whether the move was chosen by a full search, and so
+  has a policy target (see `alphago.self_play_games.self_play`).
+
+Shards written before the ``full_search`` field existed are still read,
+and their positions are taken to have had a full search. New shards are
+always written with every field, including after such shards.
+
+Shards are written to a temporary file and then renamed, so a crash
+never leaves a partially written shard. Positions that have not been
+flushed when the process dies are lost. Shards are loaded memory-mapped,
+so reading the most recent positions, e.g. to refill the replay buffer
+after a restart, only reads the shards that contain them.
+
+Classes
+-------
+GameStore
+    An append-only, sharded store of self-play positions.
+"""
+import glob
+import os
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .replay_buffer import ReplayBuffer
+
+__all__ = ["GameStore"]
+
+
+class GameStore:
+    """An append-only store of self-play positions in .npy shards.
+
+    Parameters
+    ----------
+    directory: str
+        The directory holding the shards. It is created if it doesn't
+        exist, and positions are appended after any existing shards.
+    positions_per_shard: int
+        The number of positions to buffer in memory before writing them
+        to a new shard.
+
+    Attributes
+    ----------
+    num_positions: int
+        The number of positions in the store, including any that
+        haven't been flushed to disk yet.
+    num_games: int
+        The number of games in the store.
+    """
+
+    def __init__(self, directory: str, positions_per_shard: int = 65536) -> None:
+        if positions_per_shard < 1:
+            raise ValueError("`positions_per_shard` must be at least 1.")
+        self.directory = directory
+        self.positions_per_shard = positions_per_shard
+        os.makedirs(directory, exist_ok=True)
+
+        self._shard_files = sorted(glob.glob(os.path.join(directory, 'shard*.npy')))
+        self._shard_lengths = [len(self._load_shard(shard_file))
+                               for shard_file in self._shard_files]
+        self.dtype = None  # type: Optional[np.dtype]
+        self.num_games = 0
+        if self._shard_files:
+            last_shard = self._load_shard(self._shard_files[-1])
+            state_field, probs_field = last_shard.dtype['state'], last_shard.dtype['probs']
+            self.dtype = self._record_dtype(state_field.base, state_field.shape,
+                                            probs_field.shape)
+            self.num_games = int(last_shard['game'][-1]) + 1 if len(last_shard) else 0
+
+        self._pending = []  # type: List[Tuple]
+
+    @staticmethod
+    def _load_shard(shard_file: str) -> np.ndarray:
+        return np.load(shard_file, mmap_mode='r')
+
+    @staticmethod
+    def _record_dtype(state_dtype: np.dtype, state_shape: Tuple[int, ...],
+                      probs_shape: Tuple[int, ...]) -> np.dtype:
+        return np.dtype([('game', np.int64), ('weights_version', np.int64),
+                         ('state', state_dtype, state_shape),
+                         ('probs', np.float32, probs_shape),
+                         ('outcome', np.float32), ('full_search', np.bool_)])
+
+    @property
+    def num_positions(self) -> int:
+        return sum(self._shard_lengths) + len(self._pending)
+
+    def append_game(self, game_log: Iterable[Tuple], weights_version: int = 0) -> None:
+        """Add the positions of a self-play game, given as (state,
+        action, probs, z, full_search) tuples as returned by `self_play`,
+        played with the given version of the weights. Positions given
+        as (state, action, probs, z) tuples are taken to have had a
+        full search."""
+        for state, _, probs, z, *full_search in game_log:
+            if self.dtype is None:
+                state, probs = np.asarray(state), np.asarray(probs)
+                self.dtype = self._record_dtype(state.dtype, state.shape, probs.shape)
+            self._pending.append((self.num_games, weights_version, state, probs, z,
+                                  full_search[0] if full_search else True))
+            if len(self._pending) >= self.positions_per_shard:
+                self.flush()
+        self.num_games += 1
+
+    def flush(self) -> None:
+        """Write any buffered positions to a new shard."""
+        if not self._pending:
+            return
+        records = np.array(self._pending, dtype=self.dtype)
+
+        shard_file = os.path.join(
+            self.directory, 'shard{:06d}.npy'.format(len(self._shard_files)))
+        temporary_file = shard_file + '.tmp'
+        with open(temporary_file, 'wb') as f:
+            np.save(f, records)
+        os.replace(temporary_file, shard_file)
+
+        self._shard_files.append(shard_file)
+        self._shard_lengths.append(len(records))
+        self._pending = []
+
+    def iter_shards(self) -> Iterator[np.ndarray]:
+        """Iterate over the flushed shards, oldest first, as memory
+        mapped structured arrays."""
+        for shard_file in self._shard_files:
+            yield self._load_shard(shard_file)
+
+    def iter_games(self) -> Iterator[np.ndarray]:
+        """Iterate over the flushed games, oldest first, each as a
+        structured array of its positions. Only one shard is read at a
+        time."""
+        partial_game = None
+        for shard in self.iter_shards():
+            boundaries = np.flatnonzero(np.diff(shard['game'])) + 1
+            pieces = np.split(np.asarray(shard), boundaries)
+            if partial_game is not None:
+                if pieces[0]['game'][0] == partial_game['game'][0]:
+                    pieces[0] = np.concatenate([partial_game, pieces[0]])
+                else:
+                    yield partial_game
+            for piece in pieces[:-1]:
+                yield piece
+            partial_game = pieces[-1]
+        if partial_game is not None:
+            yield partial_game
+
+    def last_positions(self, num_positions: int) -> List[np.ndarray]:
+        """Returns the most recent flushed positions, up to
+        num_positions, as a list of memory mapped slices of shards,
+        oldest first."""
+        slices = []  # type: List[np.ndarray]
+        remaining = num_positions
+        for shard_file, length in zip(reversed(self._shard_files),
+                                      reversed(self._shard_lengths)):
+            if remaining <= 0:
+                break
+            shard = self._load_shard(shard_file)
+            slices.append(shard[max(0, length - remaining):])
+            remaining -= length
+        return slices[::-1]
+
+    def fill_replay_buffer(self, replay_buffer: ReplayBuffer) -> ReplayBuffer:
+        """Add the most recent flushed positions that fit to the replay
+        buffer, and return it."""
+        for records in self.last_positions(replay_buffer.capacity):
+            full_search = (records['full_search']
+                           if 'full_search' in records.dtype.names else True)
+            replay_buffer.extend_arrays(records['state'], records['probs'],
+                                        records['outcome'],
+                                        records['weights_version'], full_search)
+        return replay_buffer
+
+    def __len__(self) -> int:
+        return self.num_positions
+
+    def __repr__(self):
+        return "{0}({1!r}, positions={2})".format(
+            self.__class__.__name__, self.directory, self.num_positions)
@@ -1,2 +1,4 @@
 from .noughts_and_crosses import *
 from .connect_four import *
+from .mnk_game import *
+from .features import *
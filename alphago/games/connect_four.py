@@ -10,6 +10,7 @@ import subprocess
 import numpy as np
 
 from .game import Game
+from .zobrist import ZobristTable
 
 GameState, Action = Tuple[int, ...], int
 
@@ -21,6 +22,10 @@ class ConnectFour(Game):
         self.action_space = tuple(i for i in range(7))
         self.action_indices = {a: self.action_space.index(a) for a in
                                self.action_space}
+        self._zobrist = ZobristTable(42)
+        self._mirror_permutation = tuple(7 * row + 6 - col
+                                         for row in range(6)
+                                         for col in range(7))
 
     def current_player(self, state):
         """Returns the player to play in the current state.
@@ -181,6 +186,98 @@ class ConnectFour(Game):
 
         return next_states
 
+    def state_key(self, state):
+        """Returns the 64-bit Zobrist key of the state.
+
+        Parameters
+        ----------
+        state: tuple
+            A length 42 tuple representing a connect four grid.
+
+        Returns
+        -------
+        key: int
+            The key of the state. This is the same in every process.
+        """
+        player1_keys, player2_keys = self._zobrist.keys
+        key = 0
+        num_moves = 0
+        for square, marker in enumerate(state):
+            if marker == 1:
+                key ^= player1_keys[square]
+                num_moves += 1
+            elif marker == -1:
+                key ^= player2_keys[square]
+                num_moves += 1
+
+        if num_moves % 2 == 1:
+            key ^= self._zobrist.player_key
+        return key
+
+    def next_state_key(self, key, state, action):
+        """Returns the key of the state resulting from playing in column
+        'action', given the key of the current state.
+
+        Only the column played needs to be inspected to find the square
+        the counter lands on, so this is O(1) in the size of the board.
+
+        Parameters
+        ----------
+        key: int
+            The key of the state 'state'.
+        state: tuple
+            The state of the game before the action is taken.
+        action: int
+            The column to play in. This must be a legal action.
+
+        Returns
+        -------
+        key: int
+            The key of the next state.
+        """
+        for row in reversed(range(6)):
+            square = 7 * row + action
+            if not state[square]:
+                break
+
+        piece = self.current_player(state) - 1
+        return key ^ self._zobrist.keys[piece][square] ^ self._zobrist.player_key
+
+    def canonicalize(self, state):
+        """Returns the canonical representative of the state under
+        left-right reflection of the board.
+
+        Parameters
+        ----------
+        state: tuple
+            A length 42 tuple representing a connect four grid.
+
+        Returns
+        -------
+        canonical_state: tuple
+            The smaller (lexicographically) of the state and its mirror
+            image.
+        transform: int
+            0 if the canonical state is the state itself and 1 if it is
+            the mirror image.
+        """
+        state = tuple(state)
+        mirrored = tuple(state[square] for square in self._mirror_permutation)
+        if mirrored < state:
+            return mirrored, 1
+        return state, 0
+
+    def transform_action(self, action, transform):
+        """Maps a column onto the corresponding column in the image of
+        the board under the given transform."""
+        return 6 - action if transform else action
+
+    def inverse_transform_action(self, action, transform):
+        """Maps a column in the image of the board under the given
+        transform back onto the corresponding column. Reflection is its
+        own inverse."""
+        return self.transform_action(action, transform)
+
     @staticmethod
     def display(state):
         """Display the connect four state in a 2-D ASCII grid.
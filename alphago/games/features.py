@@ -0,0 +1,101 @@
+"""Bitboard features
+
+This module converts states of games that represent each player's
+board as a bitmask into arrays of 0s and 1s that can be fed to a neural
+network. The bits of a whole batch of boards are extracted at once with
+NumPy shifts and masks, rather than by formatting each board as a
+binary string and parsing it character by character.
+
+Boards with more than 64 squares, such as those of ultimate noughts and
+crosses, are split into 64-bit words before unpacking.
+
+Functions
+---------
+unpack_bits
+    Unpack an array of bitmasks into an array of bits.
+bitboard_features
+    Encode a batch of bitmask states as rows of network inputs.
+"""
+from typing import Sequence
+
+import numpy as np
+
+__all__ = ["unpack_bits", "bitboard_features"]
+
+_WORD_BITS = 64
+_WORD_MASK = (1 << _WORD_BITS) - 1
+
+
+def _split_words(boards, num_words: int) -> np.ndarray:
+    """Split arbitrarily large non-negative ints into 64-bit words, the
+    least significant word first."""
+    boards = np.asarray(boards, dtype=object)
+    words = [[(int(board) >> (_WORD_BITS * word)) & _WORD_MASK
+              for word in range(num_words)] for board in boards.ravel()]
+    return np.array(words, dtype=np.uint64).reshape(boards.shape + (num_words,))
+
+
+def unpack_bits(boards, num_bits: int, msb_first: bool = False) -> np.ndarray:
+    """Unpack bitmasks into arrays of their bits.
+
+    Parameters
+    ----------
+    boards: array_like
+        An array of non-negative ints, each representing a board as a
+        bitmask.
+    num_bits: int
+        The number of bits (squares) of each board.
+    msb_first: bool
+        If False, the ith entry of the unpacked bits is bit i of the
+        board. If True, the order is reversed, which matches formatting
+        the board as a binary string, e.g. with ``'{0:018b}'``.
+
+    Returns
+    -------
+    ndarray:
+        A uint8 array of shape ``np.shape(boards) + (num_bits,)``.
+    """
+    if num_bits <= _WORD_BITS:
+        words = np.asarray(boards, dtype=np.uint64)[..., np.newaxis]
+    else:
+        words = _split_words(boards, -(-num_bits // _WORD_BITS))
+
+    # Bit i of the board is bit (i % 64) of word (i // 64).
+    bit_indices = np.arange(num_bits)
+    if msb_first:
+        bit_indices = bit_indices[::-1]
+    shifts = (bit_indices % _WORD_BITS).astype(np.uint64)
+    bits = (words[..., bit_indices // _WORD_BITS] >> shifts) & np.uint64(1)
+    return bits.astype(np.uint8)
+
+
+def bitboard_features(states: Sequence, num_bits: int, num_boards: int = 2,
+                      msb_first: bool = True, dtype=np.float32) -> np.ndarray:
+    """Encode a batch of bitmask states as network inputs.
+
+    Parameters
+    ----------
+    states:
+        A sequence of states whose first ``num_boards`` entries are the
+        bitmask boards of each player, e.g. (player1_board,
+        player2_board, current_player). Any further entries are ignored.
+    num_bits: int
+        The number of squares of each board.
+    num_boards: int
+        The number of boards in each state.
+    msb_first: bool
+        The order of the bits of each board, as for `unpack_bits`.
+    dtype:
+        The dtype of the returned array.
+
+    Returns
+    -------
+    ndarray:
+        An array of shape (len(states), num_boards * num_bits) whose ith
+        row holds the bits of each board of the ith state in turn.
+    """
+    boards = [state[:num_boards] for state in states]
+    if num_bits <= _WORD_BITS:
+        boards = np.array(boards, dtype=np.uint64).reshape(-1, num_boards)
+    bits = unpack_bits(boards, num_bits, msb_first=msb_first)
+    return bits.reshape(len(states), num_boards * num_bits).astype(dtype)
@@ -1,6 +1,7 @@
-from typing import Any, Dict, Sequence
+from typing import Any, Dict, Sequence, Tuple
 
 import abc
+import hashlib
 
 GameState, Action = Any, Any
 
@@ -40,3 +41,48 @@ class Game(abc.ABC):
     def utility(self, state: GameState) -> Dict[int, float]:
         """Compute the utility of the given (terminal) state for each
         player."""
+
+    def state_key(self, state: GameState) -> int:
+        """Returns a 64-bit key for the given state.
+
+        Keys are stable across processes, so they can be shared between
+        workers and written to disk. Games should override this with a
+        Zobrist key where possible; the default implementation hashes
+        the repr of the state.
+        """
+        digest = hashlib.blake2b(repr(state).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+    def next_state_key(self, key: int, state: GameState,
+                       action: Action) -> int:
+        """Returns the key of the state resulting from taking the given
+        action in the given state, whose key is ``key``.
+
+        Games with Zobrist keys override this to update the key in O(1);
+        the default implementation computes the next state's key from
+        scratch.
+        """
+        return self.state_key(self.legal_actions(state)[action])
+
+    def canonicalize(self, state: GameState) -> Tuple[GameState, int]:
+        """Returns the canonical representative of the given state under
+        the symmetries of the game, together with the index of the
+        transform mapping the state onto it.
+
+        Equivalent states all have the same canonical state, so it can
+        be used as the key for caches and transposition tables. The
+        transform with index 0 is always the identity, which is all the
+        default implementation uses.
+        """
+        return state, 0
+
+    def transform_action(self, action: Action, transform: int) -> Action:
+        """Maps an action in a state onto the corresponding action in
+        the state's image under the given transform."""
+        return action
+
+    def inverse_transform_action(self, action: Action,
+                                 transform: int) -> Action:
+        """Maps an action in the image of a state under the given
+        transform back onto the corresponding action in the state."""
+        return action
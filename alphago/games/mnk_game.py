@@ -0,0 +1,174 @@
+"""m,n,k-game
+
+This module provides functionality for representing an m,n,k-game: a
+generalisation of noughts and crosses played on an m x n board, where
+the first player to get k of their symbols in a row (horizontally,
+vertically or diagonally) wins. For example, noughts and crosses is the
+3,3,3-game and free-style Gomoku is the 15,15,5-game.
+
+Classes
+-------
+MNKGame
+    A class for representing an m,n,k-game.
+"""
+from typing import Dict, List, Tuple
+
+from .noughts_and_crosses import GameState, NoughtsAndCrosses
+
+__all__ = ["MNKGame"]
+
+
+class MNKGame(NoughtsAndCrosses):
+    """A class to represent an m,n,k-game.
+
+    The game state, actions and bitboard layout are the same as for
+    ``NoughtsAndCrosses``, i.e. the square in row r and column c
+    corresponds to bit ``columns * r + c`` of each player's board.
+
+    Rather than enumerating every winning line, which grows with the
+    size of the board, k in a row is detected with shifts of the
+    player's bitboard. For each of the 4 directions, moving one square
+    along the direction corresponds to a fixed shift of the bitboard,
+    and the squares starting a run of length ``a + b`` are those
+    starting a run of length ``a`` whose square ``b`` steps along also
+    starts a run of length ``a`` (for b <= a). Doubling the run length
+    in this way means a win is found with O(log k) bitwise operations
+    per direction, independent of the number of lines on the board.
+    Each shift is masked with the squares for which the step stays on
+    the board, so runs do not wrap around the edges.
+
+    Attributes
+    ----------
+    rows, columns:
+        The number of rows and columns of the board.
+    k:
+        The number of symbols in a row needed to win.
+
+    Examples
+    --------
+    >>> from alphago.games import MNKGame
+    >>> gomoku = MNKGame(rows=15, columns=15, k=5)
+    >>> state = gomoku.initial_state
+    >>> for column in range(5):
+    ...     state = gomoku.legal_actions(state)[(7, column)]
+    ...     if column < 4:
+    ...         state = gomoku.legal_actions(state)[(0, column)]
+    >>> gomoku.is_terminal(state)
+    True
+    >>> gomoku.utility(state)
+    {1: 1, 2: -1}
+    """
+
+    _directions = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+    def __init__(self, rows: int = 3, columns: int = 3, k: int = 3) -> None:
+        if k < 1:
+            raise ValueError("k must be a positive integer.")
+        self.k = k
+        super().__init__(rows, columns)
+
+        self._full_board = (1 << self.rows * self.columns) - 1
+        self._run_steps = self._calculate_run_steps(self.k)
+        self._direction_shifts = [
+            self._calculate_direction_shift(direction)
+            for direction in self._directions
+        ]  # type: List[Tuple[int, Dict[int, int]]]
+
+    def _calculate_win_bitmasks(self) -> List[int]:
+        """Wins are detected with shifts rather than bitmasks for each
+        line, so no bitmasks are enumerated."""
+        return []
+
+    @staticmethod
+    def _calculate_run_steps(k: int) -> List[Tuple[int, int]]:
+        """Returns the (run_length, step) pairs used to extend runs of
+        length 1 to runs of length k, doubling the run length where
+        possible."""
+        run_steps = []
+        run_length = 1
+        while run_length < k:
+            step = min(run_length, k - run_length)
+            run_steps.append((run_length, step))
+            run_length += step
+        return run_steps
+
+    def _calculate_direction_shift(self, direction: Tuple[int, int]
+                                   ) -> Tuple[int, Dict[int, int]]:
+        """Returns the bit shift corresponding to one step in the given
+        direction, together with a dictionary mapping each step size
+        used in `_run_steps` to a bitmask of the squares from which
+        taking that many steps stays on the board."""
+        row_step, column_step = direction
+        shift = self.columns * row_step + column_step
+
+        valid_masks = {}
+        for _, step in self._run_steps:
+            mask = 0
+            for row in range(self.rows):
+                for column in range(self.columns):
+                    if (0 <= row + step * row_step < self.rows and
+                            0 <= column + step * column_step < self.columns):
+                        mask |= 1 << self.columns * row + column
+            valid_masks[step] = mask
+
+        return shift, valid_masks
+
+    def _has_k_in_a_row(self, board: int) -> bool:
+        """Returns whether the given player bitboard contains k squares
+        in a row in any direction."""
+        if self.k == 1:
+            return board != 0
+
+        for shift, valid_masks in self._direction_shifts:
+            runs = board
+            for _, step in self._run_steps:
+                runs &= (runs >> step * shift) & valid_masks[step]
+                if not runs:
+                    break
+            if runs:
+                return True
+        return False
+
+    def is_terminal(self, state: GameState) -> bool:
+        """Given a state, returns whether it is terminal, i.e. whether
+        the board is full or either player has k in a row.
+
+        Parameters
+        ---------
+        state:
+            An m,n,k-game state.
+
+        Returns
+        -------
+        bool:
+            Return ``True`` if the state is terminal or ``False`` if it
+            is not.
+        """
+        player1_board, player2_board, _ = state
+        return ((player1_board | player2_board) == self._full_board or
+                self._has_k_in_a_row(player1_board) or
+                self._has_k_in_a_row(player2_board))
+
+    def utility(self, state: GameState) -> Dict[int, int]:
+        """Given a terminal state, calculates the outcomes for both
+        players. These outcomes are given by +1, -1 and 0 for a win,
+        loss, or draw, respectively.
+
+        Raises
+        ------
+        ValueError:
+            If the input state is a non-terminal state.
+        """
+        player1_board, player2_board, _ = state
+        if self._has_k_in_a_row(player1_board):
+            return {1: 1, 2: -1}
+        if self._has_k_in_a_row(player2_board):
+            return {1: -1, 2: 1}
+        if (player1_board | player2_board) == self._full_board:
+            return {1: 0, 2: 0}
+        raise ValueError("Utility can not be calculated for a "
+                         "non-terminal state.")
+
+    def __repr__(self):
+        return "{0}({1}, {2}, {3})".format(self.__class__.__name__,
+                                           self.rows, self.columns, self.k)
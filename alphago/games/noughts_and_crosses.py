@@ -21,6 +21,8 @@ from typing import Dict, List, NamedTuple, Tuple
 import numpy as np
 
 from .game import Game
+from .symmetry import BitPermutation, grid_symmetries
+from .zobrist import ZobristTable
 
 __all__ = ["NoughtsAndCrosses", "UltimateNoughtsAndCrosses"]
 
@@ -131,6 +133,19 @@ class NoughtsAndCrosses(Game):
 
         self._win_bitmasks = self._calculate_win_bitmasks()
 
+        self._zobrist = ZobristTable(self.rows * self.columns)
+
+        symmetries = grid_symmetries(self.rows, self.columns)
+        self._bit_permutations = [BitPermutation(symmetry)
+                                  for symmetry in symmetries]
+        self._action_transforms = [
+            {action: self.action_space[symmetry[index]]
+             for index, action in enumerate(self.action_space)}
+            for symmetry in symmetries]
+        self._inverse_action_transforms = [
+            {image: action for action, image in action_transform.items()}
+            for action_transform in self._action_transforms]
+
     def _calculate_win_bitmasks(self) -> List[int]:
         """Construct bitmasks corresponding to each way to win noughts
         and crosses including wins by a full row, column or diagonal."""
@@ -347,6 +362,78 @@ class NoughtsAndCrosses(Game):
         next_player = (current_player % 2) + 1
         return GameState(*player_states, next_player)
 
+    def state_key(self, state: GameState) -> int:
+        """Returns the 64-bit Zobrist key of the given state.
+
+        Parameters
+        ----------
+        state:
+            A noughts and crosses game state.
+
+        Returns
+        -------
+        int:
+            The key of the state. This is the same in every process.
+        """
+        player1_board, player2_board, current_player = state
+        key = (self._zobrist.bitboard_key(0, player1_board) ^
+               self._zobrist.bitboard_key(1, player2_board))
+        if current_player == 2:
+            key ^= self._zobrist.player_key
+        return key
+
+    def next_state_key(self, key: int, state: GameState,
+                       action: Action) -> int:
+        """Given the key of a state and a legal action, return the key
+        of the state resulting from taking the action in O(1).
+        """
+        square = self.columns * action[0] + action[1]
+        piece = state[2] - 1
+        return key ^ self._zobrist.keys[piece][square] ^ self._zobrist.player_key
+
+    def canonicalize(self, state: GameState) -> Tuple[GameState, int]:
+        """Returns the canonical representative of the state under the
+        symmetries of the board and the index of the transform mapping
+        the state onto it.
+
+        A square board has 8 symmetries and a non-square board has 4.
+        The canonical state is the image with the smallest pair of
+        bitmasks, with ties broken in favour of the identity.
+
+        Parameters
+        ----------
+        state:
+            A noughts and crosses game state.
+
+        Returns
+        -------
+        GameState:
+            The canonical state.
+        int:
+            The index of the transform mapping the state onto the
+            canonical state. Use `transform_action` and
+            `inverse_transform_action` to map actions between the two.
+        """
+        player1_board, player2_board, current_player = state
+        canonical_boards, canonical_transform = None, 0
+        for transform, permute in enumerate(self._bit_permutations):
+            boards = (permute(player1_board), permute(player2_board))
+            if canonical_boards is None or boards < canonical_boards:
+                canonical_boards, canonical_transform = boards, transform
+
+        return GameState(*canonical_boards, current_player), canonical_transform
+
+    def transform_action(self, action: Action, transform: int) -> Action:
+        """Maps an action in a state onto the corresponding action in
+        the state's image under the given transform."""
+        return self._action_transforms[transform][action]
+
+    def inverse_transform_action(self, action: Action,
+                                 transform: int) -> Action:
+        """Maps an action in the image of a state under the given
+        transform back onto the corresponding action in the state."""
+        return self._inverse_action_transforms[transform][action]
+
     def display(self, state: GameState) -> None:
         """Display the noughts and crosses state in a 2-D ASCII grid.
 
@@ -391,17 +478,73 @@ class UltimateAction(NamedTuple):
 
 
 class UltimateGameState(NamedTuple):
-    last_sub_action: tuple
-    board: tuple
+    player1_boards: Tuple[int, ...]
+    player2_boards: Tuple[int, ...]
+    player1_meta_board: int
+    player2_meta_board: int
+    closed_meta_board: int
+    next_sub_board: int
+    current_player: int
 
 
-class UltimateNoughtsAndCrosses:
+def _calculate_sub_board_wins() -> Tuple[bool, ...]:
+    """Returns a lookup table whose ith entry is whether the 3x3 bitmask
+    i contains a full row, column or diagonal."""
+    lines = (0b000000111, 0b000111000, 0b111000000,
+             0b001001001, 0b010010010, 0b100100100,
+             0b100010001, 0b001010100)
+    return tuple(any(mask & line == line for line in lines)
+                 for mask in range(512))
+
+
+class UltimateNoughtsAndCrosses(Game):
     """A class to represent the game of ultimate noughts and crosses
-    (or tic-tac-toe)."""
+    (or tic-tac-toe).
+
+    The board is a 3x3 grid of noughts and crosses sub-boards. The
+    square a player plays in within a sub-board sends their opponent to
+    the corresponding sub-board, unless that sub-board is closed
+    (already won or full), in which case the opponent may play in any
+    open sub-board. Winning a sub-board claims the corresponding square
+    of the 3x3 meta-board, and the game is won by completing a line on
+    the meta-board.
+
+    The game state is represented by a named tuple consisting of
+        (player1_boards, player2_boards, player1_meta_board,
+         player2_meta_board, closed_meta_board, next_sub_board,
+         current_player)
+    where each player's boards are a tuple of nine 9-bit bitmasks, one
+    for each sub-board, and the meta-boards are 9-bit bitmasks of the
+    sub-boards won by each player and the sub-boards that are closed.
+    The meta-boards are maintained incrementally as moves are made, and
+    wins are detected with a lookup table over all 512 possible
+    sub-board bitmasks, so checking whether a state is terminal is
+    O(1). ``next_sub_board`` is the index of the sub-board that must be
+    played in, or -1 if the player may play in any open sub-board.
+
+    Sub-boards and the squares within them are indexed 0-8 in row-major
+    order, and actions are given by a named tuple (sub_board,
+    sub_action) of the (row, column) coordinates of the sub-board and
+    of the square within it.
+
+    Attributes
+    ----------
+    initial_state:
+        The empty board, where player 1 may play in any sub-board.
+    action_space:
+        A tuple of all 81 possible actions in the game.
+    action_indices:
+        A dictionary mapping each action to its index in the 9x9 grid in
+        row-major order.
+    """
+
+    _sub_board_wins = _calculate_sub_board_wins()
 
     def __init__(self) -> None:
-        self.initial_state = UltimateGameState((0, 0), (0,) * 81)
-        self.sub_game = NoughtsAndCrosses()
+        self.initial_state = UltimateGameState(
+            player1_boards=(0,) * 9, player2_boards=(0,) * 9,
+            player1_meta_board=0, player2_meta_board=0, closed_meta_board=0,
+            next_sub_board=-1, current_player=1)
         self.action_space = tuple(
             UltimateAction(sub_board, sub_action)
             for sub_board in itertools.product(range(3), range(3))
@@ -411,77 +554,275 @@ class UltimateNoughtsAndCrosses:
         self.index_to_action = {index: action for action, index
                                 in self.action_indices.items()}
 
+        self._zobrist = ZobristTable(81)
+        self._zobrist_next_sub_board = ZobristTable(10, num_pieces=1,
+                                                    seed=81).keys[0]
+
+        symmetries = grid_symmetries(3, 3)
+        self._bit_permutations = [BitPermutation(symmetry)
+                                  for symmetry in symmetries]
+        self._sub_board_permutations = symmetries
+        self._action_transforms = [
+            {UltimateAction(sub_board, sub_action): UltimateAction(
+                self._square_to_coordinates(symmetry[3 * sub_board[0] + sub_board[1]]),
+                self._square_to_coordinates(symmetry[3 * sub_action[0] + sub_action[1]]))
+             for sub_board, sub_action in self.action_space}
+            for symmetry in symmetries]
+        self._inverse_action_transforms = [
+            {image: action for action, image in action_transform.items()}
+            for action_transform in self._action_transforms]
+
     @staticmethod
     def _action_to_index(action: UltimateAction) -> int:
         sub_board_row, sub_board_col = action.sub_board
         sub_row, sub_col = action.sub_action
         return sub_board_row * 27 + sub_board_col * 3 + sub_row * 9 + sub_col
 
-    def _compute_meta_board(self, state: UltimateGameState) -> Tuple[int, ...]:
-        board = np.array(state.board).reshape(9, 9)
-        sub_boards = [board[i * 3:(i + 1) * 3, j * 3:(j + 1) * 3]
-                      for i in range(3) for j in range(3)]
-        meta_board = []
-        for sub_board in sub_boards:
-            sub_board_state = tuple(sub_board.ravel())
-            try:
-                utility = self.sub_game.utility(sub_board_state)
-            except ValueError:
-                symbol = 0
-            else:
-                sub_board_winner = max(utility, key=utility.get)
-                symbol = 1 if sub_board_winner == 1 else -1
-
-            meta_board.append(symbol)
-        return tuple(meta_board)
+    @staticmethod
+    def _square_to_coordinates(square: int) -> Tuple[int, int]:
+        return divmod(square, 3)
+
+    def state_from_board(self, board: Tuple[int, ...],
+                         next_sub_board: int = -1) -> UltimateGameState:
+        """Construct a game state from a 9x9 board.
+
+        Parameters
+        ----------
+        board:
+            A length 81 tuple giving the 9x9 board in row-major order,
+            with +1 for a player 1 move, -1 for a player 2 move and 0
+            for an empty square.
+        next_sub_board:
+            The index of the sub-board the next player must play in, or
+            -1 if they may play in any open sub-board.
+
+        Returns
+        -------
+        UltimateGameState:
+            The corresponding game state.
+        """
+        player1_boards, player2_boards = [0] * 9, [0] * 9
+        for index, marker in enumerate(board):
+            if marker:
+                row, column = divmod(index, 9)
+                sub_board = 3 * (row // 3) + column // 3
+                square = 3 * (row % 3) + column % 3
+                boards = player1_boards if marker == 1 else player2_boards
+                boards[sub_board] |= 1 << square
+
+        player1_meta_board = player2_meta_board = closed_meta_board = 0
+        for sub_board in range(9):
+            if self._sub_board_wins[player1_boards[sub_board]]:
+                player1_meta_board |= 1 << sub_board
+            elif self._sub_board_wins[player2_boards[sub_board]]:
+                player2_meta_board |= 1 << sub_board
+            elif player1_boards[sub_board] | player2_boards[sub_board] != 0b111111111:
+                continue
+            closed_meta_board |= 1 << sub_board
+
+        num_moves = sum(1 for marker in board if marker)
+        return UltimateGameState(tuple(player1_boards), tuple(player2_boards),
+                                 player1_meta_board, player2_meta_board,
+                                 closed_meta_board, next_sub_board,
+                                 num_moves % 2 + 1)
 
     def is_terminal(self, state: UltimateGameState) -> bool:
-        meta_board = self._compute_meta_board(state)
-        return self.sub_game.is_terminal(meta_board)
+        """Given a state, returns whether it is terminal, i.e. whether
+        either player has won a line of sub-boards or all the sub-boards
+        are closed."""
+        return (self._sub_board_wins[state.player1_meta_board] or
+                self._sub_board_wins[state.player2_meta_board] or
+                state.closed_meta_board == 0b111111111)
 
     def utility(self, state: UltimateGameState) -> Dict[int, int]:
-        meta_board = self._compute_meta_board(state)
-        return self.sub_game.utility(meta_board)
+        """Given a terminal state, calculates the outcomes for both
+        players. These outcomes are given by +1, -1 and 0 for a win,
+        loss, or draw, respectively.
+
+        Raises
+        ------
+        ValueError:
+            If the input state is a non-terminal state.
+        """
+        if self._sub_board_wins[state.player1_meta_board]:
+            return {1: 1, 2: -1}
+        if self._sub_board_wins[state.player2_meta_board]:
+            return {1: -1, 2: 1}
+        if state.closed_meta_board == 0b111111111:
+            return {1: 0, 2: 0}
+        raise ValueError("Utility can not be calculated for a "
+                         "non-terminal state.")
 
     def current_player(self, state: UltimateGameState) -> int:
-        return self.sub_game.current_player(state.board)
+        """Given a state, return the player whose turn it is."""
+        return state.current_player
+
+    def legal_actions(self, state: UltimateGameState
+                      ) -> Dict[UltimateAction, UltimateGameState]:
+        """Given a non-terminal state, generate a dictionary mapping
+        legal actions onto their resulting game states.
 
-    def compute_next_states(self, state: UltimateGameState
-                            ) -> Dict[UltimateAction, UltimateGameState]:
+        Raises
+        ------
+        ValueError:
+            If the input state is a terminal state.
+        """
         if self.is_terminal(state):
-            raise ValueError("Next states can not be generated for a "
+            raise ValueError("Legal actions can not be computed for a "
                              "terminal state.")
-        board = np.array(state.board).reshape(9, 9)
-        sub_board_row, sub_board_col = state.last_sub_action
-        sub_board = board[sub_board_row * 3:(sub_board_row + 1) * 3,
-                    sub_board_col * 3:(sub_board_col + 1) * 3]
-        sub_board_state = tuple(sub_board.ravel())
 
-        player_symbol = 1 if self.which_player(state) == 1 else -1
+        if state.next_sub_board == -1:
+            sub_boards = [sub_board for sub_board in range(9)
+                          if not state.closed_meta_board & 1 << sub_board]
+        else:
+            sub_boards = [state.next_sub_board]
 
         next_states = {}
-        if state == self.initial_state or self.sub_game.is_terminal(sub_board_state):
-            [available_action_indices] = np.where(np.asarray(state.board) == 0)
-            for action_index in available_action_indices:
-                action = self.index_to_action[action_index]
-                next_board = list(state.board)
-                next_board[action_index] = player_symbol
-                next_state = UltimateGameState(
-                    last_sub_action=action.sub_action, board=tuple(next_board))
-                next_states[action] = next_state
-            return next_states
+        for sub_board in sub_boards:
+            occupied = (state.player1_boards[sub_board] |
+                        state.player2_boards[sub_board])
+            for square in range(9):
+                if not occupied & 1 << square:
+                    action = UltimateAction(
+                        self._square_to_coordinates(sub_board),
+                        self._square_to_coordinates(square))
+                    next_states[action] = self._next_state(state, sub_board, square)
+
+        return next_states
+
+    def _next_state(self, state: UltimateGameState, sub_board: int,
+                    square: int) -> UltimateGameState:
+        """Return the state resulting from the current player playing in
+        the given square of the given sub-board, updating the
+        meta-boards incrementally."""
+        (player1_boards, player2_boards, player1_meta_board,
+         player2_meta_board, closed_meta_board, _, current_player) = state
+
+        sub_board_bit = 1 << sub_board
+        if current_player == 1:
+            boards = list(player1_boards)
+            boards[sub_board] |= 1 << square
+            player1_boards = tuple(boards)
+            if self._sub_board_wins[boards[sub_board]]:
+                player1_meta_board |= sub_board_bit
+                closed_meta_board |= sub_board_bit
         else:
-            available_sub_actions = tuple(zip(*np.where(sub_board == 0)))
-            for sub_action in available_sub_actions:
-                action = UltimateAction(sub_board=(sub_board_row, sub_board_col),
-                                        sub_action=sub_action)
-                next_board = list(state.board)
-                next_board[self.action_indices[action]] = player_symbol
-                next_state = UltimateGameState(
-                    last_sub_action=action.sub_action, board=tuple(next_board))
-                next_states[action] = next_state
-            return next_states
+            boards = list(player2_boards)
+            boards[sub_board] |= 1 << square
+            player2_boards = tuple(boards)
+            if self._sub_board_wins[boards[sub_board]]:
+                player2_meta_board |= sub_board_bit
+                closed_meta_board |= sub_board_bit
+
+        if player1_boards[sub_board] | player2_boards[sub_board] == 0b111111111:
+            closed_meta_board |= sub_board_bit
+
+        next_sub_board = -1 if closed_meta_board & 1 << square else square
+        return UltimateGameState(player1_boards, player2_boards,
+                                 player1_meta_board, player2_meta_board,
+                                 closed_meta_board, next_sub_board,
+                                 current_player % 2 + 1)
+
+    def state_key(self, state: UltimateGameState) -> int:
+        """Returns the 64-bit Zobrist key of the given state."""
+        key = self._zobrist_next_sub_board[state.next_sub_board + 1]
+        for sub_board in range(9):
+            offset = 9 * sub_board
+            for piece, board in enumerate((state.player1_boards[sub_board],
+                                           state.player2_boards[sub_board])):
+                piece_keys = self._zobrist.keys[piece]
+                while board:
+                    lowest_bit = board & -board
+                    key ^= piece_keys[offset + lowest_bit.bit_length() - 1]
+                    board ^= lowest_bit
+        if state.current_player == 2:
+            key ^= self._zobrist.player_key
+        return key
+
+    def next_state_key(self, key: int, state: UltimateGameState,
+                       action: UltimateAction) -> int:
+        """Given the key of a state and a legal action, return the key
+        of the state resulting from taking the action in O(1)."""
+        sub_board = 3 * action.sub_board[0] + action.sub_board[1]
+        square = 3 * action.sub_action[0] + action.sub_action[1]
+        next_state = self._next_state(state, sub_board, square)
+        return (key ^ self._zobrist.keys[state.current_player - 1][9 * sub_board + square] ^
+                self._zobrist.player_key ^
+                self._zobrist_next_sub_board[state.next_sub_board + 1] ^
+                self._zobrist_next_sub_board[next_state.next_sub_board + 1])
+
+    def canonicalize(self, state: UltimateGameState
+                     ) -> Tuple[UltimateGameState, int]:
+        """Returns the canonical representative of the state under the 8
+        symmetries of the board and the index of the transform mapping
+        the state onto it.
+
+        Each symmetry permutes the sub-boards and, in the same way, the
+        squares within each sub-board and the meta-boards.
+        """
+        canonical_state, canonical_transform = None, 0
+        for transform, permute in enumerate(self._bit_permutations):
+            sub_board_permutation = self._sub_board_permutations[transform]
+            player1_boards, player2_boards = [0] * 9, [0] * 9
+            for sub_board, image in enumerate(sub_board_permutation):
+                player1_boards[image] = permute(state.player1_boards[sub_board])
+                player2_boards[image] = permute(state.player2_boards[sub_board])
+            next_sub_board = state.next_sub_board
+            if next_sub_board != -1:
+                next_sub_board = sub_board_permutation[next_sub_board]
+            image_state = UltimateGameState(
+                tuple(player1_boards), tuple(player2_boards),
+                permute(state.player1_meta_board),
+                permute(state.player2_meta_board),
+                permute(state.closed_meta_board), next_sub_board,
+                state.current_player)
+            if canonical_state is None or image_state < canonical_state:
+                canonical_state, canonical_transform = image_state, transform
+
+        return canonical_state, canonical_transform
+
+    def transform_action(self, action: UltimateAction,
+                         transform: int) -> UltimateAction:
+        """Maps an action in a state onto the corresponding action in
+        the state's image under the given transform."""
+        return self._action_transforms[transform][action]
+
+    def inverse_transform_action(self, action: UltimateAction,
+                                 transform: int) -> UltimateAction:
+        """Maps an action in the image of a state under the given
+        transform back onto the corresponding action in the state."""
+        return self._inverse_action_transforms[transform][action]
 
     def display(self, state: UltimateGameState) -> None:
-        game = NoughtsAndCrosses(rows=9, columns=9)
-        game.display(state.board)
+        """Display the state in a 2-D ASCII grid, with the sub-boards
+        separated by double lines.
+
+        Parameters
+        ---------
+        state:
+            An ultimate noughts and crosses state to be printed to
+            stdout.
+        """
+        row_strings = []
+        for row in range(9):
+            symbols = []
+            for column in range(9):
+                sub_board = 3 * (row // 3) + column // 3
+                square_bit = 1 << 3 * (row % 3) + column % 3
+                if state.player1_boards[sub_board] & square_bit:
+                    symbols.append(" x ")
+                elif state.player2_boards[sub_board] & square_bit:
+                    symbols.append(" o ")
+                else:
+                    symbols.append("   ")
+            row_strings.append("||".join("|".join(symbols[i:i + 3])
+                                         for i in (0, 3, 6)))
+
+        divider = "\n" + "++".join(["+".join(["---"] * 3)] * 3) + "\n"
+        thick_divider = "\n" + "##".join(["=".join(["==="] * 3)] * 3) + "\n"
+        ascii_grid = thick_divider.join(divider.join(row_strings[i:i + 3])
+                                        for i in (0, 3, 6))
+        print(ascii_grid)
+
+    def __repr__(self):
+        return "{0}()".format(self.__class__.__name__)
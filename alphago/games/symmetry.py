@@ -0,0 +1,115 @@
+"""Board symmetries
+
+This module provides functionality for exploiting the symmetries of
+rectangular boards represented as bitmasks, where the square in row r
+and column c corresponds to bit ``columns * r + c``.
+
+A square board has the 8 symmetries of the dihedral group (rotations
+and reflections), whereas a non-square board only has 4 (the identity,
+reflection in either axis and rotation by 180 degrees). Each symmetry
+is represented as a permutation of the squares, which is applied to a
+bitmask with precomputed byte lookup tables.
+
+Classes
+-------
+BitPermutation
+    A permutation of the bits of a bitmask.
+
+Functions
+---------
+grid_symmetries
+    Compute the square permutations corresponding to the symmetries of
+    a rectangular board.
+"""
+from typing import List, Sequence, Tuple
+
+__all__ = ["BitPermutation", "grid_symmetries"]
+
+
+class BitPermutation:
+    """A permutation of the bits of a bitmask.
+
+    The permutation is applied 8 bits at a time, using a lookup table
+    for each byte of the bitmask that maps each of the 256 possible byte
+    values to the permuted bits it contributes.
+
+    Parameters
+    ----------
+    permutation:
+        A sequence with ith entry the position bit i is moved to.
+    """
+
+    def __init__(self, permutation: Sequence[int]) -> None:
+        self.permutation = tuple(permutation)
+        self._byte_tables = []  # type: List[Tuple[int, ...]]
+        for offset in range(0, len(self.permutation), 8):
+            targets = self.permutation[offset:offset + 8]
+            table = []
+            for byte in range(256):
+                permuted = 0
+                for bit, target in enumerate(targets):
+                    if byte >> bit & 1:
+                        permuted |= 1 << target
+                table.append(permuted)
+            self._byte_tables.append(tuple(table))
+
+    def __call__(self, bitmask: int) -> int:
+        """Returns the bitmask with its bits permuted."""
+        permuted = 0
+        for table in self._byte_tables:
+            if not bitmask:
+                break
+            permuted |= table[bitmask & 0xFF]
+            bitmask >>= 8
+        return permuted
+
+    def inverse(self) -> "BitPermutation":
+        """Returns the inverse permutation."""
+        inverse = [0] * len(self.permutation)
+        for source, target in enumerate(self.permutation):
+            inverse[target] = source
+        return BitPermutation(inverse)
+
+
+def grid_symmetries(rows: int, columns: int) -> List[Tuple[int, ...]]:
+    """Computes the symmetries of a rows x columns board as permutations
+    of its squares.
+
+    The first symmetry is always the identity.
+
+    Parameters
+    ----------
+    rows, columns:
+        The dimensions of the board.
+
+    Returns
+    -------
+    list:
+        A list of permutations, each given as a tuple with ith entry
+        the square that square i is mapped to.
+    """
+    last_row, last_column = rows - 1, columns - 1
+    transforms = [
+        lambda r, c: (r, c),
+        lambda r, c: (r, last_column - c),
+        lambda r, c: (last_row - r, c),
+        lambda r, c: (last_row - r, last_column - c),
+    ]
+    if rows == columns:
+        transforms += [
+            lambda r, c: (c, r),
+            lambda r, c: (c, last_row - r),
+            lambda r, c: (last_column - c, r),
+            lambda r, c: (last_column - c, last_row - r),
+        ]
+
+    symmetries = []
+    for transform in transforms:
+        permutation = []
+        for row in range(rows):
+            for column in range(columns):
+                new_row, new_column = transform(row, column)
+                permutation.append(columns * new_row + new_column)
+        symmetries.append(tuple(permutation))
+
+    return symmetries
@@ -0,0 +1,104 @@
+"""Zobrist hashing
+
+This module provides deterministic 64-bit Zobrist keys for board games.
+The key of a position is the XOR of a random number for each occupied
+(piece, square) pair, together with a random number if it is the
+second player's turn. Making a move therefore only requires XORing in
+the key of the square played and toggling the side to move, which is
+O(1) per move.
+
+The random numbers are generated by a SplitMix64 generator from a fixed
+seed, rather than from Python's ``hash`` or NumPy's global random
+state, so that keys are identical across processes, platforms and
+library versions. This means keys can be shared between workers and
+written to disk.
+
+Classes
+-------
+ZobristTable
+    A table of random 64-bit keys for each piece on each square.
+"""
+from typing import Iterator, List
+
+__all__ = ["ZobristTable", "splitmix64"]
+
+MASK_64 = (1 << 64) - 1
+DEFAULT_SEED = 0x5EED
+
+
+def splitmix64(seed: int) -> Iterator[int]:
+    """Generate an infinite stream of pseudo-random 64-bit integers
+    with the SplitMix64 algorithm.
+
+    Parameters
+    ----------
+    seed:
+        The seed for the generator.
+
+    Yields
+    ------
+    int
+        A pseudo-random unsigned 64-bit integer.
+    """
+    state = seed & MASK_64
+    while True:
+        state = (state + 0x9E3779B97F4A7C15) & MASK_64
+        z = state
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK_64
+        yield z ^ (z >> 31)
+
+
+class ZobristTable:
+    """A table of random 64-bit keys for hashing board positions.
+
+    Parameters
+    ----------
+    num_squares:
+        The number of squares on the board.
+    num_pieces:
+        The number of distinct pieces that can occupy a square, e.g. 2
+        for noughts and crosses.
+    seed:
+        The seed used to generate the keys. Tables constructed with the
+        same arguments always contain the same keys.
+
+    Attributes
+    ----------
+    keys: list
+        A list of lists with ``keys[piece][square]`` the key for
+        ``piece`` occupying ``square``.
+    player_key: int
+        The key to XOR in when it is the second player's turn.
+    """
+
+    def __init__(self, num_squares: int, num_pieces: int = 2,
+                 seed: int = DEFAULT_SEED) -> None:
+        generator = splitmix64(seed)
+        self.keys = [[next(generator) for _ in range(num_squares)]
+                     for _ in range(num_pieces)]  # type: List[List[int]]
+        self.player_key = next(generator)
+
+    def bitboard_key(self, piece: int, bitboard: int) -> int:
+        """Returns the XOR of the keys for ``piece`` on each of the
+        squares set in ``bitboard``.
+
+        Parameters
+        ----------
+        piece:
+            The index of the piece.
+        bitboard:
+            An int whose ith bit is set if ``piece`` occupies square i.
+
+        Returns
+        -------
+        int:
+            The combined key of the occupied squares.
+        """
+        piece_keys = self.keys[piece]
+        key = 0
+        while bitboard:
+            lowest_bit = bitboard & -bitboard
+            key ^= piece_keys[lowest_bit.bit_length() - 1]
+            bitboard ^= lowest_bit
+        return key
@@ -0,0 +1,231 @@
+"""Batched neural network inference
+
+This module provides an in-process inference server that lets many
+threads or coroutines share a single neural network estimator. Each
+call is queued, and a worker thread evaluates the queued states in a
+single batch once either the maximum batch size is reached or the
+oldest request has waited for the maximum wait time. This amortises the
+cost of a session run over many states when, for example, several
+self-play games are searching in parallel.
+
+Classes
+-------
+InferenceServer
+    A server that evaluates states in dynamically sized batches.
+InferenceStats
+    A summary of the requests handled by an inference server.
+"""
+import asyncio
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+__all__ = ["InferenceServer", "InferenceStats"]
+
+
+class InferenceStats(NamedTuple):
+    requests: int
+    batches: int
+    queue_depth: int
+    batch_size_histogram: Dict[int, int]
+    mean_batch_size: float
+    mean_latency: float
+    max_latency: float
+
+
+class _Request(NamedTuple):
+    state: Any
+    future: Future
+    submitted: float
+
+
+class InferenceServer:
+    """An in-process server that evaluates states with an estimator in
+    dynamically sized batches.
+
+    The server can be used wherever an estimator is expected, e.g. by
+    `mcts`, since calling it on a state blocks until the state has been
+    evaluated and returns the prior probabilities and value.
+
+    Parameters
+    ----------
+    estimator: AbstractNeuralNetEstimator
+        The estimator to evaluate states with. It must provide
+        `predict_batch` and `action_indices`.
+    max_batch_size: int
+        The maximum number of states to evaluate in a single batch.
+    max_wait: float
+        The maximum time in seconds to wait for further requests after
+        the first request of a batch arrives.
+
+    Examples
+    --------
+    >>> with InferenceServer(estimator, max_batch_size=16) as server:
+    ...     action_probs = mcts(root, game, server, mcts_iters, c_puct)
+    """
+
+    def __init__(self, estimator, max_batch_size: int = 32,
+                 max_wait: float = 1e-3) -> None:
+        if max_batch_size < 1:
+            raise ValueError("`max_batch_size` must be at least 1.")
+        self.estimator = estimator
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue = queue.Queue()  # type: queue.Queue
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+        self._running = True
+        self._worker = threading.Thread(target=self._serve, daemon=True,
+                                        name="InferenceServer")
+        self._worker.start()
+
+    def _reset_stats(self) -> None:
+        self._num_requests = 0
+        self._batch_sizes = Counter()  # type: Counter
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+    def submit(self, state) -> Future:
+        """Queue a state for evaluation.
+
+        Parameters
+        ----------
+        state:
+            The state to evaluate.
+
+        Returns
+        -------
+        Future:
+            A future whose result is the pair (prior_probs, value) the
+            estimator would return for the state.
+        """
+        if not self._running:
+            raise RuntimeError("The inference server has been closed.")
+        future = Future()  # type: Future
+        self._queue.put(_Request(state, future, time.perf_counter()))
+        return future
+
+    def __call__(self, state) -> Tuple[Dict[Any, float], float]:
+        """Evaluate the state, blocking until its batch has been run.
+
+        Returns
+        -------
+        prior_probs: dict
+            A dictionary from actions to probabilities.
+        value: float
+            The value of the state.
+        """
+        return self.submit(state).result()
+
+    async def evaluate(self, state) -> Tuple[Dict[Any, float], float]:
+        """Evaluate the state from a coroutine without blocking the
+        event loop."""
+        return await asyncio.wrap_future(self.submit(state))
+
+    def _serve(self) -> None:
+        """Repeatedly collect a batch of requests and evaluate it."""
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = request.submitted + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    request = (self._queue.get(timeout=timeout) if timeout > 0
+                               else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._evaluate(batch)
+                    return
+                batch.append(request)
+            self._evaluate(batch)
+
+    def _evaluate(self, batch: List[_Request]) -> None:
+        """Evaluate a batch of requests and resolve their futures."""
+        try:
+            probs, values = self.estimator.predict_batch(
+                [request.state for request in batch])
+        except Exception as exception:
+            for request in batch:
+                request.future.set_exception(exception)
+            return
+
+        action_indices = self.estimator.action_indices
+        finished = time.perf_counter()
+        for row, request in enumerate(batch):
+            probs_dict = {action: probs[row, index]
+                          for action, index in action_indices.items()}
+            request.future.set_result((probs_dict, values[row]))
+
+        latencies = [finished - request.submitted for request in batch]
+        with self._stats_lock:
+            self._num_requests += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            self._total_latency += sum(latencies)
+            self._max_latency = max(self._max_latency, max(latencies))
+
+    def stats(self, reset: bool = False) -> InferenceStats:
+        """Returns statistics on the requests handled so far.
+
+        Parameters
+        ----------
+        reset: bool
+            If True, reset the statistics after reading them.
+
+        Returns
+        -------
+        InferenceStats:
+            The number of requests and batches evaluated, the number of
+            requests currently queued, a histogram mapping batch sizes
+            to the number of batches of that size, the mean batch size
+            and the mean and maximum latency in seconds between a
+            request being submitted and its result being available.
+        """
+        with self._stats_lock:
+            num_batches = sum(self._batch_sizes.values())
+            stats = InferenceStats(
+                requests=self._num_requests,
+                batches=num_batches,
+                queue_depth=self._queue.qsize(),
+                batch_size_histogram=dict(sorted(self._batch_sizes.items())),
+                mean_batch_size=(self._num_requests / num_batches
+                                 if num_batches else 0.0),
+                mean_latency=(self._total_latency / self._num_requests
+                              if self._num_requests else 0.0),
+                max_latency=self._max_latency)
+            if reset:
+                self._reset_stats()
+        return stats
+
+    def close(self) -> None:
+        """Evaluate any queued requests and stop the worker thread."""
+        if self._running:
+            self._running = False
+            self._queue.put(None)
+            self._worker.join()
+
+            # Fail any requests submitted while the server was closing.
+            while not self._queue.empty():
+                request = self._queue.get_nowait()
+                if request is not None:
+                    request.future.set_exception(
+                        RuntimeError("The inference server has been closed."))
+
+    def __enter__(self) -> "InferenceServer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __repr__(self):
+        return "{0}({1}, max_batch_size={2}, max_wait={3})".format(
+            self.__class__.__name__, self.estimator, self.max_batch_size,
+            self.max_wait)
@@ -0,0 +1,307 @@
+"""Parallel matches, tournaments and gauntlets
+
+This module plays the games of `evaluate`, `run_tournament` and
+`run_gauntlet` (see `alphago.evaluator`) in a pool of worker processes.
+Players can't be sent to other processes, since their estimators hold
+closures and TensorFlow sessions. Instead, each player is described by
+a picklable `PlayerSpec`, and each worker builds its own players from
+the specs the first time it needs them.
+
+Every game is played with its own seed and tagged with its index in
+the schedule, and the results are merged in that order. The results
+are therefore the same for any number of workers.
+
+Classes
+-------
+EstimatorSpec
+    A picklable description of an estimator.
+PlayerSpec
+    A picklable description of a player.
+
+Functions
+---------
+evaluate_parallel
+    The parallel counterpart of `evaluate`.
+run_tournament_parallel
+    The parallel counterpart of `run_tournament`.
+run_gauntlet_parallel
+    The parallel counterpart of `run_gauntlet`.
+"""
+import itertools
+import multiprocessing
+import random
+from collections import defaultdict
+from typing import (Any, Callable, Dict, List, NamedTuple, Optional, Sequence,
+                    Tuple)
+
+import numpy as np
+from tqdm import tqdm
+
+from .evaluator import GameLog, PlayerNo, PlayerResults, Position, play, update_results
+from .games import Game
+from .player import MCTSPlayer, Player, RandomPlayer
+
+__all__ = ["EstimatorSpec", "PlayerSpec", "evaluate_parallel",
+           "run_tournament_parallel", "run_gauntlet_parallel"]
+
+
+class EstimatorSpec(NamedTuple):
+    """A picklable description of an estimator, built into an estimate
+    function by `build`.
+
+    Use the constructors `trivial`, `rollout`, `numpy` and `checkpoint`
+    rather than setting the fields directly.
+    """
+    kind: str
+    num_rollouts: Optional[int] = None
+    estimator_class: Optional[type] = None
+    weights_file: Optional[str] = None
+    create_estimator: Optional[Callable] = None
+
+    @classmethod
+    def trivial(cls) -> "EstimatorSpec":
+        """The estimator returned by `create_trivial_estimator`."""
+        return cls('trivial')
+
+    @classmethod
+    def rollout(cls, num_rollouts: int) -> "EstimatorSpec":
+        """The estimator returned by `create_rollout_estimator`."""
+        return cls('rollout', num_rollouts=num_rollouts)
+
+    @classmethod
+    def numpy(cls, estimator_class: type, weights_file: str) -> "EstimatorSpec":
+        """A NumPy estimator loaded from an .npz file written by
+        `NumpyNetEstimator.save`."""
+        return cls('numpy', estimator_class=estimator_class,
+                   weights_file=weights_file)
+
+    @classmethod
+    def checkpoint(cls, create_estimator: Callable,
+                   checkpoint: str) -> "EstimatorSpec":
+        """A TensorFlow estimator created by calling create_estimator,
+        which must be picklable (e.g. a module level function or a
+        functools.partial of an estimator class), and restored from
+        the checkpoint."""
+        return cls('checkpoint', weights_file=checkpoint,
+                   create_estimator=create_estimator)
+
+    def build(self, game: Game) -> Callable:
+        """Returns the estimate function described by the spec."""
+        from .estimator import create_rollout_estimator, create_trivial_estimator
+
+        if self.kind == 'trivial':
+            return create_trivial_estimator(game)
+        if self.kind == 'rollout':
+            return create_rollout_estimator(game, self.num_rollouts)
+        if self.kind == 'numpy':
+            return self.estimator_class.load(
+                self.weights_file, game.action_indices).create_estimate_fn()
+        if self.kind == 'checkpoint':
+            estimator = self.create_estimator()
+            estimator.restore(self.weights_file)
+            return estimator.create_estimate_fn()
+        raise ValueError("Unknown estimator kind: {}.".format(self.kind))
+
+
+class PlayerSpec(NamedTuple):
+    """A picklable description of a player, built by `build`.
+
+    Parameters
+    ----------
+    player_class:
+        The class of the player.
+    estimator:
+        If given, the estimate function is built and passed to the
+        player after the game, as MCTSPlayer expects.
+    kwargs:
+        Further keyword arguments to construct the player with.
+    """
+    player_class: type
+    estimator: Optional[EstimatorSpec] = None
+    kwargs: Tuple[Tuple[str, Any], ...] = ()
+
+    @classmethod
+    def random(cls) -> "PlayerSpec":
+        return cls(RandomPlayer)
+
+    @classmethod
+    def mcts(cls, estimator: EstimatorSpec, mcts_iters: int, c_puct: float,
+             tau: float = 1) -> "PlayerSpec":
+        return cls(MCTSPlayer, estimator, (('mcts_iters', mcts_iters),
+                                           ('c_puct', c_puct), ('tau', tau)))
+
+    def build(self, game: Game) -> Player:
+        """Returns the player described by the spec."""
+        if self.estimator is not None:
+            return self.player_class(game, self.estimator.build(game),
+                                     **dict(self.kwargs))
+        return self.player_class(game, **dict(self.kwargs))
+
+
+class _Match(NamedTuple):
+    index: int
+    seed: int
+    players: Tuple[Any, Any]
+
+
+# The state of a worker process, set by `_initialise_worker`.
+_worker = {}  # type: Dict[str, Any]
+
+
+def _initialise_worker(game: Game, player_specs: Dict[Any, PlayerSpec]) -> None:
+    _worker.update(game=game, player_specs=player_specs, players={})
+
+
+def _get_player(key) -> Player:
+    """Build the player with the given key, or return the one built
+    before."""
+    players = _worker['players']
+    if key not in players:
+        players[key] = _worker['player_specs'][key].build(_worker['game'])
+    return players[key]
+
+
+def _play_match(match: _Match) -> Tuple[int, GameLog]:
+    random.seed(match.seed)
+    np.random.seed(match.seed)
+    players = {1: _get_player(match.players[0]), 2: _get_player(match.players[1])}
+    actions, game_states, utility = play(_worker['game'], players)
+    return match.index, GameLog(utility[1], actions, game_states)
+
+
+def _play_matches(game: Game, player_specs: Dict[Any, PlayerSpec],
+                  pairings: Sequence[Tuple[Any, Any]], num_workers: int,
+                  seed: Optional[int], verbose: bool) -> List[GameLog]:
+    """Play a game for each pairing of player keys in a pool of
+    processes, returning the game logs in the order of the pairings."""
+    if num_workers < 1:
+        raise ValueError("`num_workers` must be at least 1.")
+
+    seeds = np.random.RandomState(seed).randint(2 ** 31, size=len(pairings))
+    matches = [_Match(index, int(match_seed), pairing)
+               for index, (match_seed, pairing) in enumerate(zip(seeds, pairings))]
+
+    game_logs = [None] * len(matches)  # type: List[Any]
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(num_workers, initializer=_initialise_worker,
+                      initargs=(game, player_specs)) as pool:
+        # Small chunks keep the workers balanced, since game lengths vary.
+        chunksize = max(1, len(matches) // (4 * num_workers))
+        results = pool.imap_unordered(_play_match, matches, chunksize=chunksize)
+        for index, game_log in tqdm(results, total=len(matches),
+                                    disable=not verbose):
+            game_logs[index] = game_log
+    return game_logs
+
+
+def evaluate_parallel(game: Game, player_specs: Dict[Position, PlayerSpec],
+                      num_games: int, num_workers: int, seed: Optional[int] = None,
+                      verbose: bool = True
+                      ) -> Tuple[PlayerResults, List[GameLog]]:
+    """Compare two players, playing the games in parallel. Returns the
+    number of player1 wins, losses and draws and the game logs, as for
+    `evaluate`.
+
+    Parameters
+    ----------
+    game:
+        An object representing the game to be played. It must be
+        picklable.
+    player_specs:
+        Specs of the players to evaluate against each other, given as a
+        dictionary with keys the position to play in (either 1 or 2).
+    num_games:
+        The number of games to be played.
+    num_workers:
+        The number of worker processes.
+    seed:
+        Seeds the random state used to draw the seed of each game.
+    verbose:
+        Whether or not to display progress bar during evaluation.
+    """
+    game_logs = _play_matches(game, player_specs, [(1, 2)] * num_games,
+                              num_workers, seed, verbose)
+
+    player1_results = {1: 0, -1: 0, 0: 0}
+    for game_log in game_logs:
+        player1_results[game_log.result] += 1
+    return player1_results, game_logs
+
+
+def _merge_results(pairings: Sequence[Tuple[PlayerNo, PlayerNo]],
+                   game_logs: Sequence[GameLog]) -> List[Tuple[int, int, float]]:
+    results = defaultdict(int)  # type: Dict[Tuple[int, int], float]
+    for (i, j), game_log in zip(pairings, game_logs):
+        update_results(i, j, {1: game_log.result, 2: -game_log.result}, results)
+    return [(i, j, n) for (i, j), n in sorted(results.items())]
+
+
+def run_tournament_parallel(game: Game, player_specs: Dict[PlayerNo, PlayerSpec],
+                            num_rounds: int, num_workers: int,
+                            seed: Optional[int] = None, verbose: bool = True
+                            ) -> List[Tuple[int, int, float]]:
+    """Run a round-robin tournament, playing the games in parallel.
+    The schedule and results are as for `run_tournament`.
+
+    Parameters
+    ----------
+    game:
+        An object representing the game to be played in the tournament.
+        It must be picklable.
+    player_specs:
+        Specs of the players, given as a dictionary mapping player
+        numbers to specs.
+    num_rounds:
+        The number of rounds in the tournament.
+    num_workers:
+        The number of worker processes.
+    seed:
+        Seeds the random state used to draw the seed of each game.
+    verbose:
+        Whether or not to display a progress bar.
+    """
+    pairings = [pairing for _ in range(num_rounds)
+                for i, j in itertools.combinations(player_specs, 2)
+                for pairing in [(i, j), (j, i)]]
+    game_logs = _play_matches(game, player_specs, pairings, num_workers, seed,
+                              verbose)
+    return _merge_results(pairings, game_logs)
+
+
+def run_gauntlet_parallel(game: Game, challenger: Tuple[PlayerNo, PlayerSpec],
+                          gauntlet_specs: Dict[PlayerNo, PlayerSpec],
+                          num_rounds: int, num_workers: int,
+                          seed: Optional[int] = None, verbose: bool = True
+                          ) -> List[Tuple[int, int, float]]:
+    """Play a single player against a number of other players, playing
+    the games in parallel. The schedule and results are as for
+    `run_gauntlet`.
+
+    Parameters
+    ----------
+    game:
+        An object representing the game to be played. It must be
+        picklable.
+    challenger:
+        A tuple containing the player number and spec of the
+        challenger.
+    gauntlet_specs:
+        Specs of the players to play the challenger against, given as a
+        dictionary mapping player numbers to specs.
+    num_rounds:
+        The number of rounds in the gauntlet.
+    num_workers:
+        The number of worker processes.
+    seed:
+        Seeds the random state used to draw the seed of each game.
+    verbose:
+        Whether or not to display a progress bar.
+    """
+    i, challenger_spec = challenger
+    player_specs = dict(gauntlet_specs)
+    player_specs[i] = challenger_spec
+    pairings = [pairing for _ in range(num_rounds) for j in gauntlet_specs
+                for pairing in [(i, j), (j, i)]]
+    game_logs = _play_matches(game, player_specs, pairings, num_workers, seed,
+                              verbose)
+    return _merge_results(pairings, game_logs)
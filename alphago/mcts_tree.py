@@ -74,38 +74,9 @@ def mcts(starting_node: "MCTSNode",
 
         if not leaf.is_terminal:
             # Evaluate the leaf node to get the probabilities and value
-            # according to the net.
+            # according to the net, and expand the tree.
             prior_probs, value = estimator(leaf.game_state)
-
-            # Store this as a value for player 1 and a value for player 2.
-            player = game.current_player(leaf.game_state)
-            other_player = 1 if player == 2 else 2
-            values = {player: value,
-                      other_player: -value}
-
-            # Compute the next possible states from the leaf node. This
-            # returns a dictionary with keys the legal actions and
-            # values the game states. Note that if the leaf is terminal
-            # there will be no next_states.
-            child_states = game.legal_actions(leaf.game_state)
-
-            # # TODO: This should be replaced by a function that links the
-            # # indices for the neural network output to the actions in the game.
-            # prior_probs = {action: prior_probs[action]
-            #                for action in child_states.keys()}
-
-            prior_probs = normalise_distribution(prior_probs)
-
-            # Compute the players for the children states.
-            child_players = {action: game.current_player(child_state)
-                             for action, child_state in child_states.items()}
-
-            child_terminals = {action: game.is_terminal(child_state)
-                               for action, child_state in child_states.items()}
-
-            # Expand the tree with the new leaf node
-            leaf.expand(prior_probs, child_states, child_players,
-                        child_terminals)
+            values = expand_leaf(leaf, game, prior_probs, value)
         else:
             # We don't need prior probs if the node is terminal, but we
             # do still need the value of the node. The utility function
@@ -120,6 +91,60 @@ def mcts(starting_node: "MCTSNode",
     return extremise_distribution(action_counts, tau)
 
 
+def expand_leaf(leaf: "MCTSNode",
+                game: Game,
+                prior_probs: Dict[Action, float],
+                value: float) -> Dict[Player, float]:
+    """Expand a non-terminal leaf with the estimate of its prior
+    probabilities and value.
+
+    This is the second half of a MCTS iteration, after `select`, split
+    out so that the evaluation of leaves can be batched across searches.
+
+    Parameters
+    ----------
+    leaf
+        The leaf node to expand.
+    game
+        An object representing the game to be played.
+    prior_probs
+        A dictionary from actions to the prior probabilities of taking
+        them, as returned by the estimator.
+    value
+        The estimated value of the leaf for the player to play.
+
+    Returns
+    -------
+    dict
+        A dictionary with keys the players and values the value of the
+        leaf for that player, to pass to `backup`.
+    """
+    # Store this as a value for player 1 and a value for player 2.
+    player = game.current_player(leaf.game_state)
+    other_player = 1 if player == 2 else 2
+    values = {player: value,
+              other_player: -value}
+
+    # Compute the next possible states from the leaf node. This
+    # returns a dictionary with keys the legal actions and
+    # values the game states.
+    child_states = game.legal_actions(leaf.game_state)
+
+    prior_probs = normalise_distribution(prior_probs)
+
+    # Compute the players for the children states.
+    child_players = {action: game.current_player(child_state)
+                     for action, child_state in child_states.items()}
+
+    child_terminals = {action: game.is_terminal(child_state)
+                       for action, child_state in child_states.items()}
+
+    # Expand the tree with the new leaf node
+    leaf.expand(prior_probs, child_states, child_players,
+                child_terminals)
+    return values
+
+
 class MCTSNode:
     """A class to represent a Monte Carlo search tree node. This node
     keeps track of all quantities needed for the Monte Carlo tree
@@ -0,0 +1,388 @@
+"""NumPy inference for trained neural net estimators
+
+The networks used for noughts and crosses and connect four are small
+enough that the overhead of a TensorFlow session run dominates the cost
+of evaluating them. This module reimplements their forward passes in
+NumPy, using weights exported from a trained estimator, so that states
+can be evaluated with low latency in processes that never import
+TensorFlow (e.g. self-play workers).
+
+Weights are exported with `AbstractNeuralNetEstimator.export_weights`,
+which returns a list with one dictionary of parameters per layer, in
+the order the layers were created in the graph. The NumPy estimators
+consume the layers in the same order, so only the architecture, not
+the variable names, needs to match.
+
+Classes
+-------
+Conv2D, Dense, BatchNorm
+    NumPy implementations of the layers used by the estimators.
+NumpyNetEstimator
+    The base class for NumPy estimators.
+NumpyNACNetEstimator, NumpyNAC3x6NetEstimator, NumpyConnectFourNet
+    NumPy counterparts of NACNetEstimator, NAC3x6NetEstimator and
+    ConnectFourNet.
+
+Functions
+---------
+to_numpy_estimator
+    Convert a TensorFlow estimator to its NumPy counterpart.
+"""
+import abc
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .games.features import bitboard_features
+
+__all__ = ["Conv2D", "Dense", "BatchNorm", "NumpyNetEstimator", "NumpyNACNetEstimator",
+           "NumpyNAC3x6NetEstimator", "NumpyConnectFourNet",
+           "layer_from_params", "to_numpy_estimator"]
+
+LayerParams = Dict[str, np.ndarray]
+
+
+def relu(x: np.ndarray) -> np.ndarray:
+    return np.maximum(x, 0)
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    """Computes the softmax of each row of logits, subtracting the
+    maximum logit first for numerical stability."""
+    exp_logits = np.exp(logits - np.max(logits, axis=1, keepdims=True))
+    return exp_logits / np.sum(exp_logits, axis=1, keepdims=True)
+
+
+class Conv2D:
+    """A 2-D convolution with stride 1 and 'SAME' padding, followed by
+    adding a bias.
+
+    Parameters
+    ----------
+    weights: ndarray
+        The kernel, of shape (height, width, in_channels, out_channels).
+    biases: ndarray
+        The biases, of shape (out_channels,).
+    """
+
+    def __init__(self, weights: np.ndarray, biases: np.ndarray) -> None:
+        self.weights = weights
+        self.biases = biases
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        """Applies the convolution to a batch of NHWC inputs."""
+        kernel_height, kernel_width = self.weights.shape[:2]
+        _, height, width, _ = x.shape
+
+        # As in TensorFlow, when the total padding is odd the extra row
+        # or column goes after the input.
+        pad_top = (kernel_height - 1) // 2
+        pad_left = (kernel_width - 1) // 2
+        padded = np.pad(x, ((0, 0),
+                            (pad_top, kernel_height - 1 - pad_top),
+                            (pad_left, kernel_width - 1 - pad_left),
+                            (0, 0)))
+
+        # Gather the input patches into an array of shape (N, H, W,
+        # kernel_height * kernel_width * in_channels) and contract it
+        # with the kernel in a single matrix multiplication.
+        patches = np.concatenate(
+            [padded[:, i:i + height, j:j + width, :]
+             for i in range(kernel_height) for j in range(kernel_width)],
+            axis=3)
+        kernel = self.weights.reshape(-1, self.weights.shape[3])
+        return patches @ kernel + self.biases
+
+
+class Dense:
+    """A fully connected layer.
+
+    Parameters
+    ----------
+    weights: ndarray
+        The weights, of shape (in_units, out_units).
+    biases: ndarray
+        The biases, of shape (out_units,).
+    """
+
+    def __init__(self, weights: np.ndarray, biases: np.ndarray) -> None:
+        self.weights = weights
+        self.biases = biases
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        return x @ self.weights + self.biases
+
+
+class BatchNorm:
+    """Batch normalisation at inference time, using the moving mean and
+    variance collected during training.
+
+    Parameters
+    ----------
+    moving_mean, moving_variance: ndarray
+        The moving statistics of each channel.
+    beta: ndarray or None
+        The offset of each channel, if the layer is centred.
+    gamma: ndarray or None
+        The scale of each channel, if the layer is scaled.
+    epsilon: float
+        Added to the variance to avoid dividing by zero. This matches
+        the default of `tf.contrib.layers.batch_norm`.
+    """
+
+    def __init__(self, moving_mean: np.ndarray, moving_variance: np.ndarray,
+                 beta: np.ndarray = None, gamma: np.ndarray = None,
+                 epsilon: float = 1e-3) -> None:
+        self.moving_mean = moving_mean
+        self.moving_variance = moving_variance
+        self.beta = beta
+        self.gamma = gamma
+        self.epsilon = epsilon
+
+        # Fold the normalisation into a single scale and shift.
+        scale = 1 / np.sqrt(moving_variance + epsilon)
+        if gamma is not None:
+            scale = scale * gamma
+        shift = -moving_mean * scale
+        if beta is not None:
+            shift = shift + beta
+        self.scale = scale.astype(moving_mean.dtype)
+        self.shift = shift.astype(moving_mean.dtype)
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        return x * self.scale + self.shift
+
+
+def _layer_class(weights: np.ndarray):
+    return Conv2D if weights.ndim == 4 else Dense
+
+
+def layer_from_params(params: LayerParams):
+    """Construct the layer corresponding to a dictionary of exported
+    parameters.
+
+    Raises
+    ------
+    ValueError:
+        If the parameters don't correspond to a known layer.
+    """
+    if 'moving_mean' in params:
+        return BatchNorm(params['moving_mean'], params['moving_variance'],
+                         beta=params.get('beta'), gamma=params.get('gamma'))
+    # Compressed weights (see `alphago.quantization`) are converted back
+    # to float32 once, so that the layer runs as fast as an uncompressed
+    # one.
+    if 'weights_int8' in params:
+        weights = params['weights_int8'].astype(np.float32) * params['weight_scale']
+        return _layer_class(weights)(weights, params['biases'].astype(np.float32))
+    if 'weights_float16' in params:
+        weights = params['weights_float16'].astype(np.float32)
+        return _layer_class(weights)(weights, params['biases'].astype(np.float32))
+    if 'weights' in params:
+        weights = params['weights']
+        biases = params.get('biases', np.zeros(weights.shape[-1], weights.dtype))
+        if weights.ndim == 4:
+            return Conv2D(weights, biases)
+        if weights.ndim == 2:
+            return Dense(weights, biases)
+    raise ValueError("Unrecognised layer with parameters {}.".format(
+        sorted(params)))
+
+
+class NumpyNetEstimator(abc.ABC):
+    """The base class for estimators evaluated with NumPy.
+
+    Subclasses define the forward pass of the network, which must
+    consume the layers in the order they were created in the
+    corresponding TensorFlow graph.
+
+    Parameters
+    ----------
+    layer_params: list
+        A list with one dictionary of parameters per layer, as returned
+        by `AbstractNeuralNetEstimator.export_weights`.
+    action_indices: dict
+        A dictionary mapping each action to its index in the output of
+        the network.
+    """
+    game_state_shape = NotImplemented
+
+    def __init__(self, layer_params: Sequence[LayerParams],
+                 action_indices: Dict[Any, int]) -> None:
+        self.action_indices = action_indices
+        self.layer_params = [dict(params) for params in layer_params]
+        self.layers = [layer_from_params(params) for params in self.layer_params]
+        # The weights never change, so caches of evaluations never need
+        # to be invalidated.
+        self.weights_version = 0
+
+    @classmethod
+    def from_estimator(cls, estimator) -> "NumpyNetEstimator":
+        """Construct a NumPy estimator with the weights of a trained
+        TensorFlow estimator of the corresponding architecture."""
+        return cls(estimator.export_weights(), estimator.action_indices)
+
+    @abc.abstractmethod
+    def _forward(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Computes the policy logits and values for a batch of state
+        vectors."""
+
+    def _state_to_vector(self, state) -> np.ndarray:
+        """Map the state to a vector suitable for input to the
+        network."""
+        return np.array(state, dtype=np.float32).reshape(self.game_state_shape)
+
+    def _states_to_vectors(self, states) -> np.ndarray:
+        return np.concatenate([self._state_to_vector(state)
+                               for state in states])
+
+    def predict_batch(self, states) -> Tuple[np.ndarray, np.ndarray]:
+        """Evaluates the network on a batch of states.
+
+        Returns
+        -------
+        probs: ndarray
+            An array of shape (len(states), #actions) with ith row the
+            probabilities for the ith state. The columns are indexed by
+            self.action_indices.
+        values: ndarray
+            An array of shape (len(states),) with ith entry the value of
+            the ith state.
+        """
+        x = self._states_to_vectors(states).astype(np.float32)
+        logits, values = self._forward(x)
+        return softmax(logits), values.ravel()
+
+    def __call__(self, state) -> Tuple[Dict[Any, float], float]:
+        """Returns the probabilities as a dictionary with keys the
+        actions, and the value, of the network applied to the state."""
+        probs, values = self.predict_batch([state])
+        probs_dict = {action: probs[0, index] for
+                      action, index in self.action_indices.items()}
+        return probs_dict, values[0]
+
+    def create_estimate_fn(self):
+        """Returns an evaluator function corresponding to the network."""
+        return self.__call__
+
+    def save(self, save_file: str) -> None:
+        """Saves the weights to an .npz file."""
+        arrays = {'{}/{}'.format(index, name): value
+                  for index, params in enumerate(self.layer_params)
+                  for name, value in params.items()}
+        np.savez(save_file, **arrays)
+
+    @classmethod
+    def load(cls, save_file: str, action_indices: Dict[Any, int]
+             ) -> "NumpyNetEstimator":
+        """Loads a NumPy estimator from an .npz file written by
+        `save`."""
+        layer_params = []  # type: List[LayerParams]
+        with np.load(save_file) as arrays:
+            for key in arrays.files:
+                index, name = key.split('/', 1)
+                while len(layer_params) <= int(index):
+                    layer_params.append({})
+                layer_params[int(index)][name] = arrays[key]
+        return cls(layer_params, action_indices)
+
+    def __repr__(self):
+        return "{0}({1} layers)".format(self.__class__.__name__,
+                                        len(self.layers))
+
+
+class NumpyNACNetEstimator(NumpyNetEstimator):
+    """The NumPy counterpart of NACNetEstimator."""
+    game_state_shape = (-1, 9)
+
+    def _state_to_vector(self, state):
+        state = np.array(state, dtype=np.float32).reshape(self.game_state_shape)
+        return np.nan_to_num(state)
+
+    def _states_to_vectors(self, states):
+        return self._state_to_vector(states)
+
+    def _forward(self, x):
+        conv1, conv2, conv3, dense1, value, prob_logits = self.layers
+
+        # The convolutions and the hidden dense layer have a ReLU
+        # activation built in, which the net then applies again.
+        x = x.reshape(-1, 3, 3, 1)
+        x = relu(conv1(x))
+        x = relu(conv2(x))
+        x = relu(conv3(x))
+        x = x.reshape(len(x), -1)
+        x = relu(dense1(x))
+        return prob_logits(x), np.tanh(value(x))
+
+
+class NumpyNAC3x6NetEstimator(NumpyNetEstimator):
+    """The NumPy counterpart of NAC3x6NetEstimator."""
+    game_state_shape = (1, 36)
+
+    def _state_to_vector(self, state):
+        return self._states_to_vectors([state])
+
+    def _states_to_vectors(self, states):
+        return bitboard_features(states, num_bits=18)
+
+    def _forward(self, x):
+        layers = iter(self.layers)
+
+        def block(x):
+            # A layer with its built in ReLU, followed by batch
+            # normalisation and another ReLU.
+            layer, batch_norm = next(layers), next(layers)
+            return relu(batch_norm(relu(layer(x))))
+
+        x = x.reshape(-1, 3, 6, 2)
+        for _ in range(4):
+            x = block(x)
+        x = x.reshape(len(x), -1)
+        for _ in range(3):
+            x = block(x)
+
+        value_head = block(block(x))
+        value = np.tanh(next(layers)(value_head))
+
+        policy_head = block(block(x))
+        prob_logits = next(layers)(policy_head)
+
+        return prob_logits, value
+
+
+class NumpyConnectFourNet(NumpyNetEstimator):
+    """The NumPy counterpart of ConnectFourNet."""
+    game_state_shape = (-1, 42)
+
+    def _states_to_vectors(self, states):
+        return self._state_to_vector(states)
+
+    def _forward(self, x):
+        *convs, dense1, dense2, dense3, value, prob_logits = self.layers
+
+        x = x.reshape(-1, 6, 7, 1)
+        for conv in convs:
+            x = relu(conv(x))
+        x = x.reshape(len(x), -1)
+        for dense in (dense1, dense2, dense3):
+            x = relu(dense(x))
+        return prob_logits(x), np.tanh(value(x))
+
+
+def to_numpy_estimator(estimator) -> NumpyNetEstimator:
+    """Returns a NumPy estimator with the weights of the estimator.
+
+    The NumPy counterpart of a TensorFlow estimator class is the class
+    of the same name prefixed with 'Numpy'. NumPy estimators are
+    returned unchanged.
+    """
+    if isinstance(estimator, NumpyNetEstimator):
+        return estimator
+
+    numpy_classes = {cls.__name__: cls for cls in NumpyNetEstimator.__subclasses__()}
+    name = 'Numpy' + type(estimator).__name__
+    if name not in numpy_classes:
+        raise ValueError("{} has no NumPy counterpart.".format(
+            type(estimator).__name__))
+    return numpy_classes[name].from_estimator(estimator)
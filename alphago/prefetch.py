@@ -0,0 +1,166 @@
+"""Background batch prefetching
+
+This module provides an iterator that assembles training batches in a
+producer thread while the consumer, typically the training loop, runs
+the previous batch through the network. Batches are handed over through
+a bounded queue, so at most ``queue_size`` batches are built ahead and
+memory use stays bounded.
+
+The time the consumer spends waiting on an empty queue is recorded. If
+training is input-bound, i.e. the network finishes a step before the
+next batch is ready, the queue is frequently empty and the starvation
+fraction reported by `PrefetchStats` is close to 1.
+
+Classes
+-------
+BatchPrefetcher
+    An iterator over batches built in a background thread.
+PrefetchStats
+    A summary of how often and for how long the consumer was starved.
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable, NamedTuple
+
+__all__ = ["BatchPrefetcher", "PrefetchStats"]
+
+
+class PrefetchStats(NamedTuple):
+    batches: int
+    starved_batches: int
+    starvation_fraction: float
+    wait_time: float
+    mean_wait_time: float
+    mean_queue_depth: float
+
+
+class _Failure(NamedTuple):
+    exception: BaseException
+
+
+class BatchPrefetcher:
+    """Iterates over batches built in a background thread.
+
+    The producer thread calls ``batch_fn(i)`` for i = 0, 1, ...,
+    num_batches - 1 and puts the results into a bounded queue, from
+    which iteration takes them in order. Any exception raised by
+    ``batch_fn`` is re-raised by the iterator.
+
+    Parameters
+    ----------
+    batch_fn: callable
+        A function taking the index of a batch and returning the batch.
+    num_batches: int
+        The number of batches to produce.
+    queue_size: int
+        The maximum number of batches to build ahead of the consumer.
+
+    Examples
+    --------
+    >>> with BatchPrefetcher(make_batch, num_batches=100) as batches:
+    ...     for batch in batches:
+    ...         estimator.train_step_arrays(*batch)
+    >>> batches.stats().starvation_fraction
+    """
+
+    def __init__(self, batch_fn: Callable[[int], Any], num_batches: int,
+                 queue_size: int = 2) -> None:
+        if queue_size < 1:
+            raise ValueError("`queue_size` must be at least 1.")
+        self.batch_fn = batch_fn
+        self.num_batches = num_batches
+        self.queue_size = queue_size
+
+        self._queue = queue.Queue(maxsize=queue_size)  # type: queue.Queue
+        self._stop = threading.Event()
+        self._num_consumed = 0
+        self._num_starved = 0
+        self._wait_time = 0.0
+        self._total_queue_depth = 0
+
+        self._producer = threading.Thread(target=self._produce, daemon=True,
+                                          name="BatchPrefetcher")
+        self._producer.start()
+
+    def _put(self, item) -> bool:
+        """Put an item on the queue, giving up if the prefetcher is
+        closed. Returns True if the item was queued."""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self) -> None:
+        for index in range(self.num_batches):
+            try:
+                batch = self.batch_fn(index)
+            except BaseException as exception:
+                self._put(_Failure(exception))
+                return
+            if not self._put(batch):
+                return
+
+    def __iter__(self) -> "BatchPrefetcher":
+        return self
+
+    def __next__(self):
+        if self._num_consumed >= self.num_batches or self._stop.is_set():
+            raise StopIteration
+
+        queue_depth = self._queue.qsize()
+        self._total_queue_depth += queue_depth
+        start = time.perf_counter()
+        batch = self._queue.get()
+        if queue_depth == 0:
+            self._num_starved += 1
+            self._wait_time += time.perf_counter() - start
+
+        if isinstance(batch, _Failure):
+            self.close()
+            raise batch.exception
+        self._num_consumed += 1
+        return batch
+
+    def __len__(self) -> int:
+        return self.num_batches
+
+    def stats(self) -> PrefetchStats:
+        """Returns statistics on the batches consumed so far.
+
+        Returns
+        -------
+        PrefetchStats:
+            The number of batches consumed, the number of those for
+            which the queue was empty when requested, the fraction of
+            batches that were starved, the total and mean time in
+            seconds spent waiting for the producer, and the mean number
+            of batches ready in the queue when a batch was requested.
+        """
+        consumed = self._num_consumed
+        return PrefetchStats(
+            batches=consumed,
+            starved_batches=self._num_starved,
+            starvation_fraction=self._num_starved / consumed if consumed else 0.0,
+            wait_time=self._wait_time,
+            mean_wait_time=self._wait_time / consumed if consumed else 0.0,
+            mean_queue_depth=self._total_queue_depth / consumed if consumed else 0.0)
+
+    def close(self) -> None:
+        """Stop the producer thread, discarding any prefetched
+        batches."""
+        self._stop.set()
+        self._producer.join()
+
+    def __enter__(self) -> "BatchPrefetcher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __repr__(self):
+        return "{0}(num_batches={1}, queue_size={2})".format(
+            self.__class__.__name__, self.num_batches, self.queue_size)
@@ -0,0 +1,292 @@
+"""Compressed weight payloads
+
+This module compresses the weights of a `NumpyNetEstimator` by storing
+its convolution and dense weights as int8 or float16. This shrinks the
+.npz files shipped to self-play workers by a factor of 4 or 2.
+
+Compression doesn't make inference faster. NumPy has no fast int8 or
+float16 matrix multiplication: np.dot on integer arrays doesn't use
+BLAS and is far slower than float32. A compressed estimator therefore
+converts its weights back to float32 once, when it is constructed or
+loaded, and then runs exactly as fast as the float estimator. Only the
+rounding of the weights affects its outputs.
+
+int8 weights are quantized symmetrically, with a scale for each output
+channel. Batch normalisation layers are left in float32, since they
+are small.
+
+`compare_estimators` measures the accuracy lost to the compression.
+With ``simulate_activations`` it also rounds the inputs and outputs of
+each layer, as int8 or float16 inference hardware would, to estimate
+the accuracy of fully quantized inference. For int8, the scale of the
+inputs to each layer is found by calibration: the float network is run
+on a sample of states (e.g. from the replay buffer) and the largest
+absolute input to each layer is recorded. This simulation is only an
+accuracy estimate, and is slower than either estimator.
+
+Functions
+---------
+calibrate
+    Record the range of the inputs to each layer on a sample of states.
+quantize
+    Compress the weights of an estimator to int8 or float16.
+compare_estimators
+    Measure the accuracy lost by compression.
+"""
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .numpy_estimator import Conv2D, Dense, NumpyNetEstimator
+
+__all__ = ["QuantizationReport", "calibrate", "quantize",
+           "compare_estimators"]
+
+
+class QuantizationReport(NamedTuple):
+    policy_agreement: float
+    value_mse: float
+    max_prob_error: float
+    float_bytes: int
+    quantized_bytes: int
+
+
+class _InputRangeRecorder:
+    """Wraps a layer, recording the largest absolute value of its
+    inputs."""
+
+    def __init__(self, layer, percentile: float) -> None:
+        self.layer = layer
+        self.percentile = percentile
+        self.input_range = 0.0
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        self.input_range = max(self.input_range,
+                               float(np.percentile(np.abs(x), self.percentile)))
+        return self.layer(x)
+
+
+def calibrate(estimator: NumpyNetEstimator, states: Sequence,
+              batch_size: int = 256, percentile: float = 100.0
+              ) -> List[Optional[float]]:
+    """Runs the estimator on a sample of states, recording the range of
+    the inputs to each convolution and dense layer.
+
+    Parameters
+    ----------
+    estimator:
+        The float estimator to calibrate.
+    states:
+        A representative sample of states, e.g. from the replay buffer.
+    batch_size:
+        The number of states to evaluate at once.
+    percentile:
+        The percentile of the absolute inputs to record for each batch.
+        Values below 100 clip outliers, trading off range for
+        resolution.
+
+    Returns
+    -------
+    list:
+        A list with the input range of each layer of the estimator, or
+        None for layers that aren't quantized.
+    """
+    if not len(states):
+        raise ValueError("At least one state is needed for calibration.")
+
+    float_layers = estimator.layers
+    recorders = [_InputRangeRecorder(layer, percentile)
+                 if isinstance(layer, (Conv2D, Dense)) else None
+                 for layer in float_layers]
+    estimator.layers = [recorder or layer
+                        for recorder, layer in zip(recorders, float_layers)]
+    try:
+        for i in range(0, len(states), batch_size):
+            estimator.predict_batch(states[i:i + batch_size])
+    finally:
+        estimator.layers = float_layers
+
+    return [recorder.input_range if recorder is not None else None
+            for recorder in recorders]
+
+
+def _quantize_weights(weights: np.ndarray):
+    """Quantizes weights to int8 with a symmetric scale for each output
+    channel (the last axis)."""
+    reduce_axes = tuple(range(weights.ndim - 1))
+    weight_range = np.max(np.abs(weights), axis=reduce_axes)
+    weight_scale = np.where(weight_range > 0, weight_range / 127, 1)
+    weights_int8 = np.clip(np.rint(weights / weight_scale), -127, 127)
+    return weights_int8.astype(np.int8), weight_scale.astype(np.float32)
+
+
+def quantize(estimator: NumpyNetEstimator, mode: str = 'int8',
+             calibration_states: Optional[Sequence] = None,
+             percentile: float = 100.0) -> NumpyNetEstimator:
+    """Returns a copy of the estimator with its convolution and dense
+    weights stored as int8 or float16.
+
+    Parameters
+    ----------
+    estimator:
+        The float estimator to compress.
+    mode: str, {'int8', 'float16'}
+        The type to store the weights as.
+    calibration_states:
+        A sample of states used to find the range of the inputs to each
+        layer, for int8 only. They are only needed to simulate int8
+        activations in `compare_estimators`.
+    percentile:
+        Passed to `calibrate`.
+
+    Returns
+    -------
+    NumpyNetEstimator:
+        An estimator of the same class as ``estimator``. Its
+        ``layer_params``, which are what `save` writes, hold the
+        compressed weights, while its layers run in float32.
+    """
+    if mode not in ['int8', 'float16']:
+        raise ValueError("`mode` must be 'int8' or 'float16'.")
+
+    input_ranges = [None] * len(estimator.layers)  # type: List[Optional[float]]
+    if mode == 'int8' and calibration_states is not None:
+        input_ranges = calibrate(estimator, calibration_states,
+                                 percentile=percentile)
+
+    layer_params = []
+    for index, params in enumerate(estimator.layer_params):
+        if 'weights' not in params:
+            layer_params.append(dict(params))
+            continue
+
+        weights = params['weights']
+        biases = params.get('biases', np.zeros(weights.shape[-1], np.float32))
+        if mode == 'float16':
+            layer_params.append({'weights_float16': weights.astype(np.float16),
+                                 'biases': biases.astype(np.float16)})
+        else:
+            weights_int8, weight_scale = _quantize_weights(weights)
+            compressed = {'weights_int8': weights_int8,
+                          'weight_scale': weight_scale,
+                          'biases': biases.astype(np.float32)}
+            input_range = input_ranges[index]
+            if input_range is not None:
+                compressed['input_scale'] = np.float32(
+                    input_range / 127 if input_range else 1.0)
+            layer_params.append(compressed)
+
+    return type(estimator)(layer_params, estimator.action_indices)
+
+
+class _Int8Activations:
+    """Wraps a layer, rounding its inputs to int8 with the given scale,
+    as int8 inference would."""
+
+    def __init__(self, layer, input_scale: float) -> None:
+        self.layer = layer
+        self.input_scale = float(input_scale)
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        x_int8 = np.clip(np.rint(x / self.input_scale), -127, 127)
+        return self.layer(x_int8 * self.input_scale)
+
+
+class _Float16Activations:
+    """Wraps a layer, rounding its inputs and outputs to float16, as
+    float16 inference would."""
+
+    def __init__(self, layer) -> None:
+        self.layer = layer
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        x = x.astype(np.float16).astype(np.float32)
+        return self.layer(x).astype(np.float16).astype(np.float32)
+
+
+def _simulated_layers(estimator: NumpyNetEstimator) -> List:
+    """Returns the layers of a compressed estimator, wrapped to round
+    their activations.
+
+    Raises
+    ------
+    ValueError:
+        If an int8 layer was compressed without calibration states.
+    """
+    layers = []
+    for layer, params in zip(estimator.layers, estimator.layer_params):
+        if 'weights_float16' in params:
+            layer = _Float16Activations(layer)
+        elif 'weights_int8' in params:
+            if 'input_scale' not in params:
+                raise ValueError("Simulating int8 activations needs an "
+                                 "estimator quantized with calibration states.")
+            layer = _Int8Activations(layer, params['input_scale'])
+        layers.append(layer)
+    return layers
+
+
+def _params_nbytes(estimator: NumpyNetEstimator) -> int:
+    return sum(np.asarray(value).nbytes for params in estimator.layer_params
+               for value in params.values())
+
+
+def compare_estimators(float_estimator: NumpyNetEstimator,
+                       quantized_estimator: NumpyNetEstimator,
+                       states: Sequence, batch_size: int = 256,
+                       simulate_activations: bool = False
+                       ) -> QuantizationReport:
+    """Measures how closely a compressed estimator matches the float
+    estimator it was compressed from.
+
+    Parameters
+    ----------
+    float_estimator, quantized_estimator:
+        The estimators to compare.
+    states:
+        The states to compare the estimators on. These should be
+        different to the calibration states.
+    batch_size:
+        The number of states to evaluate at once.
+    simulate_activations:
+        Whether to also round the activations of the compressed
+        estimator, to estimate the accuracy of fully quantized
+        inference. This only affects the comparison: the estimator
+        itself is unchanged.
+
+    Returns
+    -------
+    QuantizationReport:
+        The fraction of states on which the most probable action agrees,
+        the mean squared difference between the values, the largest
+        absolute difference between any probabilities, and the size in
+        bytes of the weights of each estimator.
+    """
+    if not len(states):
+        raise ValueError("At least one state is needed for the comparison.")
+
+    layers = quantized_estimator.layers
+    if simulate_activations:
+        quantized_estimator.layers = _simulated_layers(quantized_estimator)
+
+    agreements, squared_errors, max_prob_error = [], [], 0.0
+    try:
+        for i in range(0, len(states), batch_size):
+            batch = states[i:i + batch_size]
+            probs, values = float_estimator.predict_batch(batch)
+            quantized_probs, quantized_values = quantized_estimator.predict_batch(batch)
+
+            agreements.extend(np.argmax(probs, axis=1) ==
+                              np.argmax(quantized_probs, axis=1))
+            squared_errors.extend((values - quantized_values) ** 2)
+            max_prob_error = max(max_prob_error,
+                                 float(np.max(np.abs(probs - quantized_probs))))
+    finally:
+        quantized_estimator.layers = layers
+
+    return QuantizationReport(
+        policy_agreement=float(np.mean(agreements)),
+        value_mse=float(np.mean(squared_errors)),
+        max_prob_error=max_prob_error,
+        float_bytes=_params_nbytes(float_estimator),
+        quantized_bytes=_params_nbytes(quantized_estimator))
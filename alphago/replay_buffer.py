@@ -0,0 +1,372 @@
+"""Replay buffer
+
+This module provides a fixed-capacity buffer of training positions
+generated by self-play. Positions are stored in preallocated NumPy
+arrays used as a ring buffer, so adding a position is O(1) and, once the
+buffer is full, each new position overwrites the oldest one. This keeps
+only the most recent ``capacity`` positions without ever copying or
+re-flattening the history.
+
+Positions such as openings recur in many self-play games. With
+``deduplicate=True``, the buffer keys each position on the bytes of its
+state and stores it once. A repeat of a stored position is merged into
+it, averaging the target probabilities and outcomes, and increments its
+occurrence count. Positions are then sampled with probability
+proportional to their counts, so training sees the same distribution as
+if every occurrence had been stored. Combine this with canonical states
+(see `alphago.self_play_games.process_self_play_data`) to also merge
+symmetric positions.
+
+Positions whose move was chosen by a fast search (see
+`alphago.self_play_games.self_play`) have no policy target. They count
+towards the outcome but not the target probabilities, and
+``policy_counts`` records how many occurrences of each position had a
+full search.
+
+`PrioritizedReplayBuffer` instead samples positions in proportion to a
+priority, by default the loss of the net on the position when it was
+last trained on, using a sum tree (see `alphago.sum_tree`), so both
+sampling and updating priorities take O(log n) time. The resulting bias
+is corrected by importance-sampling weights on the loss.
+
+Classes
+-------
+ReplayBuffer
+    A ring buffer of (state, probs, z) training positions.
+PrioritizedReplayBuffer
+    A replay buffer that samples positions by priority.
+"""
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .sum_tree import SumTree
+
+__all__ = ["ReplayBuffer", "PrioritizedReplayBuffer"]
+
+
+class ReplayBuffer:
+    """A fixed-capacity ring buffer of training positions.
+
+    Each position consists of the state, the target action
+    probabilities and the outcome z of the game for the player to play
+    in the state. The arrays are allocated on the first append, using
+    the shape and dtype of the first state and probability vector.
+
+    The buffer supports ``len`` and indexing, with index 0 the oldest
+    position, returning (state, probs, z) tuples. It can therefore be
+    used anywhere a list of training data is expected.
+
+    Parameters
+    ----------
+    capacity: int
+        The maximum number of positions to store.
+    deduplicate: bool
+        Whether to merge repeated positions. A merged position is
+        evicted ``capacity`` distinct positions after it was first
+        added.
+
+    Attributes
+    ----------
+    num_added: int
+        The total number of positions ever added to the buffer. Merged
+        repeats are not counted.
+    weights_versions: ndarray
+        The version of the weights that generated each position, in
+        slot order. For merged positions, the most recent version.
+    counts: ndarray
+        The number of occurrences merged into each position, in slot
+        order. Always 1 without deduplication.
+    policy_counts: ndarray
+        The number of those occurrences that had a full search, and so
+        a policy target, in slot order. Without deduplication, 1 for a
+        full search and 0 for a fast search.
+    """
+
+    def __init__(self, capacity: int, deduplicate: bool = False) -> None:
+        if capacity < 1:
+            raise ValueError("`capacity` must be at least 1.")
+        self.capacity = capacity
+        self.deduplicate = deduplicate
+        self.num_added = 0
+        self.states = None  # type: Optional[np.ndarray]
+        self.probs = None  # type: Optional[np.ndarray]
+        self.outcomes = np.zeros(capacity, dtype=np.float32)
+        self.weights_versions = np.zeros(capacity, dtype=np.int64)
+        self.counts = np.ones(capacity, dtype=np.int64)
+        self.policy_counts = np.ones(capacity, dtype=np.int64)
+        self._slot_of_key = {}  # type: Dict[bytes, int]
+        self._cumulative_counts = None  # type: Optional[np.ndarray]
+
+    def _allocate(self, state: np.ndarray, probs: np.ndarray) -> None:
+        self.states = np.zeros((self.capacity,) + state.shape, dtype=state.dtype)
+        self.probs = np.zeros((self.capacity,) + probs.shape, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return min(self.num_added, self.capacity)
+
+    @property
+    def _start(self) -> int:
+        """The slot holding the oldest position."""
+        return self.num_added % self.capacity if self.num_added > self.capacity else 0
+
+    def append(self, state, probs, z: float, weights_version: int = 0,
+               full_search: bool = True) -> None:
+        """Add a position to the buffer, overwriting the oldest position
+        if the buffer is full. Positions without a full search have no
+        policy target."""
+        state = np.asarray(state)
+        probs = np.asarray(probs)
+        if self.states is None:
+            self._allocate(state, probs)
+        if self.deduplicate:
+            self._append_unique(state, probs, z, weights_version, full_search)
+            return
+
+        slot = self.num_added % self.capacity
+        self.states[slot] = state
+        self.probs[slot] = probs
+        self.outcomes[slot] = z
+        self.weights_versions[slot] = weights_version
+        self.policy_counts[slot] = int(full_search)
+        self.num_added += 1
+        self._slots_written(np.array([slot]), new=True)
+
+    def _append_unique(self, state: np.ndarray, probs: np.ndarray, z: float,
+                       weights_version: int, full_search: bool) -> None:
+        self._cumulative_counts = None
+        key = np.asarray(state, dtype=self.states.dtype).tobytes()
+        slot = self._slot_of_key.get(key)
+        if slot is not None:
+            # Update the running means of the targets.
+            self.counts[slot] += 1
+            self.outcomes[slot] += (z - self.outcomes[slot]) / self.counts[slot]
+            if full_search:
+                self.policy_counts[slot] += 1
+                self.probs[slot] += ((probs - self.probs[slot]) /
+                                     self.policy_counts[slot])
+            self.weights_versions[slot] = weights_version
+            self._slots_written(np.array([slot]), new=False)
+            return
+
+        slot = self.num_added % self.capacity
+        if self.num_added >= self.capacity:
+            del self._slot_of_key[self.states[slot].tobytes()]
+        self._slot_of_key[key] = slot
+        self.states[slot] = state
+        self.probs[slot] = probs
+        self.outcomes[slot] = z
+        self.weights_versions[slot] = weights_version
+        self.counts[slot] = 1
+        self.policy_counts[slot] = int(full_search)
+        self.num_added += 1
+        self._slots_written(np.array([slot]), new=True)
+
+    def _slots_written(self, slots: np.ndarray, new: bool) -> None:
+        """Called after the given slots have been written, with new
+        False if an existing position was merged into."""
+
+    def extend(self, game_log: Iterable[Tuple], weights_version: int = 0) -> None:
+        """Add the positions of a self-play game, given as (state,
+        action, probs, z, full_search) tuples as returned by `self_play`,
+        played with the given version of the weights. Positions given
+        as (state, action, probs, z) tuples are taken to have had a
+        full search."""
+        for state, _, probs, z, *full_search in game_log:
+            self.append(state, probs, z, weights_version,
+                        full_search[0] if full_search else True)
+
+    def extend_arrays(self, states, probs, outcomes, weights_versions=0,
+                      full_search=True) -> None:
+        """Add a batch of positions, given as arrays with one row per
+        position, oldest first. If there are more positions than the
+        capacity, only the most recent are kept."""
+        states = np.asarray(states)
+        probs = np.asarray(probs)
+        if not len(states):
+            return
+        if self.states is None:
+            self._allocate(states[0], probs[0])
+
+        weights_versions = np.broadcast_to(weights_versions, (len(states),))
+        full_search = np.broadcast_to(full_search, (len(states),))
+        if self.deduplicate:
+            for row in range(len(states)):
+                self._append_unique(states[row], probs[row], outcomes[row],
+                                    weights_versions[row], full_search[row])
+            return
+        skip = max(0, len(states) - self.capacity)
+        self.num_added += skip
+        slots = (self.num_added + np.arange(len(states) - skip)) % self.capacity
+        self.states[slots] = states[skip:]
+        self.probs[slots] = probs[skip:]
+        self.outcomes[slots] = np.asarray(outcomes)[skip:]
+        self.weights_versions[slots] = weights_versions[skip:]
+        self.policy_counts[slots] = full_search[skip:]
+        self.num_added += len(slots)
+        self._slots_written(slots, new=True)
+
+    def staleness(self, weights_version: int) -> Tuple[float, int]:
+        """Returns the mean and maximum number of versions by which the
+        weights that generated the stored positions lag behind the given
+        version."""
+        if not len(self):
+            return 0.0, 0
+        lag = weights_version - self.weights_versions[:len(self)]
+        return float(np.mean(lag)), int(np.max(lag))
+
+    def reindex(self) -> None:
+        """Rebuild the index of stored positions, after the arrays have
+        been set directly, e.g. when restoring a snapshot."""
+        self._cumulative_counts = None
+        self._slot_of_key = {}
+        if self.deduplicate and self.states is not None:
+            for slot in range(len(self)):
+                self._slot_of_key[self.states[slot].tobytes()] = slot
+
+    @property
+    def num_occurrences(self) -> int:
+        """The number of occurrences of the stored positions, counting
+        merged repeats."""
+        return int(np.sum(self.counts[:len(self)]))
+
+    def _slots(self, indices) -> np.ndarray:
+        """Map indices, with 0 the oldest position, onto slots."""
+        return (self._start + np.asarray(indices)) % self.capacity
+
+    def __getitem__(self, index: int) -> Tuple[np.ndarray, np.ndarray, float]:
+        if not -len(self) <= index < len(self):
+            raise IndexError("ReplayBuffer index out of range.")
+        slot = self._slots(index % len(self))
+        return self.states[slot], self.probs[slot], self.outcomes[slot]
+
+    def sample_indices(self, batch_size: int, random_state=np.random) -> np.ndarray:
+        """Sample indices of positions at random, with replacement.
+        Positions are sampled uniformly or, with deduplication, with
+        probability proportional to their occurrence counts."""
+        if not len(self):
+            raise ValueError("Cannot sample from an empty replay buffer.")
+        if not self.deduplicate:
+            return random_state.randint(len(self), size=batch_size)
+
+        if self._cumulative_counts is None:
+            self._cumulative_counts = np.cumsum(self.counts[self._slots(np.arange(len(self)))])
+        draws = random_state.uniform(0, self._cumulative_counts[-1], size=batch_size)
+        return np.searchsorted(self._cumulative_counts, draws, side='right')
+
+    def gather(self, indices) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the states, probs and outcomes of the positions with
+        the given indices as arrays."""
+        slots = self._slots(indices)
+        return self.states[slots], self.probs[slots], self.outcomes[slots]
+
+    def sample(self, batch_size: int, random_state=np.random
+               ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sample a batch of positions uniformly at random, with
+        replacement, returning arrays of the states, probs and
+        outcomes."""
+        return self.gather(self.sample_indices(batch_size, random_state))
+
+    def __repr__(self):
+        return "{0}(capacity={1}, size={2}, deduplicate={3})".format(
+            self.__class__.__name__, self.capacity, len(self), self.deduplicate)
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """A replay buffer that samples positions with probability
+    proportional to ``count * priority ** alpha``, where count is the
+    position's occurrence count (always 1 without deduplication).
+
+    New positions get the largest priority seen so far, so every
+    position is likely to be trained on at least once. After training on
+    a batch, pass the per-position losses to `update_priorities`.
+    `importance_weights` returns the weights that make the expected
+    weighted loss match that of count-proportional sampling, raised to
+    the power beta and normalised so that the largest in the batch is 1.
+
+    Sampling and updating priorities are safe to call from different
+    threads, e.g. when batches are prefetched.
+
+    Parameters
+    ----------
+    capacity: int
+        The maximum number of positions to store.
+    deduplicate: bool
+        Whether to merge repeated positions, as for ReplayBuffer.
+    alpha: float
+        How strongly the priorities skew sampling. 0 gives
+        count-proportional sampling.
+    beta: float
+        How strongly the importance-sampling weights correct the skew,
+        from 0 (not at all) to 1 (fully).
+    epsilon: float
+        Added to each loss, so that no position has zero priority.
+
+    Attributes
+    ----------
+    priorities: ndarray
+        The priority of each position, in slot order.
+    """
+
+    def __init__(self, capacity: int, deduplicate: bool = False,
+                 alpha: float = 0.6, beta: float = 0.4,
+                 epsilon: float = 1e-3) -> None:
+        if alpha < 0 or not 0 <= beta <= 1:
+            raise ValueError("`alpha` must be non-negative and `beta` "
+                             "between 0 and 1.")
+        if epsilon <= 0:
+            raise ValueError("`epsilon` must be positive.")
+        super().__init__(capacity, deduplicate=deduplicate)
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self.priorities = np.ones(capacity, dtype=np.float64)
+        self.max_priority = 1.0
+        self._tree = SumTree(capacity)
+        self._lock = threading.Lock()
+
+    def _slots_written(self, slots: np.ndarray, new: bool) -> None:
+        with self._lock:
+            if new:
+                self.priorities[slots] = self.max_priority
+            self._update_tree(slots)
+
+    def _update_tree(self, slots: np.ndarray) -> None:
+        self._tree.update(slots, self.counts[slots] * self.priorities[slots] ** self.alpha)
+
+    def reindex(self) -> None:
+        """Rebuild the index of stored positions and the sum tree, after
+        the arrays have been set directly."""
+        super().reindex()
+        with self._lock:
+            self._tree = SumTree(self.capacity)
+            self.max_priority = float(np.max(self.priorities[:len(self)], initial=1.0))
+            self._update_tree(np.arange(len(self)))
+
+    def sample_indices(self, batch_size: int, random_state=np.random) -> np.ndarray:
+        """Sample indices of positions by priority, with replacement."""
+        if not len(self):
+            raise ValueError("Cannot sample from an empty replay buffer.")
+        with self._lock:
+            slots = self._tree.sample(batch_size, random_state)
+        return (slots - self._start) % self.capacity
+
+    def importance_weights(self, indices) -> np.ndarray:
+        """Returns the importance-sampling weights of the positions with
+        the given indices, normalised to a maximum of 1."""
+        # Relative to count-proportional sampling, a position is drawn
+        # priority ** alpha times as often, so the weight is
+        # priority ** (-alpha * beta), up to normalisation.
+        weights = self.priorities[self._slots(indices)] ** (-self.alpha * self.beta)
+        return (weights / np.max(weights)).astype(np.float32)
+
+    def update_priorities(self, indices, losses) -> None:
+        """Set the priorities of the positions with the given indices to
+        their losses plus epsilon."""
+        slots = self._slots(indices)
+        priorities = np.abs(np.asarray(losses, dtype=np.float64)) + self.epsilon
+        with self._lock:
+            self.priorities[slots] = priorities
+            self.max_priority = max(self.max_priority, float(np.max(priorities)))
+            self._update_tree(slots)
@@ -0,0 +1,405 @@
+"""Self-play
+
+This module plays the self-play games that AlphaGo is trained on, either
+one at a time (`self_play`) or many in lockstep with batched evaluation
+of their leaves (`batched_self_play`), and turns each game into training
+positions (`process_self_play_data`).
+
+A net trained on canonical states (see `Game.canonicalize`) is only
+ever shown one orientation of each position, so with ``canonicalize``
+set the states are also canonicalized before they are evaluated, and
+the prior probabilities mapped back (see `canonical_estimate_fn`).
+
+It doesn't import TensorFlow, so self-play worker processes (see
+`alphago.self_play_pool` and `alphago.async_training`) only pay for
+NumPy. `alphago.alphago` re-exports its functions.
+
+Functions
+---------
+self_play
+    Play a game using MCTS to choose the moves of both players.
+batched_self_play
+    Play many games, evaluating the leaves of their searches in batches.
+process_self_play_data
+    Turn the states and moves of a game into training positions.
+self_play_temperature
+    The temperature of the self-play move distribution.
+canonical_estimate_fn
+    Wrap an estimate function to evaluate canonical states.
+"""
+import numpy as np
+
+from .evaluation_cache import EvaluationCache
+from .mcts_tree import (MCTSNode, backup, expand_leaf, extremise_distribution,
+                        mcts, select)
+from .utilities import sample_distribution
+
+__all__ = ["self_play", "batched_self_play", "process_self_play_data",
+           "self_play_temperature", "canonical_estimate_fn"]
+
+
+def canonical_estimate_fn(game, estimator):
+    """Returns an estimate function that evaluates the canonical
+    representative of each state with the estimate function estimator,
+    and maps the prior probabilities back onto the actions of the
+    state. Evaluations are cached, so the estimator mustn't change while
+    the returned function is in use."""
+    return EvaluationCache(game, estimator, canonicalize=True)
+
+
+def self_play(game, estimator, mcts_iters, c_puct, canonicalize=False,
+              full_search_fraction=1.0, fast_mcts_iters=None):
+    """Plays a single game using MCTS to choose actions for both players.
+
+    Parameters
+    ----------
+    game: Game
+        An object representing the game to be played.
+    estimator: func
+        An estimate function.
+    mcts_iters: int
+        Number of iterations to run MCTS for.
+    c_puct: float
+        Parameter for MCTS.
+    canonicalize: bool
+        Whether to return canonical states, as for
+        `process_self_play_data`, and evaluate states in their
+        canonical orientation.
+    full_search_fraction: float
+        The probability that a move gets a full search of mcts_iters
+        iterations, with Dirichlet noise, and is recorded as a policy
+        target. Other moves get a fast search of fast_mcts_iters
+        iterations without noise, which only chooses the move.
+    fast_mcts_iters: int or None
+        Number of iterations of a fast search, at least 2. Defaults to a
+        sixth of mcts_iters.
+
+    Returns
+    -------
+    game_state_list: list
+        A list of game states encountered in the self-play game. Starts
+        with the initial state and ends with a terminal state.
+    action_probs_list: list
+        A list of action probability dictionaries, as returned by MCTS
+        each time the algorithm has to take an action. The ith action
+        probabilities dictionary corresponds to the ith game_state, and
+        action_probs_list has length one less than game_state_list,
+        since we don't have to move in a terminal state.
+    """
+    fast_mcts_iters = _fast_mcts_iters(mcts_iters, full_search_fraction,
+                                       fast_mcts_iters)
+    if canonicalize:
+        estimator = canonical_estimate_fn(game, estimator)
+    node = MCTSNode(game.initial_state, game.current_player(game.initial_state))
+
+    game_state_list = [node.game_state]
+    action_probs_list = []
+    action_list = []
+    full_search_list = []
+
+    move_count = 0
+
+    while not node.is_terminal:
+        tau = self_play_temperature(move_count)
+
+        # First run MCTS to compute action probabilities.
+        if _is_full_search(full_search_fraction):
+            action_probs = mcts(node, game, estimator, mcts_iters, c_puct, tau=tau)
+            full_search_list.append(True)
+        else:
+            action_probs = mcts(node, game, estimator, fast_mcts_iters, c_puct,
+                                tau=tau, dirichlet_epsilon=0)
+            full_search_list.append(False)
+
+        # Choose the action according to the action probabilities.
+        action = sample_distribution(action_probs)
+        action_list.append(action)
+
+        # Play the action
+        node = node.children[action]
+
+        # Add the action probabilities and game state to the list.
+        action_probs_list.append(action_probs)
+        game_state_list.append(node.game_state)
+        move_count += 1
+
+    data = process_self_play_data(game_state_list, action_list,
+                                  action_probs_list, game, game.action_indices,
+                                  canonicalize=canonicalize,
+                                  full_search=full_search_list)
+
+    return data
+
+
+def _fast_mcts_iters(mcts_iters, full_search_fraction, fast_mcts_iters):
+    """Validate the playout cap parameters, returning the number of
+    iterations of a fast search."""
+    if not 0 <= full_search_fraction <= 1:
+        raise ValueError("`full_search_fraction` must be between 0 and 1.")
+    # A single iteration only expands the root, leaving no visit counts
+    # to choose the move from.
+    if fast_mcts_iters is None:
+        fast_mcts_iters = max(2, mcts_iters // 6)
+    if fast_mcts_iters < 2:
+        raise ValueError("`fast_mcts_iters` must be at least 2.")
+    return fast_mcts_iters
+
+
+def _is_full_search(full_search_fraction):
+    """Decide whether the next self-play move gets a full search. No
+    random number is drawn if every move does."""
+    return full_search_fraction >= 1 or np.random.rand() < full_search_fraction
+
+
+def self_play_temperature(move_count):
+    """Returns the temperature tau to use for the move_count-th move of
+    a self-play game."""
+    # TODO: Choose this better.
+    tau = 1
+    if move_count >= 10:
+        tau = 1 / (move_count - 10 + 1)
+    return tau
+
+
+class _SelfPlayGame:
+    """The state of a self-play game played by `batched_self_play`."""
+
+    def __init__(self, game):
+        self.node = MCTSNode(game.initial_state,
+                             game.current_player(game.initial_state))
+        self.game_state_list = [self.node.game_state]
+        self.action_probs_list = []
+        self.action_list = []
+        self.full_search_list = []
+        self.num_simulations = 0
+        self.full_search = True
+
+
+def batched_self_play(game, estimator, mcts_iters, c_puct, num_games,
+                      num_parallel_games=32, dirichlet_epsilon=0.25,
+                      dirichlet_alpha=0.03, canonicalize=False,
+                      full_search_fraction=1.0, fast_mcts_iters=None):
+    """Plays self-play games, advancing many games in lockstep so that
+    the leaves of their searches are evaluated in a single batch.
+
+    Each step runs one MCTS simulation in every active game, up to the
+    leaf to evaluate, evaluates all of the leaves with one call to
+    estimator.predict_batch, and then expands the leaves and backs up
+    the values. A game makes a move once its search has run mcts_iters
+    simulations, and finished games are replaced by new ones until
+    num_games games have been started. Each individual game is played
+    exactly as by `self_play`.
+
+    Parameters
+    ----------
+    game: Game
+        An object representing the game to be played.
+    estimator:
+        An estimator with a `predict_batch` method and `action_indices`
+        attribute, e.g. an AbstractNeuralNetEstimator or a
+        NumpyNetEstimator.
+    mcts_iters: int
+        Number of iterations to run MCTS for.
+    c_puct: float
+        Parameter for MCTS.
+    num_games: int
+        The number of games to play.
+    num_parallel_games: int
+        The maximum number of games to play at once, which is the
+        largest batch size passed to the estimator.
+    dirichlet_epsilon, dirichlet_alpha: float
+        Parameters of the Dirichlet noise added at the root, as for
+        `mcts`.
+    canonicalize: bool
+        Whether to return canonical states and evaluate states in their
+        canonical orientation, as for `self_play`.
+    full_search_fraction: float
+        The probability that a move gets a full search, as for
+        `self_play`.
+    fast_mcts_iters: int or None
+        Number of iterations of a fast search, as for `self_play`.
+
+    Returns
+    -------
+    iterator:
+        An iterator over the game logs, in the format returned by
+        `self_play`, in the order in which the games finish.
+    """
+    if num_parallel_games < 1:
+        raise ValueError("`num_parallel_games` must be at least 1.")
+    fast_mcts_iters = _fast_mcts_iters(mcts_iters, full_search_fraction,
+                                       fast_mcts_iters)
+    return _batched_self_play(game, estimator, mcts_iters, c_puct, num_games,
+                              num_parallel_games, dirichlet_epsilon,
+                              dirichlet_alpha, canonicalize,
+                              full_search_fraction, fast_mcts_iters)
+
+
+def _batched_self_play(game, estimator, mcts_iters, c_puct, num_games,
+                       num_parallel_games, dirichlet_epsilon, dirichlet_alpha,
+                       canonicalize, full_search_fraction, fast_mcts_iters):
+    action_indices = estimator.action_indices
+    num_started = min(num_games, num_parallel_games)
+    active_games = [_SelfPlayGame(game) for _ in range(num_started)]
+    for self_play_game in active_games:
+        self_play_game.full_search = _is_full_search(full_search_fraction)
+
+    while active_games:
+        # Run a simulation of each game up to the leaf to evaluate. Fast
+        # searches are run without noise at the root.
+        pending = []
+        for self_play_game in active_games:
+            epsilon = dirichlet_epsilon if self_play_game.full_search else 0
+            nodes, _ = select(self_play_game.node, c_puct,
+                              dirichlet_epsilon=epsilon,
+                              dirichlet_alpha=dirichlet_alpha)
+            if nodes[-1].is_terminal:
+                backup(nodes, game.utility(nodes[-1].game_state))
+                self_play_game.num_simulations += 1
+            else:
+                pending.append((self_play_game, nodes))
+
+        # Evaluate all the leaves at once, then expand them and back up
+        # their values.
+        if pending:
+            leaf_states = [nodes[-1].game_state for _, nodes in pending]
+            transforms = [0] * len(pending)
+            if canonicalize:
+                leaf_states, transforms = zip(*map(game.canonicalize, leaf_states))
+            probs, values = estimator.predict_batch(list(leaf_states))
+            for row, (self_play_game, nodes) in enumerate(pending):
+                prior_probs = {action: probs[row, index]
+                               for action, index in action_indices.items()}
+                if transforms[row]:
+                    prior_probs = {
+                        game.inverse_transform_action(action, transforms[row]): prob
+                        for action, prob in prior_probs.items()}
+                backup(nodes, expand_leaf(nodes[-1], game, prior_probs,
+                                          values[row]))
+                self_play_game.num_simulations += 1
+
+        # Make a move in each game whose search has finished.
+        still_active = []
+        for self_play_game in active_games:
+            search_iters = (mcts_iters if self_play_game.full_search
+                            else fast_mcts_iters)
+            if self_play_game.num_simulations < search_iters:
+                still_active.append(self_play_game)
+                continue
+
+            node = self_play_game.node
+            tau = self_play_temperature(len(self_play_game.action_list))
+            action_counts = {action: child.N
+                             for action, child in node.children.items()}
+            action_probs = extremise_distribution(action_counts, tau)
+            action = sample_distribution(action_probs)
+
+            self_play_game.node = node.children[action]
+            self_play_game.num_simulations = 0
+            self_play_game.action_list.append(action)
+            self_play_game.action_probs_list.append(action_probs)
+            self_play_game.full_search_list.append(self_play_game.full_search)
+            self_play_game.game_state_list.append(self_play_game.node.game_state)
+
+            if not self_play_game.node.is_terminal:
+                self_play_game.full_search = _is_full_search(full_search_fraction)
+                still_active.append(self_play_game)
+                continue
+
+            yield process_self_play_data(
+                self_play_game.game_state_list, self_play_game.action_list,
+                self_play_game.action_probs_list, game, game.action_indices,
+                canonicalize=canonicalize,
+                full_search=self_play_game.full_search_list)
+            if num_started < num_games:
+                new_game = _SelfPlayGame(game)
+                new_game.full_search = _is_full_search(full_search_fraction)
+                still_active.append(new_game)
+                num_started += 1
+
+        active_games = still_active
+
+
+def process_self_play_data(states_, actions_, action_probs_, game,
+                           action_indices, canonicalize=False,
+                           full_search=None):
+    """Takes a list of states and action probabilities, as returned by
+    play, and creates training data from this. We build up a list
+    consisting of (state, probs, z) tuples, where player is the player
+    in state 'state', and 'z' is the utility to 'player' in 'last_state'.
+
+    We omit the terminal state from the list as there are no probabilities to
+    train. TODO: Potentially include the terminal state in order to train the
+    value. # TODO: why the underscores in the parameter names?
+
+    Parameters
+    ----------
+    states_: list
+        A list of n states, with the last being terminal.
+    actions_: list
+        A list of n-1 actions, being the action taken in the corresponding
+        state.
+    action_probs_: list
+        A list of n-1 dictionaries containing action probabilities. The ith
+        dictionary applies to the ith state, representing the probabilities
+        returned by play of taking each available action in the state.
+    game: Game
+        An object representing the game to be played.
+    action_indices: dict
+        A dictionary mapping actions (in the form of the legal_actions
+        function) to action indices (to be used for training the neural
+        network).
+    canonicalize: bool
+        Whether to replace each state by its canonical representative
+        under the symmetries of the game (see `Game.canonicalize`),
+        mapping the action and probabilities onto it. Symmetric
+        positions then have identical states, so a deduplicating
+        ReplayBuffer merges them.
+    full_search: list or None
+        A list of n-1 booleans, saying whether the ith action was chosen
+        by a full search (see `self_play`). Moves chosen by a fast
+        search get a policy target of zeros, so they only train the
+        value. If None, every move is taken to have had a full search.
+
+    Returns
+    -------
+    training_data: list
+        A list consisting of (state, action, probs, z, full_search)
+        tuples, where player is the player in state 'state', and 'z' is
+        the utility to 'player' in 'last_state'.
+    """
+
+    # Get the outcome for the game. This should be the last state in states_.
+    last_state = states_.pop()
+    outcome = game.utility(last_state)
+
+    if full_search is None:
+        full_search = [True] * len(actions_)
+
+    # Now action_probs_ and states_ are the same length.
+    training_data = []
+    for state, action, probs, full in zip(states_, actions_, action_probs_,
+                                          full_search):
+        # Get the player in the state, and the value to this player of the
+        # terminal state.
+        player = game.current_player(state)
+        z = outcome[player]
+
+        if canonicalize:
+            state, transform = game.canonicalize(state)
+            if transform:
+                action = game.transform_action(action, transform)
+                probs = {game.transform_action(a, transform): prob
+                         for a, prob in probs.items()}
+
+        # Convert the probs dictionary to a numpy array using action_indices.
+        probs_vector = np.zeros(len(action_indices))
+        if full:
+            for a, prob in probs.items():
+                probs_vector[action_indices[a]] = prob
+
+        non_nan_state = np.nan_to_num(state)
+
+        training_data.append((non_nan_state, action, probs_vector, z, full))
+
+    return training_data
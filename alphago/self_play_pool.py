@@ -0,0 +1,209 @@
+"""Multiprocess self-play
+
+This module provides a pool of worker processes that play self-play
+games in parallel. Each call to `SelfPlayPool.play` exports the weights
+of the self-play estimator to a NumPy .npz file, which each worker loads
+the first time it plays a game with those weights. The workers then
+evaluate states with the NumPy estimator (see `alphago.numpy_estimator`),
+so they never import TensorFlow and no session is shared between
+processes. A weights file is kept until every game of the calls using it
+has been received, so calls may overlap.
+
+Every game is played with its own seed, drawn from the pool's random
+state, and game logs are returned as soon as each game finishes, so a
+fast game never waits behind a slow one.
+
+Classes
+-------
+SelfPlayPool
+    A pool of processes playing self-play games.
+"""
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .numpy_estimator import to_numpy_estimator
+from .self_play_games import self_play
+
+__all__ = ["SelfPlayPool"]
+
+# The state of a worker process, set by `_initialise_worker`.
+_worker = {}  # type: Dict[str, Any]
+
+
+def _initialise_worker(game, estimator_class, action_indices, mcts_iters,
+                       c_puct, self_play_kwargs) -> None:
+    _worker.update(game=game, estimator_class=estimator_class,
+                   action_indices=action_indices, mcts_iters=mcts_iters,
+                   c_puct=c_puct, self_play_kwargs=self_play_kwargs,
+                   weights_file=None, estimator=None)
+
+
+def _play_game(task: Tuple[str, int]) -> List[Tuple]:
+    """Play a self-play game in a worker process with the given weights
+    and seed."""
+    weights_file, seed = task
+    if _worker['weights_file'] != weights_file:
+        _worker['estimator'] = _worker['estimator_class'].load(
+            weights_file, _worker['action_indices'])
+        _worker['weights_file'] = weights_file
+
+    random.seed(seed)
+    np.random.seed(seed)
+    return self_play(_worker['game'], _worker['estimator'].create_estimate_fn(),
+                     _worker['mcts_iters'], _worker['c_puct'],
+                     **_worker['self_play_kwargs'])
+
+
+class SelfPlayPool:
+    """A pool of worker processes that play self-play games.
+
+    Parameters
+    ----------
+    game: Game
+        The game to play. It must be picklable.
+    num_workers: int
+        The number of worker processes.
+    mcts_iters: int
+        Number of iterations to run MCTS for on each move.
+    c_puct: float
+        Parameter for MCTS.
+    seed: int or None
+        Seeds the random state used to draw the seed of each game.
+    canonicalize: bool
+        Whether the game logs have canonical states, and states are
+        evaluated in their canonical orientation, as for `self_play`.
+    full_search_fraction: float
+        The probability that a move gets a full search, as for
+        `self_play`.
+    fast_mcts_iters: int or None
+        Number of iterations of a fast search, as for `self_play`.
+
+    Examples
+    --------
+    >>> with SelfPlayPool(game, num_workers=8, mcts_iters=100,
+    ...                   c_puct=1.0) as pool:
+    ...     for game_log in pool.play(estimator, num_games=100):
+    ...         replay_buffer.extend(game_log)
+    """
+
+    def __init__(self, game, num_workers: int, mcts_iters: int, c_puct: float,
+                 seed: Optional[int] = None, canonicalize: bool = False,
+                 full_search_fraction: float = 1.0,
+                 fast_mcts_iters: Optional[int] = None) -> None:
+        if num_workers < 1:
+            raise ValueError("`num_workers` must be at least 1.")
+        if not 0 <= full_search_fraction <= 1:
+            raise ValueError("`full_search_fraction` must be between 0 and 1.")
+        self.game = game
+        self.num_workers = num_workers
+        self.mcts_iters = mcts_iters
+        self.c_puct = c_puct
+        self.self_play_kwargs = {'canonicalize': canonicalize,
+                                 'full_search_fraction': full_search_fraction,
+                                 'fast_mcts_iters': fast_mcts_iters}
+        self.random_state = np.random.RandomState(seed)
+
+        self._weights_dir = tempfile.mkdtemp(prefix='self_play_weights')
+        self._weights_file = None  # type: Optional[str]
+        self._num_weights = 0
+        # The number of unfinished calls to `play` using each file.
+        self._weights_users = Counter()  # type: Counter
+        self._estimator_class = None  # type: Optional[type]
+        self._pool = None  # type: Optional[multiprocessing.pool.Pool]
+
+    def _start(self, estimator) -> None:
+        self._estimator_class = type(estimator)
+        # Spawn, rather than fork, so that no TensorFlow state is
+        # inherited by the workers.
+        context = multiprocessing.get_context('spawn')
+        self._pool = context.Pool(
+            self.num_workers, initializer=_initialise_worker,
+            initargs=(self.game, self._estimator_class,
+                      estimator.action_indices, self.mcts_iters, self.c_puct,
+                      self.self_play_kwargs))
+
+    def _export_weights(self, estimator) -> str:
+        """Save the weights of the NumPy estimator to a new file, and
+        delete the previous one unless games are still being played
+        with it."""
+        previous_file = self._weights_file
+        self._weights_file = os.path.join(
+            self._weights_dir, 'weights{}.npz'.format(self._num_weights))
+        self._num_weights += 1
+        estimator.save(self._weights_file)
+        if previous_file is not None and not self._weights_users[previous_file]:
+            os.remove(previous_file)
+        return self._weights_file
+
+    def _release_weights(self, weights_file: str) -> None:
+        """Delete the weights file once no call uses it, unless it is
+        the latest."""
+        self._weights_users[weights_file] -= 1
+        if not self._weights_users[weights_file]:
+            del self._weights_users[weights_file]
+            if weights_file != self._weights_file:
+                os.remove(weights_file)
+
+    def _game_logs(self, weights_file: str,
+                   results: Iterator[List[Tuple]]) -> Iterator[List[Tuple]]:
+        try:
+            yield from results
+        finally:
+            self._release_weights(weights_file)
+
+    def play(self, estimator, num_games: int) -> Iterator[List[Tuple]]:
+        """Play self-play games with the estimator.
+
+        Parameters
+        ----------
+        estimator:
+            The estimator to play with. Either a NumPy estimator or a
+            TensorFlow estimator with a NumPy counterpart.
+        num_games: int
+            The number of games to play.
+
+        Returns
+        -------
+        iterator:
+            An iterator over the game logs, in the format returned by
+            `self_play`, in the order in which the games finish. It
+            may be consumed after later calls to `play`.
+        """
+        estimator = to_numpy_estimator(estimator)
+        if self._pool is None:
+            self._start(estimator)
+        elif type(estimator) is not self._estimator_class:
+            raise ValueError("The estimator must be a {}.".format(
+                self._estimator_class.__name__))
+
+        weights_file = self._export_weights(estimator)
+        seeds = self.random_state.randint(2 ** 31, size=num_games)
+        tasks = [(weights_file, int(seed)) for seed in seeds]
+        self._weights_users[weights_file] += 1
+        return self._game_logs(weights_file,
+                               self._pool.imap_unordered(_play_game, tasks))
+
+    def close(self) -> None:
+        """Stop the worker processes and delete the exported weights."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        shutil.rmtree(self._weights_dir, ignore_errors=True)
+
+    def __enter__(self) -> "SelfPlayPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __repr__(self):
+        return "{0}({1}, num_workers={2})".format(
+            self.__class__.__name__, self.game, self.num_workers)
@@ -0,0 +1,115 @@
+"""Sequential probability ratio test
+
+This module provides a sequential probability ratio test (SPRT) for
+deciding whether a player's success rate against another player, i.e.
+the fraction of games it wins or draws, is above a threshold. Rather
+than playing a fixed number of games, the test is updated after each
+game and stops as soon as the evidence is strong enough to decide
+either way with the configured error rates.
+
+The test compares the hypotheses H0: p = p0 and H1: p = p1, where p is
+the success rate and p0 < p1. Success rates between p0 and p1 form an
+indifference region, in which either decision is acceptable. After n
+games with s successes, the log likelihood ratio is
+
+.. math::
+    \\mathrm{LLR} = s \\log(p_1 / p_0) + (n - s) \\log((1 - p_1) / (1 - p_0)).
+
+H1 is accepted once the LLR reaches log((1 - beta) / alpha), and H0 once
+it falls to log(beta / (1 - alpha)), where alpha is the probability of
+accepting H1 when H0 holds and beta the probability of accepting H0
+when H1 holds.
+
+Classes
+-------
+SPRT
+    A sequential probability ratio test of a success rate.
+"""
+import math
+from typing import Optional
+
+__all__ = ["SPRT"]
+
+
+class SPRT:
+    """A sequential probability ratio test of a success rate.
+
+    Parameters
+    ----------
+    p0, p1: float
+        The success rates under the null and alternative hypotheses,
+        with 0 < p0 < p1 < 1.
+    alpha: float
+        The probability of accepting H1 when H0 holds.
+    beta: float
+        The probability of accepting H0 when H1 holds.
+
+    Attributes
+    ----------
+    llr: float
+        The log likelihood ratio of the results so far.
+    num_games: int
+        The number of results so far.
+    num_successes: int
+        The number of successes so far.
+
+    Examples
+    --------
+    >>> sprt = SPRT.for_win_rate(0.55, margin=0.05)
+    >>> while sprt.decision is None:
+    ...     sprt.update(play_game() >= 0)
+    """
+
+    def __init__(self, p0: float, p1: float, alpha: float = 0.05,
+                 beta: float = 0.05) -> None:
+        if not 0 < p0 < p1 < 1:
+            raise ValueError("`p0` and `p1` must satisfy 0 < p0 < p1 < 1.")
+        if not (0 < alpha < 1 and 0 < beta < 1):
+            raise ValueError("`alpha` and `beta` must be between 0 and 1.")
+        self.p0 = p0
+        self.p1 = p1
+        self.alpha = alpha
+        self.beta = beta
+
+        self.upper_bound = math.log((1 - beta) / alpha)
+        self.lower_bound = math.log(beta / (1 - alpha))
+        self._success_llr = math.log(p1 / p0)
+        self._failure_llr = math.log((1 - p1) / (1 - p0))
+
+        self.llr = 0.0
+        self.num_games = 0
+        self.num_successes = 0
+
+    @classmethod
+    def for_win_rate(cls, win_rate: float, margin: float = 0.05,
+                     alpha: float = 0.05, beta: float = 0.05) -> "SPRT":
+        """Returns a test of whether the success rate is above win_rate,
+        with an indifference region of the given margin either side.
+        The hypotheses are clipped to lie strictly between 0 and 1."""
+        p0 = max(win_rate - margin, 1e-3)
+        p1 = min(win_rate + margin, 1 - 1e-3)
+        return cls(p0, p1, alpha=alpha, beta=beta)
+
+    def update(self, success: bool) -> Optional[bool]:
+        """Record the result of a game, returning the decision."""
+        self.num_games += 1
+        if success:
+            self.num_successes += 1
+            self.llr += self._success_llr
+        else:
+            self.llr += self._failure_llr
+        return self.decision
+
+    @property
+    def decision(self) -> Optional[bool]:
+        """True if H1 is accepted, False if H0 is accepted, or None if
+        more games are needed."""
+        if self.llr >= self.upper_bound:
+            return True
+        if self.llr <= self.lower_bound:
+            return False
+        return None
+
+    def __repr__(self):
+        return "{0}(p0={1}, p1={2}, alpha={3}, beta={4})".format(
+            self.__class__.__name__, self.p0, self.p1, self.alpha, self.beta)
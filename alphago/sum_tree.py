@@ -0,0 +1,103 @@
+"""Sum tree
+
+This module provides a sum tree: a binary tree over an array of
+non-negative values in which each internal node holds the sum of its
+children. Setting a value and drawing an index with probability
+proportional to its value both take O(log n) time, which makes it the
+standard structure for prioritised experience replay.
+
+The tree is stored implicitly in a NumPy array, with the root at index 1
+and the children of node i at 2i and 2i + 1. Updates and draws are
+vectorised over batches of indices, one tree level at a time.
+
+Classes
+-------
+SumTree
+    A sum tree over a fixed number of values.
+"""
+import numpy as np
+
+__all__ = ["SumTree"]
+
+
+class SumTree:
+    """A sum tree over ``capacity`` non-negative values, initially 0.
+
+    Parameters
+    ----------
+    capacity: int
+        The number of values.
+
+    Examples
+    --------
+    >>> tree = SumTree(4)
+    >>> tree.update([0, 1, 2, 3], [1.0, 0.0, 2.0, 1.0])
+    >>> tree.total
+    4.0
+    >>> tree.find([0.5, 1.5, 3.5])
+    array([0, 2, 3])
+    """
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError("`capacity` must be at least 1.")
+        self.capacity = capacity
+        self._depth = int(np.ceil(np.log2(capacity))) if capacity > 1 else 0
+        self._num_leaves = 2 ** self._depth
+        self._nodes = np.zeros(2 * self._num_leaves, dtype=np.float64)
+
+    @property
+    def total(self) -> float:
+        """The sum of the values."""
+        return float(self._nodes[1])
+
+    def __getitem__(self, indices) -> np.ndarray:
+        return self._nodes[self._num_leaves + np.asarray(indices)]
+
+    def update(self, indices, values) -> None:
+        """Set the values at the given indices, then update their
+        ancestors."""
+        indices = np.asarray(indices, dtype=np.int64)
+        values = np.broadcast_to(np.asarray(values, dtype=np.float64), indices.shape)
+        if np.any(values < 0):
+            raise ValueError("Values must be non-negative.")
+
+        nodes = np.unique(indices + self._num_leaves)
+        # Later duplicates win, as for fancy assignment.
+        self._nodes[indices + self._num_leaves] = values
+        for _ in range(self._depth):
+            nodes = np.unique(nodes // 2)
+            self._nodes[nodes] = self._nodes[2 * nodes] + self._nodes[2 * nodes + 1]
+
+    def find(self, cumulative_values) -> np.ndarray:
+        """Returns, for each given value u in [0, total), the index i
+        such that the sum of the values before i is at most u and the
+        sum up to and including i exceeds u.
+
+        Drawing u uniformly from [0, total) therefore draws i with
+        probability proportional to its value.
+        """
+        remaining = np.array(cumulative_values, dtype=np.float64, ndmin=1)
+        nodes = np.ones(remaining.shape, dtype=np.int64)
+        for _ in range(self._depth):
+            left = self._nodes[2 * nodes]
+            # Never descend into a subtree without any mass, which
+            # rounding could otherwise cause at the right edge.
+            go_right = (remaining >= left) & (self._nodes[2 * nodes + 1] > 0)
+            remaining -= np.where(go_right, left, 0)
+            nodes = 2 * nodes + go_right
+        return nodes - self._num_leaves
+
+    def sample(self, size: int, random_state=np.random) -> np.ndarray:
+        """Draw indices with probability proportional to their values,
+        with replacement."""
+        if self.total <= 0:
+            raise ValueError("Cannot sample from a tree with no mass.")
+        return self.find(random_state.uniform(0, self.total, size=size))
+
+    def __len__(self) -> int:
+        return self.capacity
+
+    def __repr__(self):
+        return "{0}(capacity={1}, total={2})".format(
+            self.__class__.__name__, self.capacity, self.total)
@@ -0,0 +1,280 @@
+"""Resumable training state
+
+A checkpoint of the training estimator (see `alphago.alphago.train_alphago`)
+only restores the weights of the net. This module snapshots everything
+else a resumed run needs to behave as if it had never stopped:
+
+* the weights of the training estimator, including the momentum
+  accumulators of its optimiser, and of the self-play estimator,
+* the global step and weights version of both estimators,
+* the contents of the replay buffer, including the occurrence counts of
+  merged positions, which of them had a full search, and any
+  priorities,
+* the states of the global NumPy and Python random number generators,
+* the AlphaGo step the snapshot was taken after.
+
+A snapshot is a single .npz file, written to a temporary file and then
+renamed, so a crash never leaves a partially written snapshot. Scalars
+and the Python random state are stored as JSON in the ``metadata`` entry,
+so snapshots are loaded without unpickling.
+
+Capturing a snapshot copies the state in the calling thread, which is
+fast, while `SnapshotWriter` writes it to disk in a background thread so
+that training doesn't wait for the disk.
+
+Classes
+-------
+TrainingState
+    A snapshot of the state of an AlphaGo training run.
+SnapshotWriter
+    Writes snapshots in a background thread.
+
+Functions
+---------
+capture_training_state
+    Snapshot the state of a training run.
+restore_training_state
+    Restore a training run from a snapshot.
+save_training_state
+    Write a snapshot to a file.
+load_training_state
+    Read a snapshot from a file.
+"""
+import json
+import os
+import queue
+import random
+import threading
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .replay_buffer import PrioritizedReplayBuffer, ReplayBuffer
+
+__all__ = ["TrainingState", "SnapshotWriter", "capture_training_state",
+           "restore_training_state", "save_training_state",
+           "load_training_state"]
+
+
+class TrainingState(NamedTuple):
+    alphago_step: int
+    training_weights: Dict[str, np.ndarray]
+    self_play_weights: Dict[str, np.ndarray]
+    training_global_step: int
+    training_weights_version: int
+    self_play_weights_version: int
+    replay_buffer: Dict[str, Any]
+    numpy_random_state: Tuple
+    python_random_state: Tuple
+
+
+def _copy_replay_buffer(replay_buffer: ReplayBuffer) -> Dict[str, Any]:
+    """Returns copies of the arrays of the replay buffer, in slot
+    order, together with its capacity and number of positions added."""
+    contents = {'capacity': replay_buffer.capacity,
+                'num_added': replay_buffer.num_added,
+                'outcomes': replay_buffer.outcomes.copy(),
+                'weights_versions': replay_buffer.weights_versions.copy(),
+                'counts': replay_buffer.counts.copy(),
+                'policy_counts': replay_buffer.policy_counts.copy()}
+    if isinstance(replay_buffer, PrioritizedReplayBuffer):
+        contents['priorities'] = replay_buffer.priorities.copy()
+    if replay_buffer.states is not None:
+        contents['states'] = replay_buffer.states.copy()
+        contents['probs'] = replay_buffer.probs.copy()
+    return contents
+
+
+def capture_training_state(alphago_step: int, training_estimator,
+                           self_play_estimator,
+                           replay_buffer: ReplayBuffer) -> TrainingState:
+    """Snapshot the state of a training run after the given AlphaGo
+    step. All arrays are copied, so the run can continue while the
+    snapshot is written."""
+    return TrainingState(
+        alphago_step=alphago_step,
+        training_weights=training_estimator.get_weights(include_optimizer=True),
+        self_play_weights=self_play_estimator.get_weights(),
+        training_global_step=training_estimator.global_step,
+        training_weights_version=training_estimator.weights_version,
+        self_play_weights_version=self_play_estimator.weights_version,
+        replay_buffer=_copy_replay_buffer(replay_buffer),
+        numpy_random_state=np.random.get_state(),
+        python_random_state=random.getstate())
+
+
+def restore_training_state(state: TrainingState, training_estimator,
+                           self_play_estimator,
+                           replay_buffer: ReplayBuffer) -> int:
+    """Restore the estimators, the replay buffer and the random states
+    from the snapshot, in place, and return the AlphaGo step it was
+    taken after.
+
+    Raises
+    ------
+    ValueError:
+        If the replay buffer has a different capacity to the one in the
+        snapshot.
+    """
+    contents = state.replay_buffer
+    if contents['capacity'] != replay_buffer.capacity:
+        raise ValueError(
+            "The snapshot has a replay buffer of capacity {}, not {}.".format(
+                contents['capacity'], replay_buffer.capacity))
+
+    training_estimator.set_weights(state.training_weights)
+    self_play_estimator.set_weights(state.self_play_weights)
+    training_estimator.global_step = state.training_global_step
+    training_estimator.weights_version = state.training_weights_version
+    self_play_estimator.weights_version = state.self_play_weights_version
+
+    replay_buffer.num_added = contents['num_added']
+    replay_buffer.outcomes[:] = contents['outcomes']
+    replay_buffer.weights_versions[:] = contents['weights_versions']
+    replay_buffer.counts[:] = contents['counts']
+    replay_buffer.policy_counts[:] = contents['policy_counts']
+    if isinstance(replay_buffer, PrioritizedReplayBuffer) and 'priorities' in contents:
+        replay_buffer.priorities[:] = contents['priorities']
+    if 'states' in contents:
+        replay_buffer.states = contents['states'].copy()
+        replay_buffer.probs = contents['probs'].copy()
+    replay_buffer.reindex()
+
+    np.random.set_state(state.numpy_random_state)
+    random.setstate(state.python_random_state)
+    return state.alphago_step
+
+
+def save_training_state(state: TrainingState, path: str) -> None:
+    """Write the snapshot to path, replacing any existing snapshot only
+    once the new one is complete."""
+    bit_generator, keys, position, has_gauss, cached_gaussian = \
+        state.numpy_random_state
+    version, internal_state, gauss_next = state.python_random_state
+    metadata = {
+        'alphago_step': state.alphago_step,
+        'training_global_step': state.training_global_step,
+        'training_weights_version': state.training_weights_version,
+        'self_play_weights_version': state.self_play_weights_version,
+        'capacity': state.replay_buffer['capacity'],
+        'num_added': state.replay_buffer['num_added'],
+        'numpy_random_state': [bit_generator, int(position), int(has_gauss),
+                               float(cached_gaussian)],
+        'python_random_state': [version, list(internal_state), gauss_next]}
+
+    arrays = {'metadata': np.array(json.dumps(metadata)),
+              'numpy_random/keys': keys}
+    for name, value in state.training_weights.items():
+        arrays['training/' + name] = value
+    for name, value in state.self_play_weights.items():
+        arrays['self_play/' + name] = value
+    for name in ['outcomes', 'weights_versions', 'counts', 'policy_counts',
+                 'priorities', 'states', 'probs']:
+        if name in state.replay_buffer:
+            arrays['replay/' + name] = state.replay_buffer[name]
+
+    temporary_file = path + '.tmp'
+    with open(temporary_file, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(temporary_file, path)
+
+
+def load_training_state(path: str) -> TrainingState:
+    """Read a snapshot written by `save_training_state`."""
+    with np.load(path) as data:
+        metadata = json.loads(str(data['metadata']))
+        weights = {'training': {}, 'self_play': {}}  # type: Dict[str, Dict]
+        replay_contents = {'capacity': metadata['capacity'],
+                           'num_added': metadata['num_added']}
+        for key in data.files:
+            group, _, name = key.partition('/')
+            if group in weights:
+                weights[group][name] = data[key]
+            elif group == 'replay':
+                replay_contents[name] = data[key]
+        keys = data['numpy_random/keys']
+
+    bit_generator, position, has_gauss, cached_gaussian = \
+        metadata['numpy_random_state']
+    version, internal_state, gauss_next = metadata['python_random_state']
+    return TrainingState(
+        alphago_step=metadata['alphago_step'],
+        training_weights=weights['training'],
+        self_play_weights=weights['self_play'],
+        training_global_step=metadata['training_global_step'],
+        training_weights_version=metadata['training_weights_version'],
+        self_play_weights_version=metadata['self_play_weights_version'],
+        replay_buffer=replay_contents,
+        numpy_random_state=(bit_generator, keys, position, has_gauss,
+                            cached_gaussian),
+        python_random_state=(version, tuple(internal_state), gauss_next))
+
+
+class SnapshotWriter:
+    """Writes snapshots to disk in a background thread.
+
+    At most one snapshot is waiting to be written at a time: `write`
+    blocks until the previous snapshot has been taken by the thread. An
+    error raised while writing is re-raised by the next call to `write`,
+    `wait` or `close`.
+
+    Examples
+    --------
+    >>> with SnapshotWriter() as writer:
+    ...     for step in range(num_steps):
+    ...         train(step)
+    ...         writer.write(capture_training_state(...), path)
+    """
+
+    def __init__(self) -> None:
+        self._queue = queue.Queue(maxsize=1)  # type: queue.Queue
+        self._error = None  # type: Optional[BaseException]
+        self.num_written = 0
+        self._thread = threading.Thread(target=self._run, name='SnapshotWriter',
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                state, path = item
+                try:
+                    save_training_state(state, path)
+                    self.num_written += 1
+                except BaseException as error:
+                    self._error = error
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def write(self, state: TrainingState, path: str) -> None:
+        """Queue the snapshot to be written to path."""
+        self._raise_error()
+        if not self._thread.is_alive():
+            raise ValueError("The writer is closed.")
+        self._queue.put((state, path))
+
+    def wait(self) -> None:
+        """Block until all queued snapshots have been written."""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        """Write any queued snapshot and stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -1,5 +1,8 @@
+import functools
 import inspect
-from typing import Any, Callable, TypeVar, Dict
+import sys
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, TypeVar
 
 import numpy as np
 
@@ -24,22 +27,177 @@ def sample_distribution(distribution: Dict[T, float]) -> T:
     return outcome
 
 
-def memoize(func: Callable) -> Callable:
-    """Given a functon, return a memoized copy of that function."""
-    cache = dict()
+DEFAULT_CACHE_MAXSIZE = 2 ** 17
 
-    def memoized_func(*args: Any) -> Any:
-        if args in cache:
-            return cache[args]
-        result = func(*args)
-        cache[args] = result
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    currsize: int
+    maxsize: Optional[int]
+    nbytes: int
+
+
+def _sizeof(obj: Any) -> int:
+    """Estimate the number of bytes used by an object stored in a
+    cache. This is shallow, except that numpy arrays are counted by the
+    size of their data."""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes + sys.getsizeof(obj)
+    return sys.getsizeof(obj)
+
+
+class LRUCache:
+    """A bounded cache that evicts the least recently used entries.
+
+    Entries are evicted once there are more than ``maxsize`` of them
+    or, if ``max_bytes`` is given, once the estimated size of the keys
+    and values exceeds ``max_bytes``. The cache counts its hits, misses
+    and evictions.
+
+    Parameters
+    ----------
+    maxsize: int or None
+        The maximum number of entries, or None for no limit.
+    max_bytes: int or None
+        The maximum estimated size in bytes of the cached keys and
+        values, or None for no limit.
+    sizeof: callable
+        A function estimating the size in bytes of a key or value.
+    """
+
+    def __init__(self, maxsize: Optional[int] = DEFAULT_CACHE_MAXSIZE,
+                 max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = _sizeof) -> None:
+        if maxsize is not None and maxsize < 0:
+            raise ValueError("maxsize must be non-negative.")
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries = OrderedDict()  # type: OrderedDict
+        self._entry_bytes = {}  # type: Dict[Hashable, int]
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value for the key, marking it as most recently
+        used, or ``default`` if the key is not in the cache."""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Insert a value into the cache, evicting the least recently
+        used entries if the cache is over its limits."""
+        if key in self._entries:
+            self.nbytes -= self._entry_bytes[key]
+        entry_bytes = self._sizeof(key) + self._sizeof(value)
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._entry_bytes[key] = entry_bytes
+        self.nbytes += entry_bytes
+
+        while self._entries and self._over_limit():
+            evicted_key, _ = self._entries.popitem(last=False)
+            self.nbytes -= self._entry_bytes.pop(evicted_key)
+            self.evictions += 1
+
+    def _over_limit(self) -> bool:
+        return ((self.maxsize is not None and len(self._entries) > self.maxsize) or
+                (self.max_bytes is not None and self.nbytes > self.max_bytes))
+
+    def clear(self, reset_stats: bool = True) -> None:
+        """Remove all entries and, unless ``reset_stats`` is False,
+        reset the statistics."""
+        self._entries.clear()
+        self._entry_bytes.clear()
+        self.nbytes = 0
+        if reset_stats:
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> CacheInfo:
+        """Return the cache statistics."""
+        return CacheInfo(self.hits, self.misses, self.evictions,
+                         len(self._entries), self.maxsize, self.nbytes)
+
+
+_MISSING = object()
+_KWARGS_MARK = object()
+
+
+def memoize(func: Optional[Callable] = None, *,
+            maxsize: Optional[int] = DEFAULT_CACHE_MAXSIZE,
+            max_bytes: Optional[int] = None) -> Callable:
+    """Given a function, return a memoized copy of that function.
+
+    The results are stored in an `LRUCache` bounded by ``maxsize``
+    entries and, optionally, ``max_bytes`` bytes. Calls with unhashable
+    arguments are passed straight through to the function and counted
+    as misses. The memoized function has ``cache_info()`` and
+    ``cache_clear()`` methods, and can be used as a decorator with or
+    without arguments:
+
+    >>> @memoize
+    ... def square(x):
+    ...     return x * x
+    >>> @memoize(maxsize=1000)
+    ... def cube(x):
+    ...     return x * x * x
+
+    Parameters
+    ----------
+    func: callable
+        The function to memoize.
+    maxsize: int or None
+        The maximum number of results to cache, or None for no limit.
+    max_bytes: int or None
+        The maximum estimated size in bytes of the cached arguments and
+        results, or None for no limit.
+    """
+    if func is None:
+        return functools.partial(memoize, maxsize=maxsize, max_bytes=max_bytes)
+
+    cache = LRUCache(maxsize=maxsize, max_bytes=max_bytes)
+
+    @functools.wraps(func)
+    def memoized_func(*args: Any, **kwargs: Any) -> Any:
+        key = args
+        if kwargs:
+            key += (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+        try:
+            result = cache.get(key, _MISSING)
+        except TypeError:
+            # The arguments are unhashable, so can't be cached.
+            cache.misses += 1
+            return func(*args, **kwargs)
+        if result is _MISSING:
+            result = func(*args, **kwargs)
+            cache.put(key, result)
         return result
 
+    memoized_func.cache_info = cache.info
+    memoized_func.cache_clear = cache.clear
     return memoized_func
 
 
-def memoize_instance(instance: T) -> None:
+def memoize_instance(instance: T, maxsize: Optional[int] = DEFAULT_CACHE_MAXSIZE,
+                     max_bytes: Optional[int] = None) -> None:
     """Given an instance of a class, replace each of its methods with
-    a memoized copy."""
+    a memoized copy. Each method gets its own cache with the given
+    limits. Special methods such as ``__init__`` are left alone."""
     for name, fn in inspect.getmembers(instance, inspect.ismethod):
-        setattr(instance, name, memoize(fn))
+        if name.startswith('__') and name.endswith('__'):
+            continue
+        setattr(instance, name, memoize(fn, maxsize=maxsize, max_bytes=max_bytes))
@@ -1,7 +1,8 @@
+import multiprocessing
+
 from alphago.games import NoughtsAndCrosses, ConnectFour
-from alphago.evaluator import run_tournament, compare_against_players
-from alphago.player import RandomPlayer, MCTSPlayer
-from alphago.estimator import create_trivial_estimator, create_rollout_estimator
+from alphago.match_runner import (EstimatorSpec, PlayerSpec,
+                                  run_gauntlet_parallel, run_tournament_parallel)
 from alphago.elo import elo
 
 import matplotlib
@@ -13,17 +14,14 @@ tqdm.tqdm.monitor_interval = 0
 
 game = ConnectFour()
 
-trivial_estimator = create_trivial_estimator(game)
-rollout_estimator_10 = create_rollout_estimator(game, 10)
-rollout_estimator_100 = create_rollout_estimator(game, 100)
-rollout_estimator_200 = create_rollout_estimator(game, 200)
-
+# Players are described by picklable specs, so that each worker process
+# can build its own copy.
 mcts_args = 10, 0.5, 0.01
-random_player = RandomPlayer(game)
-trivial_mcts_player = MCTSPlayer(game, trivial_estimator, *mcts_args)
-rollout_mcts_player_10 = MCTSPlayer(game, rollout_estimator_10, *mcts_args)
-rollout_mcts_player_100 = MCTSPlayer(game, rollout_estimator_100, *mcts_args)
-rollout_mcts_player_200 = MCTSPlayer(game, rollout_estimator_200, *mcts_args)
+random_player = PlayerSpec.random()
+trivial_mcts_player = PlayerSpec.mcts(EstimatorSpec.trivial(), *mcts_args)
+rollout_mcts_player_10 = PlayerSpec.mcts(EstimatorSpec.rollout(10), *mcts_args)
+rollout_mcts_player_100 = PlayerSpec.mcts(EstimatorSpec.rollout(100), *mcts_args)
+rollout_mcts_player_200 = PlayerSpec.mcts(EstimatorSpec.rollout(200), *mcts_args)
 
 players = {
     2: random_player,
@@ -33,21 +31,24 @@ players = {
     # 5: rollout_mcts_player_200
 }
 
-# results_list = run_tournament(game, players, 5)
-results_list = compare_against_players(game, (1, rollout_mcts_player_100),
-                                       players, 5)
-print(results_list)
-
-results = np.zeros(shape=(len(players), len(players)))
-for result in results_list:
-    i, j, n = result
-    results[i - 1, j - 1] = n
-
-fig, ax = plt.subplots()
-gammas = elo(results_list)
-ax.text(0.4, -0.8, str(["{:d}: {:.2f}".format(player_no, gamma)
-                        for player_no, gamma in sorted(gammas.items())]))
-a = ax.matshow(results, cmap=plt.cm.coolwarm)
-plt.colorbar(a)
-plt.tight_layout()
-fig.savefig('results.png')
+if __name__ == '__main__':
+    num_workers = multiprocessing.cpu_count()
+    # results_list = run_tournament_parallel(game, players, 5, num_workers)
+    results_list = run_gauntlet_parallel(game, (1, rollout_mcts_player_100),
+                                         players, 5, num_workers)
+    print(results_list)
+
+    num_players = max(max(i, j) for i, j, _ in results_list)
+    results = np.zeros(shape=(num_players, num_players))
+    for result in results_list:
+        i, j, n = result
+        results[i - 1, j - 1] = n
+
+    fig, ax = plt.subplots()
+    gammas = elo(results_list)
+    ax.text(0.4, -0.8, str(["{:d}: {:.2f}".format(player_no, gamma)
+                            for player_no, gamma in sorted(gammas.items())]))
+    a = ax.matshow(results, cmap=plt.cm.coolwarm)
+    plt.colorbar(a)
+    plt.tight_layout()
+    fig.savefig('results.png')
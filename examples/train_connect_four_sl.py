@@ -91,7 +91,7 @@ def update_results(game_results, game_results_file_name):
         pickle.dump(results, f)
 
 
-def compute_accuracy(estimator, optimal_actions):
+def compute_accuracy(estimator, optimal_actions, batch_size=1024):
     """Computes the accuracy of the estimator predicting actions according to
     the maximum probability.
 
@@ -105,6 +105,9 @@ def compute_accuracy(estimator, optimal_actions):
         optimal_actions). Here state is a connect four state, and
         optimal_actions is a list of optimal actions in that state. The
         actions are all indexed 1 to 7.
+    batch_size: int
+        The number of states to evaluate at once, if the estimator
+        supports batched evaluation with `predict_batch`.
 
     Returns
     -------
@@ -114,15 +117,25 @@ def compute_accuracy(estimator, optimal_actions):
         probability action is in the optimal actions.
     """
     predicted_actions = []
-    actions_list = []
-    for state, actions in optimal_actions:
-        probs, _ = estimator(state)
-
-        # Get the estimator's predicted action in the range 1 up to 7.
-        predicted_action = max(probs, key=probs.get) + 1
+    actions_list = [actions for _, actions in optimal_actions]
+    if hasattr(estimator, 'predict_batch'):
+        # Evaluate the network in batches, rather than a state at a time.
+        index_actions = {index: action for action, index
+                         in estimator.action_indices.items()}
+        for i in range(0, len(optimal_actions), batch_size):
+            states = [state for state, _ in optimal_actions[i:i + batch_size]]
+            probs, _ = estimator.predict_batch(states)
+
+            # Get the estimator's predicted actions in the range 1 up to 7.
+            predicted_actions.extend(index_actions[index] + 1
+                                     for index in np.argmax(probs, axis=1))
+    else:
+        for state, _ in optimal_actions:
+            probs, _ = estimator(state)
 
-        predicted_actions.append(predicted_action)
-        actions_list.append(actions)
+            # Get the estimator's predicted action in the range 1 up to 7.
+            predicted_action = max(probs, key=probs.get) + 1
+            predicted_actions.append(predicted_action)
 
     return np.mean([1 if predicted_actions[i] in actions_list[i]
                     else 0 for i in range(len(predicted_actions))])
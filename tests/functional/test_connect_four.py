@@ -1,4 +1,6 @@
-from alphago.games.connect_four import ConnectFour
+import random
+
+from alphago.games.connect_four import ConnectFour, action_list_to_state
 
 
 def test_can_play_connect_four():
@@ -12,3 +14,41 @@ def test_can_play_connect_four():
         action = min(next_states)
         game_state = next_states[action]
         next_states = game.legal_actions(game_state)
+
+
+def test_connect_four_incremental_keys_match_keys_computed_from_scratch():
+    random.seed(0)
+    game = ConnectFour()
+    game_state = game.initial_state
+    key = game.state_key(game_state)
+    assert key == 0
+
+    while not game.is_terminal(game_state):
+        action, next_state = random.choice(
+            list(game.legal_actions(game_state).items()))
+        key = game.next_state_key(key, game_state, action)
+        game_state = next_state
+        assert key == game.state_key(game_state)
+
+
+def mirror(state):
+    return tuple(state[7 * row + 6 - col] for row in range(6) for col in range(7))
+
+
+def test_connect_four_mirror_images_have_the_same_canonical_state():
+    game = ConnectFour()
+    state = action_list_to_state([0, 1, 1, 3])
+    mirrored = action_list_to_state([6, 5, 5, 3])
+
+    canonical_state, transform = game.canonicalize(state)
+    canonical_mirrored, mirrored_transform = game.canonicalize(mirrored)
+
+    assert canonical_state == canonical_mirrored
+    assert {transform, mirrored_transform} == {0, 1}
+    for action in range(7):
+        transformed = game.transform_action(action, transform)
+        assert game.inverse_transform_action(transformed, transform) == action
+        next_state = game.legal_actions(state)[action]
+        if transform:
+            next_state = mirror(next_state)
+        assert game.legal_actions(canonical_state)[transformed] == next_state
@@ -1,4 +1,5 @@
 import itertools
+import random
 
 import pytest
 
@@ -90,56 +91,112 @@ class TestMxNNoughtsAndCrosses:
         assert nac_4x7.is_terminal(self.non_terminal_state) is False
 
 
-@pytest.mark.skip(reason="Mid migration to using a bit board.")
+class TestNoughtsAndCrossesStateKeys:
+
+    @pytest.mark.parametrize("rows, columns", [(3, 3), (3, 6), (4, 7)])
+    def test_incremental_keys_match_keys_computed_from_scratch(self, rows, columns):
+        random.seed(0)
+        nac = NoughtsAndCrosses(rows=rows, columns=columns)
+        state = nac.initial_state
+        key = nac.state_key(state)
+        while not nac.is_terminal(state):
+            action, next_state = random.choice(list(nac.legal_actions(state).items()))
+            key = nac.next_state_key(key, state, action)
+            state = next_state
+            assert key == nac.state_key(state)
+
+    def test_keys_are_stable_across_processes(self):
+        nac = NoughtsAndCrosses()
+        assert nac.state_key(nac.initial_state) == 0
+        assert nac.state_key(GameState(0b000010000, 0, 2)) == 0x4C136CF4B05A067E
+
+    def test_distinct_states_have_distinct_keys(self):
+        nac = NoughtsAndCrosses()
+        states = set(nac.legal_actions(nac.initial_state).values())
+        keys = {nac.state_key(state) for state in states}
+        assert len(keys) == len(states)
+
+
+class TestNoughtsAndCrossesCanonicalization:
+    # X in the top left corner and O in the centre, and its images under
+    # the other symmetries of the board.
+    corner_states = [GameState(0b000000001, 0b000010000, 1),
+                     GameState(0b000000100, 0b000010000, 1),
+                     GameState(0b001000000, 0b000010000, 1),
+                     GameState(0b100000000, 0b000010000, 1)]
+
+    def test_symmetric_states_have_the_same_canonical_state(self):
+        nac = NoughtsAndCrosses()
+        canonical_states = {nac.canonicalize(state)[0] for state in self.corner_states}
+        assert len(canonical_states) == 1
+
+    def test_number_of_canonical_opening_states(self):
+        nac = NoughtsAndCrosses()
+        openings = nac.legal_actions(nac.initial_state).values()
+        # corner, edge and centre
+        assert len({nac.canonicalize(state)[0] for state in openings}) == 3
+
+    def test_rectangular_board_only_uses_its_four_symmetries(self):
+        nac = NoughtsAndCrosses(rows=3, columns=6)
+        openings = nac.legal_actions(nac.initial_state).values()
+        assert len({nac.canonicalize(state)[0] for state in openings}) == 6
+
+    @pytest.mark.parametrize("rows, columns", [(3, 3), (3, 6)])
+    def test_transformed_actions_commute_with_playing_actions(self, rows, columns):
+        random.seed(0)
+        nac = NoughtsAndCrosses(rows=rows, columns=columns)
+        state = nac.initial_state
+        while not nac.is_terminal(state):
+            canonical_state, transform = nac.canonicalize(state)
+            canonical_next_states = nac.legal_actions(canonical_state)
+            for action, next_state in nac.legal_actions(state).items():
+                canonical_action = nac.transform_action(action, transform)
+                assert nac.inverse_transform_action(canonical_action, transform) == action
+                assert (nac.canonicalize(canonical_next_states[canonical_action])[0] ==
+                        nac.canonicalize(next_state)[0])
+            state = random.choice(list(nac.legal_actions(state).values()))
+
+
 class TestUltimateNoughtsAndCrosses:
+    unac = UltimateNoughtsAndCrosses()
 
-    initial_state = UltimateGameState(last_sub_action=(0, 0),
-                                      board=(0,) * 81)
+    initial_state = unac.state_from_board((0,) * 81)
     initial_metaboard = (0,) * 9
 
-    non_terminal_state = UltimateGameState(
-        last_sub_action=(2, 2),
-        board=(
-            0, 1, 0, 0, -1, 0, -1, -1, 1,
-            0, 1, 0, 0, 1, 0, 0, -1, 0,
-            -1, 1, 0, 0, -1, 1, 0, 1, -1,
-            -1, 0, 1, 0, 0, -1, 1, 0, 0,
-            -1, 0, 0, 0, 1, -1, 1, 0, 0,
-            -1, 0, 0, 1, 0, -1, 1, 0, 0,
-            1, 1, 1, 0, 0, -1, -1, 0, 0,
-            0, 0, 0, 1, 0, -1, -1, 1, 0,
-            -1, 0, -1, 0, 0, 0, 0, 0, 1)
-    )
+    non_terminal_state = unac.state_from_board((
+        0, 1, 0, 0, -1, 0, -1, -1, 1,
+        0, 1, 0, 0, 1, 0, 0, -1, 0,
+        -1, 1, 0, 0, -1, 1, 0, 1, -1,
+        -1, 0, 1, 0, 0, -1, 1, 0, 0,
+        -1, 0, 0, 0, 1, -1, 1, 0, 0,
+        -1, 0, 0, 1, 0, -1, 1, 0, 0,
+        1, 1, 1, 0, 0, -1, -1, 0, 0,
+        0, 0, 0, 1, 0, -1, -1, 1, 0,
+        -1, 0, -1, 0, 0, 0, 0, 0, 1), next_sub_board=8)
     non_terminal_state_meta_board = (1, 0, -1, -1, -1, 1, 1, 0, 0)
 
-    terminal_state = UltimateGameState(
-        last_sub_action=(0, 2),
-        board=(
-            1, 0, 1, -1, 0, 0, 0, 1, 0,
-            -1, 1, 1, 1, -1, 0, 0, -1, 0,
-            1, 0, -1, 0, 0, -1, 0, 1, 0,
-            0, 1, 0, 1, 1, 1, 0, 0, -1,
-            0, -1, 0, -1, -1, 1, 0, -1, 0,
-            -1, 1, 0, 0, 0, -1, -1, 0, 0,
-            0, -1, 0, -1, -1, -1, 0, 1, 0,
-            0, 1, 0, 0, 0, 0, 0, 1, 0,
-            0, 1, 0, 0, 0, 0, 0, 1, 0)
-    )
+    terminal_state = unac.state_from_board((
+        1, 0, 1, -1, 0, 0, 0, 1, 0,
+        -1, 1, 1, 1, -1, 0, 0, -1, 0,
+        1, 0, -1, 0, 0, -1, 0, 1, 0,
+        0, 1, 0, 1, 1, 1, 0, 0, -1,
+        0, -1, 0, -1, -1, 1, 0, -1, 0,
+        -1, 1, 0, 0, 0, -1, -1, 0, 0,
+        0, -1, 0, -1, -1, -1, 0, 1, 0,
+        0, 1, 0, 0, 0, 0, 0, 1, 0,
+        0, 1, 0, 0, 0, 0, 0, 1, 0), next_sub_board=2)
     terminal_state_meta_board = (1, -1, 0, 0, 1, -1, 0, -1, 1)
 
-    terminal_state_draw = UltimateGameState(
-        last_sub_action=(0, 1),
-        board=(
-            1, -1, 1, 0, 1, -1, 1, -1, -1,
-            0, -1, 1, 1, 1, 1, 0, 1, -1,
-            -1, 0, 1, -1, 1, 0, 0, 0, -1,
-            -1, -1, -1, -1, 0, 0, 0, 1, 1,
-            1, 1, -1, -1, 1, 0, -1, 1, -1,
-            1, -1, 0, -1, 0, 0, 0, 1, 0,
-            0, 1, 1, 0, -1, 1, 0, 0, 0,
-            1, 1, 0, 0, -1, 0, -1, -1, -1,
-            -1, 1, -1, 0, -1, 1, 0, 0, 1)
-    )
+    terminal_state_draw = unac.state_from_board((
+        1, -1, 1, 0, 1, -1, 1, -1, -1,
+        0, -1, 1, 1, 1, 1, 0, 1, -1,
+        -1, 0, 1, -1, 1, 0, 0, 0, -1,
+        -1, -1, -1, -1, 0, 0, 0, 1, 1,
+        1, 1, -1, -1, 1, 0, -1, 1, -1,
+        1, -1, 0, -1, 0, 0, 0, 1, 0,
+        0, 1, 1, 0, -1, 1, 0, 0, 0,
+        1, 1, 0, 0, -1, 0, -1, -1, -1,
+        -1, 1, -1, 0, -1, 1, 0, 0, 1), next_sub_board=1)
     terminal_state_draw_meta_board = (1, 1, -1, -1, -1, 1, 1, -1, -1)
 
     states = (initial_state, non_terminal_state, terminal_state, terminal_state_draw)
@@ -158,9 +215,12 @@ class TestUltimateNoughtsAndCrosses:
 
     @pytest.mark.parametrize("state, metaboard", zip(states, meta_boards))
     def test_meta_board_is_calculated_correctly(self, state, metaboard):
-        unac = UltimateNoughtsAndCrosses()
+        computed_metaboard = tuple(
+            1 if state.player1_meta_board & 1 << sub_board else
+            -1 if state.player2_meta_board & 1 << sub_board else 0
+            for sub_board in range(9))
 
-        assert unac._compute_meta_board(state) == metaboard
+        assert computed_metaboard == metaboard
 
     def test_exception_raised_when_utility_called_non_terminal_state(self):
         unac = UltimateNoughtsAndCrosses()
@@ -177,10 +237,10 @@ class TestUltimateNoughtsAndCrosses:
         # draw
         assert unac.utility(self.terminal_state_draw) == {1: 0, 2: 0}
 
-    def test_which_player_returns_correct_player(self):
+    def test_current_player_returns_correct_player(self):
         unac = UltimateNoughtsAndCrosses()
 
-        assert unac.which_player(self.non_terminal_state) == 1
+        assert unac.current_player(self.non_terminal_state) == 1
 
     def test_generating_next_possible_states(self):
         unac = UltimateNoughtsAndCrosses()
@@ -190,10 +250,51 @@ class TestUltimateNoughtsAndCrosses:
         expected_next_states = {}
         for action in possible_actions:
             (sub_board_row, sub_board_col), (sub_row, sub_col) = action
+            next_board = [0] * 81
+            for index in range(81):
+                row, col = divmod(index, 9)
+                sub_board = 3 * (row // 3) + col // 3
+                square_bit = 1 << 3 * (row % 3) + col % 3
+                if self.non_terminal_state.player1_boards[sub_board] & square_bit:
+                    next_board[index] = 1
+                elif self.non_terminal_state.player2_boards[sub_board] & square_bit:
+                    next_board[index] = -1
             board_index = sub_board_row * 27 + sub_board_col * 3 + sub_row * 9 + sub_col
-            next_board = list(self.non_terminal_state.board)
             next_board[board_index] = 1
-            expected_next_states[action] = UltimateGameState(last_sub_action=action.sub_action,
-                                                             board=tuple(next_board))
+            # The opponent is sent to the sub-board matching the square
+            # played, unless that sub-board is closed.
+            next_sub_board = 3 * sub_row + sub_col
+            if self.non_terminal_state.closed_meta_board & 1 << next_sub_board:
+                next_sub_board = -1
+            expected_next_states[action] = unac.state_from_board(
+                tuple(next_board), next_sub_board=next_sub_board)
+
+        assert unac.legal_actions(self.non_terminal_state) == expected_next_states
 
-        assert unac.compute_next_states(self.non_terminal_state) == expected_next_states
+    def test_incremental_keys_match_recomputed_keys_in_random_games(self):
+        unac = UltimateNoughtsAndCrosses()
+        random.seed(0)
+        for _ in range(20):
+            state = unac.initial_state
+            key = unac.state_key(state)
+            while not unac.is_terminal(state):
+                action, next_state = random.choice(
+                    list(unac.legal_actions(state).items()))
+                key = unac.next_state_key(key, state, action)
+                state = next_state
+                assert key == unac.state_key(state)
+
+    def test_symmetric_states_share_canonical_state(self):
+        unac = UltimateNoughtsAndCrosses()
+        random.seed(1)
+        state = unac.initial_state
+        for _ in range(15):
+            canonical_state, transform = unac.canonicalize(state)
+            for action, next_state in unac.legal_actions(state).items():
+                canonical_action = unac.transform_action(action, transform)
+                assert unac.inverse_transform_action(canonical_action,
+                                                     transform) == action
+                assert (unac.canonicalize(next_state)[0] ==
+                        unac.canonicalize(
+                            unac.legal_actions(canonical_state)[canonical_action])[0])
+            state = random.choice(list(unac.legal_actions(state).values()))
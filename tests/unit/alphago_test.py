@@ -1,11 +1,19 @@
 import numpy as np
+import pytest
 
-from alphago.alphago import process_training_data, process_self_play_data
+import alphago
+from alphago.alphago import (batched_self_play, evaluate_model,
+                             generate_self_play_data, process_training_data,
+                             process_self_play_data, self_play)
 from alphago.evaluator import play
 from alphago.estimator import create_trivial_estimator
-from alphago.games import NoughtsAndCrosses
+from alphago.games import ConnectFour, NoughtsAndCrosses
+from alphago.numpy_estimator import NumpyConnectFourNet
 from alphago.player import MCTSPlayer
+from alphago.replay_buffer import ReplayBuffer
+from alphago.sprt import SPRT
 from .games.mock_game import MockGame
+from .numpy_estimator_test import random_connect_four_params
 
 
 # TODO: mock lots of things in this file, especially players
@@ -88,3 +96,252 @@ def test_process_self_play_data():
         assert comp[1] == expec[1]
         assert (comp[2] == expec[2]).all()
         assert comp[3] == expec[3]
+
+
+def test_process_self_play_data_can_canonicalize_states():
+    nac = NoughtsAndCrosses()
+    # The first player wins along the top row, and along the bottom row
+    # in the game rotated by 180 degrees.
+    games = [[(0, 0), (1, 1), (0, 1), (2, 1), (0, 2)],
+             [(2, 2), (1, 1), (2, 1), (0, 1), (2, 0)]]
+    logs = []
+    for actions in games:
+        states = [nac.initial_state]
+        for action in actions:
+            states.append(nac.legal_actions(states[-1])[action])
+        action_probs = [{action: 1.0} for action in actions]
+        logs.append(process_self_play_data(states, actions, action_probs, nac,
+                                           nac.action_indices, canonicalize=True))
+
+    # The games are symmetric, so they have the same canonical positions.
+    # The empty board is its own canonical state, so its actions differ.
+    assert np.array_equal(logs[0][0][0], logs[1][0][0])
+    for (state1, action1, probs1, z1, _), (state2, action2, probs2, z2, _) in zip(
+            logs[0][1:], logs[1][1:]):
+        assert np.array_equal(state1, state2)
+        assert action1 == action2
+        assert np.array_equal(probs1, probs2)
+        assert z1 == z2
+
+    # The probabilities are mapped onto the actions of the canonical state.
+    for state, action, probs, _, _ in logs[1]:
+        canonical_state = type(nac.initial_state)(*state)
+        assert nac.canonicalize(canonical_state) == (canonical_state, 0)
+        assert action in nac.legal_actions(canonical_state)
+        assert probs[nac.action_indices[action]] == 1
+
+
+class BatchCountingEstimator:
+    """Wraps an estimator, recording the size of each batch."""
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.action_indices = estimator.action_indices
+        self.batch_sizes = []
+
+    def predict_batch(self, states):
+        self.batch_sizes.append(len(states))
+        return self.estimator.predict_batch(states)
+
+
+@pytest.fixture
+def connect_four_net():
+    game = ConnectFour()
+    return NumpyConnectFourNet(random_connect_four_params(), game.action_indices)
+
+
+@pytest.mark.parametrize("full_search_fraction, canonicalize",
+                         [(1.0, False), (0.5, False), (1.0, True)])
+def test_batched_self_play_of_one_game_matches_self_play(connect_four_net,
+                                                         full_search_fraction,
+                                                         canonicalize):
+    game = ConnectFour()
+
+    np.random.seed(0)
+    expected = self_play(game, connect_four_net.create_estimate_fn(), 6, 1.0,
+                         canonicalize=canonicalize,
+                         full_search_fraction=full_search_fraction,
+                         fast_mcts_iters=2)
+    np.random.seed(0)
+    game_logs = list(batched_self_play(game, connect_four_net, 6, 1.0, 1,
+                                       num_parallel_games=1,
+                                       canonicalize=canonicalize,
+                                       full_search_fraction=full_search_fraction,
+                                       fast_mcts_iters=2))
+
+    assert len(game_logs) == 1
+    assert len(game_logs[0]) == len(expected)
+    for computed, expected_position in zip(game_logs[0], expected):
+        state, action, probs, z, full_search = expected_position
+        assert np.array_equal(computed[0], state)
+        assert computed[1] == action
+        assert np.allclose(computed[2], probs)
+        assert computed[3] == z
+        assert computed[4] == full_search
+
+
+class StateRecordingEstimator:
+    """Wraps an estimator, recording every state it evaluates."""
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.action_indices = estimator.action_indices
+        self.states = []
+
+    def predict_batch(self, states):
+        self.states.extend(states)
+        return self.estimator.predict_batch(states)
+
+    def create_estimate_fn(self):
+        estimate_fn = self.estimator.create_estimate_fn()
+
+        def recording_estimate_fn(state):
+            self.states.append(state)
+            return estimate_fn(state)
+        return recording_estimate_fn
+
+
+def test_canonicalizing_self_play_only_evaluates_canonical_states(connect_four_net):
+    game = ConnectFour()
+    estimator = StateRecordingEstimator(connect_four_net)
+
+    np.random.seed(0)
+    self_play(game, estimator.create_estimate_fn(), 4, 1.0, canonicalize=True)
+    list(batched_self_play(game, estimator, 4, 1.0, 2, num_parallel_games=2,
+                           canonicalize=True))
+
+    assert all(game.canonicalize(state)[1] == 0 for state in estimator.states)
+    # Without canonicalization, mirror images are evaluated too.
+    estimator.states = []
+    list(batched_self_play(game, estimator, 4, 1.0, 2, num_parallel_games=2))
+    assert any(game.canonicalize(state)[1] != 0 for state in estimator.states)
+
+
+def test_batched_self_play_evaluates_games_together(connect_four_net):
+    game = ConnectFour()
+    estimator = BatchCountingEstimator(connect_four_net)
+
+    np.random.seed(1)
+    game_logs = list(batched_self_play(game, estimator, 4, 1.0, 10,
+                                       num_parallel_games=4))
+
+    assert len(game_logs) == 10
+    assert all(7 <= len(game_log) <= 42 for game_log in game_logs)
+    assert max(estimator.batch_sizes) == 4
+    # Most leaves are evaluated in full batches.
+    assert np.mean(estimator.batch_sizes) > 3
+
+
+def test_batched_self_play_fills_replay_buffer(connect_four_net):
+    game = ConnectFour()
+    buffer = ReplayBuffer(1000)
+
+    generate_self_play_data(game, connect_four_net, 3, 1.0, 5, verbose=False,
+                            replay_buffer=buffer, num_parallel_games=3)
+
+    assert 5 * 7 <= len(buffer) <= 5 * 42
+    assert np.allclose(buffer.probs[:len(buffer)].sum(axis=1), 1)
+
+
+def test_batched_self_play_needs_a_parallel_game(connect_four_net):
+    with pytest.raises(ValueError):
+        batched_self_play(ConnectFour(), connect_four_net, 3, 1.0, 5,
+                          num_parallel_games=0)
+
+
+class TrivialEstimator:
+    def __init__(self, game):
+        self.game = game
+
+    def create_estimate_fn(self):
+        return create_trivial_estimator(self.game)
+
+
+def test_evaluate_model_plays_both_positions():
+    nac = NoughtsAndCrosses()
+    estimator = TrivialEstimator(nac)
+
+    result = evaluate_model(nac, estimator, estimator, 10, 1.0, 3,
+                            verbose=False, num_random_games=2)
+
+    assert 0 <= result.success_rate <= 1
+    assert 0 <= result.success_rate_random <= 1
+    assert result.accepted == (result.success_rate > 0.55)
+    assert result.games_played == 2 * 3 + 2 * 2
+    # The random player check is shorter than the match.
+    assert result.games_saved == 2 * (3 - 2)
+
+
+def test_evaluate_model_stops_when_sprt_decides():
+    nac = NoughtsAndCrosses()
+    estimator = TrivialEstimator(nac)
+    # Identical players win or draw far more than 10% of their games.
+    sprt = SPRT.for_win_rate(0.1, margin=0.05)
+
+    result = evaluate_model(nac, estimator, estimator, 10, 1.0, 50,
+                            verbose=False, win_rate=0.1, sprt=sprt)
+
+    assert result.accepted
+    assert sprt.decision is True
+    assert result.success_rate_random is None
+    assert result.games_played == sprt.num_games < 100
+    assert result.games_saved == 4 * 50 - result.games_played
+
+
+def test_canonicalizing_evaluate_model_only_evaluates_canonical_states(
+        connect_four_net):
+    game = ConnectFour()
+    estimator = StateRecordingEstimator(connect_four_net)
+
+    evaluate_model(game, estimator, estimator, 4, 1.0, 1, verbose=False,
+                   num_random_games=1, canonicalize=True)
+
+    assert estimator.states
+    assert all(game.canonicalize(state)[1] == 0 for state in estimator.states)
+
+
+def test_playout_cap_records_policy_targets_of_full_searches_only(connect_four_net):
+    game = ConnectFour()
+    np.random.seed(0)
+    game_log = self_play(game, connect_four_net.create_estimate_fn(), 6, 1.0,
+                         full_search_fraction=0.5, fast_mcts_iters=2)
+
+    full_search = [record[4] for record in game_log]
+    assert any(full_search) and not all(full_search)
+    for state, action, probs, z, full in game_log:
+        assert np.isclose(probs.sum(), 1 if full else 0)
+        assert z in (-1, 0, 1)
+
+
+def test_playout_cap_with_no_full_searches_only_trains_the_value():
+    nac = NoughtsAndCrosses()
+    game_log = self_play(nac, create_trivial_estimator(nac), 5, 1.0,
+                         full_search_fraction=0)
+
+    assert not any(record[4] for record in game_log)
+    assert all(np.all(record[2] == 0) for record in game_log)
+    # The outcome alternates in sign between the players.
+    assert {abs(record[3]) for record in game_log} <= {0, 1}
+
+
+@pytest.mark.parametrize("kwargs", [{'full_search_fraction': 1.5},
+                                    {'full_search_fraction': 0.5,
+                                     'fast_mcts_iters': 0}])
+def test_invalid_playout_cap_raises(connect_four_net, kwargs):
+    game = ConnectFour()
+    with pytest.raises(ValueError):
+        self_play(game, connect_four_net.create_estimate_fn(), 5, 1.0, **kwargs)
+    with pytest.raises(ValueError):
+        batched_self_play(game, connect_four_net, 5, 1.0, 1, **kwargs)
+
+
+def test_package_exports_the_training_functions():
+    assert alphago._alphago_names == alphago.alphago.__all__
+    assert alphago.train_alphago is alphago.alphago.train_alphago
+
+
+def test_evaluation_functions_are_reexported_from_the_evaluator():
+    from alphago import evaluator
+    assert (alphago.alphago.evaluate_estimators_in_both_positions is
+            evaluator.evaluate_estimators_in_both_positions)
+    assert alphago.alphago.play_sprt_match is evaluator.play_sprt_match
@@ -0,0 +1,120 @@
+import os
+import queue
+import tempfile
+import threading
+
+import pytest
+
+from alphago.async_training import (GameRecord, _accepted_weights_file,
+                                    _run_actor, _run_evaluator,
+                                    train_alphago_async)
+from alphago.games import ConnectFour
+from alphago.numpy_estimator import NumpyConnectFourNet
+
+from .numpy_estimator_test import random_connect_four_params
+
+
+class Version:
+    """Stands in for a shared multiprocessing Value."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+@pytest.fixture
+def game():
+    return ConnectFour()
+
+
+@pytest.fixture
+def weights_path(tmpdir, game):
+    for version in range(2):
+        net = NumpyConnectFourNet(random_connect_four_params(seed=version),
+                                  game.action_indices)
+        net.save(_accepted_weights_file(str(tmpdir), version))
+    return str(tmpdir)
+
+
+def run_actor_until(game, weights_path, accepted_version, num_games):
+    stop, games = threading.Event(), queue.Queue()
+    actor = threading.Thread(target=_run_actor, args=(
+        3, game, NumpyConnectFourNet, game.action_indices, weights_path,
+        accepted_version, stop, games, 2, 1.0, 1, 0))
+    actor.start()
+    records = [games.get() for _ in range(num_games)]
+    stop.set()
+    actor.join()
+    return records
+
+
+def test_actor_tags_games_with_weights_version(game, weights_path):
+    accepted_version = Version(1)
+
+    records = run_actor_until(game, weights_path, accepted_version, 2)
+
+    for record in records:
+        assert isinstance(record, GameRecord)
+        assert record.weights_version == 1
+        assert record.actor == 3
+        assert 7 <= len(record.game_log) <= 42
+
+
+def run_evaluator(game, weights_path, accepted_version, win_rate):
+    candidate_file = os.path.join(weights_path, 'candidate.npz')
+    NumpyConnectFourNet(random_connect_four_params(seed=2),
+                        game.action_indices).save(candidate_file)
+    candidates, evaluations = queue.Queue(), queue.Queue()
+    candidates.put((candidate_file, 7))
+    candidates.put(None)
+
+    _run_evaluator(game, NumpyConnectFourNet, game.action_indices,
+                   weights_path, accepted_version, candidates, evaluations,
+                   2, 1.0, 1, win_rate, 0)
+
+    assert not os.path.exists(candidate_file)
+    return evaluations.get_nowait()
+
+
+def test_evaluator_accepts_winning_candidate(game, weights_path):
+    accepted_version = Version(1)
+
+    record = run_evaluator(game, weights_path, accepted_version, win_rate=-1)
+
+    assert record.training_step == 7
+    assert record.accepted
+    assert record.weights_version == accepted_version.value == 2
+    assert os.path.exists(_accepted_weights_file(weights_path, 2))
+
+
+def test_evaluator_rejects_losing_candidate(game, weights_path):
+    accepted_version = Version(1)
+
+    record = run_evaluator(game, weights_path, accepted_version, win_rate=1)
+
+    assert not record.accepted
+    assert 0 <= record.success_rate <= 1
+    assert record.weights_version == accepted_version.value == 1
+    assert not os.path.exists(_accepted_weights_file(weights_path, 2))
+
+
+class UnloadableNet(NumpyConnectFourNet):
+    """A net whose weights can't be loaded, so actors fail at once."""
+
+    @classmethod
+    def load(cls, path, action_indices):
+        raise IOError("Can't load {}.".format(path))
+
+
+def create_unloadable_net():
+    return UnloadableNet(random_connect_four_params(), ConnectFour().action_indices)
+
+
+def test_learner_raises_if_the_actors_exit(game, tmpdir, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmpdir))
+
+    with pytest.raises(RuntimeError, match='Actor0'):
+        train_alphago_async(game, create_unloadable_net, 1, 1,
+                            str(tmpdir.join('checkpoint')), num_actors=1,
+                            verbose=False)
+    # The temporary weights directory is removed.
+    assert tmpdir.listdir() == []
@@ -1,9 +1,11 @@
 import numpy as np
+import pytest
 
 from alphago import mcts, MCTSNode
 from alphago.estimator import (create_trivial_estimator, NACNetEstimator,
-                               ConnectFourNet)
+                               NAC3x6NetEstimator, ConnectFourNet)
 from alphago.games import NoughtsAndCrosses, ConnectFour
+from alphago.replay_buffer import PrioritizedReplayBuffer, ReplayBuffer
 
 from .games.mock_game import MockGame
 from .mock_estimator import MockNetEstimator
@@ -166,3 +168,148 @@ def test_connect_four_net_call():
 
     assert isinstance(probs, dict)
     assert len(probs) == 7
+
+
+def test_predict_batch_matches_call_on_each_state():
+    np.random.seed(0)
+    game = ConnectFour()
+    net = ConnectFourNet(learning_rate=1e-4, l2_weight=1e-4,
+                         action_indices=game.action_indices)
+
+    states = [tuple(np.random.choice([-1, 0, 1], 42)) for _ in range(5)]
+    probs, values = net.predict_batch(states)
+
+    assert np.shape(probs) == (5, 7)
+    assert np.shape(values) == (5,)
+    for state, state_probs, state_value in zip(states, probs, values):
+        probs_dict, value = net(state)
+        assert np.isclose(value, state_value)
+        for action, index in game.action_indices.items():
+            assert np.isclose(probs_dict[action], state_probs[index])
+
+
+def test_nac_3x6_net_call():
+    game = NoughtsAndCrosses(rows=3, columns=6)
+    net = NAC3x6NetEstimator(learning_rate=0.01, l2_weight=0.1,
+                             action_indices=game.action_indices)
+
+    probs, values = net.predict_batch([game.initial_state] * 3)
+    assert np.shape(probs) == (3, 18)
+    assert np.shape(values) == (3,)
+
+    probs_dict, value = net.create_estimate_fn()(game.initial_state)
+    assert len(probs_dict) == 18
+
+
+def test_copy_from_copies_weights_in_place():
+    np.random.seed(0)
+    nac = NoughtsAndCrosses()
+    nnet1 = NACNetEstimator(learning_rate=0.01, l2_weight=0.1,
+                            action_indices=nac.action_indices)
+    nnet2 = NACNetEstimator(learning_rate=0.01, l2_weight=0.1,
+                            action_indices=nac.action_indices)
+    states = np.random.randn(5, 9)
+
+    nnet2.copy_from(nnet1)
+    num_ops = len(nnet2.graph.get_operations())
+    nnet2.copy_from(nnet1)
+
+    assert len(nnet2.graph.get_operations()) == num_ops
+    assert nnet2.weights_version == 2
+    probs1, values1 = nnet1.predict_batch(states)
+    probs2, values2 = nnet2.predict_batch(states)
+    assert np.allclose(probs1, probs2)
+    assert np.allclose(values1, values2)
+
+
+def test_get_weights_excludes_optimizer_slots_by_default():
+    nac = NoughtsAndCrosses()
+    nnet = NACNetEstimator(learning_rate=0.01, l2_weight=0.1,
+                           action_indices=nac.action_indices)
+
+    weights = nnet.get_weights()
+    all_weights = nnet.get_weights(include_optimizer=True)
+
+    assert not any('Momentum' in name for name in weights)
+    assert set(weights) < set(all_weights)
+
+    with pytest.raises(ValueError):
+        nnet.set_weights({'not_a_variable': np.zeros(1)})
+
+
+def test_loss_averages_over_disjoint_batches():
+    np.random.seed(0)
+    game = ConnectFour()
+    net = ConnectFourNet(learning_rate=1e-4, l2_weight=1e-4,
+                         action_indices=game.action_indices)
+    data = [(np.random.choice([-1, 0, 1], 42), np.full(7, 1 / 7), z)
+            for z in [1, -1, 0, 1, 1, -1]]
+
+    loss, _, _ = net.loss(data, batch_size=3)
+    loss1, _, _ = net.loss(data[:3], batch_size=3)
+    loss2, _, _ = net.loss(data[3:], batch_size=3)
+
+    assert np.isclose(loss, (loss1 + loss2) / 2)
+
+    net.train(data, batch_size=4, training_iters=-1, mode='supervised',
+              verbose=False)
+    assert net.global_step == 2
+
+
+def test_sample_losses_match_the_mean_loss_and_weights_scale_it():
+    np.random.seed(0)
+    game = ConnectFour()
+    net = ConnectFourNet(learning_rate=1e-4, l2_weight=1e-4,
+                         action_indices=game.action_indices)
+    data = [(np.random.choice([-1, 0, 1], 42), np.full(7, 1 / 7), z)
+            for z in [1, -1, 0, 1]]
+    state_vectors, pis, zs = net._training_arrays(data)
+    feed_dict = {net.tensors['state_vector']: state_vectors,
+                 net.tensors['pi']: pis, net.tensors['outcomes']: zs,
+                 net.tensors['is_training']: False}
+
+    loss, sample_losses = net.sess.run(
+        [net.tensors['loss'], net.tensors['sample_losses']], feed_dict=feed_dict)
+    assert np.isclose(loss, np.mean(sample_losses))
+
+    feed_dict[net.tensors['sample_weights']] = np.array([1, 0, 0, 1], np.float32)
+    weighted_loss = net.sess.run(net.tensors['loss'], feed_dict=feed_dict)
+    assert np.isclose(weighted_loss, (sample_losses[0] + sample_losses[3]) / 4)
+
+
+def test_training_on_prioritized_buffer_updates_priorities():
+    np.random.seed(0)
+    game = ConnectFour()
+    net = ConnectFourNet(learning_rate=1e-4, l2_weight=1e-4,
+                         action_indices=game.action_indices)
+    replay_buffer = PrioritizedReplayBuffer(16)
+    for z in [1, -1, 0, 1, 1, -1]:
+        replay_buffer.append(np.random.choice([-1, 0, 1], 42), np.full(7, 1 / 7), z)
+
+    net.train(replay_buffer, batch_size=4, training_iters=3, verbose=False)
+
+    assert net.global_step == 3
+    assert not np.allclose(replay_buffer.priorities[:6], 1)
+
+
+def test_training_on_a_buffer_only_encodes_sampled_positions():
+    np.random.seed(0)
+    game = ConnectFour()
+    net = ConnectFourNet(learning_rate=1e-4, l2_weight=1e-4,
+                         action_indices=game.action_indices)
+    replay_buffer = ReplayBuffer(1000)
+    for _ in range(1000):
+        replay_buffer.append(np.random.choice([-1, 0, 1], 42), np.full(7, 1 / 7), 1)
+
+    encoded = []
+    states_to_vectors = net._states_to_vectors
+
+    def recording_states_to_vectors(states):
+        encoded.append(len(states))
+        return states_to_vectors(states)
+
+    net._states_to_vectors = recording_states_to_vectors
+    net.train(replay_buffer, batch_size=4, training_iters=3, verbose=False)
+
+    assert net.global_step == 3
+    assert encoded == [4, 4, 4]
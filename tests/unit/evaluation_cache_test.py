@@ -0,0 +1,93 @@
+import numpy as np
+
+from alphago.evaluation_cache import EvaluationCache
+from alphago.games import NoughtsAndCrosses
+
+
+class CountingEstimator:
+    """Gives each action a distinct prior depending on the state, and
+    counts the number of evaluations."""
+
+    def __init__(self, game):
+        self.game = game
+        self.calls = 0
+        self.weights_version = 0
+
+    def __call__(self, state):
+        self.calls += 1
+        probs = {action: (index + state[0] % 7 + 1)
+                 for index, action in enumerate(self.game.action_space)}
+        total = sum(probs.values())
+        probs = {action: prob / total for action, prob in probs.items()}
+        return probs, np.tanh(state[0] - state[1] + self.weights_version)
+
+
+def test_repeated_states_are_evaluated_once():
+    nac = NoughtsAndCrosses()
+    estimator = CountingEstimator(nac)
+    cached_estimator = EvaluationCache(nac, estimator)
+    state = nac.legal_actions(nac.initial_state)[(0, 0)]
+
+    assert cached_estimator(state) == estimator(state)
+    estimator.calls = 0
+    for _ in range(4):
+        assert cached_estimator(state) == estimator(state)
+
+    assert estimator.calls == 4
+    stats = cached_estimator.stats()
+    assert (stats.hits, stats.misses) == (4, 1)
+    assert stats.hit_rate == 0.8
+
+
+def test_cache_is_invalidated_when_weights_change():
+    nac = NoughtsAndCrosses()
+    estimator = CountingEstimator(nac)
+    cached_estimator = EvaluationCache(nac, estimator)
+
+    _, value = cached_estimator(nac.initial_state)
+    estimator.weights_version += 1
+    _, new_value = cached_estimator(nac.initial_state)
+
+    assert new_value != value
+    assert estimator.calls == 2
+    assert cached_estimator.stats().invalidations == 1
+
+
+def test_symmetric_states_share_an_entry():
+    nac = NoughtsAndCrosses()
+    estimator = CountingEstimator(nac)
+    cached_estimator = EvaluationCache(nac, estimator, canonicalize=True)
+
+    corners = [(0, 0), (0, 2), (2, 0), (2, 2)]
+    for corner in corners:
+        cached_estimator(nac.legal_actions(nac.initial_state)[corner])
+
+    assert estimator.calls == 1
+    assert cached_estimator.stats().hits == 3
+
+
+def test_canonical_priors_are_mapped_back_onto_state():
+    nac = NoughtsAndCrosses()
+    estimator = CountingEstimator(nac)
+    cached_estimator = EvaluationCache(nac, estimator, canonicalize=True)
+    state = nac.legal_actions(nac.initial_state)[(2, 1)]
+
+    canonical_state, transform = nac.canonicalize(state)
+    canonical_probs, canonical_value = estimator(canonical_state)
+    probs, value = cached_estimator(state)
+
+    assert transform != 0
+    assert value == canonical_value
+    for action in nac.action_space:
+        assert probs[action] == canonical_probs[nac.transform_action(action, transform)]
+
+
+def test_cache_is_bounded():
+    nac = NoughtsAndCrosses()
+    cached_estimator = EvaluationCache(nac, CountingEstimator(nac), maxsize=3)
+    for state in nac.legal_actions(nac.initial_state).values():
+        cached_estimator(state)
+
+    stats = cached_estimator.stats()
+    assert stats.currsize == 3
+    assert stats.evictions == 6
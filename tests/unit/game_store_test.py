@@ -0,0 +1,151 @@
+import numpy as np
+import pytest
+
+from alphago.alphago import generate_self_play_data
+from alphago.estimator import create_trivial_estimator
+from alphago.game_store import GameStore
+from alphago.games import NoughtsAndCrosses
+from alphago.replay_buffer import ReplayBuffer
+
+
+def make_game(game_no, length):
+    return [(np.array([game_no, move, -1]), move % 3, np.full(4, 0.25),
+             (-1) ** move) for move in range(length)]
+
+
+def fill(store, lengths, weights_version=0):
+    for game_no, length in enumerate(lengths):
+        store.append_game(make_game(game_no, length), weights_version)
+
+
+def test_positions_are_written_to_shards(tmpdir):
+    store = GameStore(str(tmpdir), positions_per_shard=4)
+    fill(store, [3, 2, 5])
+
+    # 10 positions make 2 full shards, with 2 positions still buffered.
+    assert len(store) == 10
+    assert len(tmpdir.listdir()) == 2
+    store.flush()
+    assert len(tmpdir.listdir()) == 3
+
+    shards = list(store.iter_shards())
+    assert [len(shard) for shard in shards] == [4, 4, 2]
+    records = np.concatenate(shards)
+    assert records['game'].tolist() == [0] * 3 + [1] * 2 + [2] * 5
+    assert records['state'][:, 1].tolist() == [0, 1, 2, 0, 1, 0, 1, 2, 3, 4]
+    assert records['outcome'].tolist() == [1, -1, 1, 1, -1, 1, -1, 1, -1, 1]
+    assert records['probs'].shape == (10, 4)
+
+
+def test_store_is_reopened_where_it_left_off(tmpdir):
+    store = GameStore(str(tmpdir), positions_per_shard=3)
+    fill(store, [2, 2])
+    store.flush()
+
+    reopened = GameStore(str(tmpdir), positions_per_shard=3)
+    assert len(reopened) == 4
+    assert reopened.num_games == 2
+    reopened.append_game(make_game(9, 2), weights_version=5)
+    reopened.flush()
+
+    records = np.concatenate(list(GameStore(str(tmpdir)).iter_shards()))
+    assert records['game'].tolist() == [0, 0, 1, 1, 2, 2]
+    assert records['weights_version'].tolist() == [0] * 4 + [5] * 2
+
+
+def test_games_are_reassembled_across_shards(tmpdir):
+    store = GameStore(str(tmpdir), positions_per_shard=4)
+    lengths = [3, 6, 1, 2]
+    fill(store, lengths)
+    store.flush()
+
+    games = list(store.iter_games())
+
+    assert [len(game) for game in games] == lengths
+    assert [game['game'][0] for game in games] == [0, 1, 2, 3]
+    assert games[1]['state'][:, 1].tolist() == list(range(6))
+
+
+@pytest.mark.parametrize("capacity", [3, 5, 100])
+def test_replay_buffer_is_filled_with_latest_positions(tmpdir, capacity):
+    store = GameStore(str(tmpdir), positions_per_shard=4)
+    fill(store, [3, 2, 5], weights_version=2)
+    store.flush()
+
+    buffer = store.fill_replay_buffer(ReplayBuffer(capacity))
+
+    expected = np.concatenate(list(store.iter_shards()))[-capacity:]
+    assert len(buffer) == len(expected)
+    for index, record in enumerate(expected):
+        state, probs, z = buffer[index]
+        assert np.array_equal(state, record['state'])
+        assert np.array_equal(probs, record['probs'])
+        assert z == record['outcome']
+    assert buffer.staleness(2) == (0, 0)
+
+
+def test_last_positions_are_memory_mapped(tmpdir):
+    store = GameStore(str(tmpdir), positions_per_shard=4)
+    fill(store, [5, 5])
+    store.flush()
+
+    slices = store.last_positions(6)
+
+    assert [len(records) for records in slices] == [4, 2]
+    assert all(isinstance(records, np.memmap) for records in slices)
+
+
+def test_full_search_flags_are_stored(tmpdir):
+    store = GameStore(str(tmpdir))
+    game_log = [position + (move != 1,)
+                for move, position in enumerate(make_game(0, 3))]
+    store.append_game(game_log)
+    store.flush()
+
+    records = np.concatenate(list(store.iter_shards()))
+    assert records['full_search'].tolist() == [True, False, True]
+    buffer = store.fill_replay_buffer(ReplayBuffer(4))
+    assert buffer.policy_counts[:3].tolist() == [1, 0, 1]
+
+
+def test_shards_without_full_search_flags_are_read(tmpdir):
+    old_dtype = np.dtype([('game', np.int64), ('weights_version', np.int64),
+                          ('state', np.int64, (3,)), ('probs', np.float32, (4,)),
+                          ('outcome', np.float32)])
+    records = np.array([(0, 0, [0, 0, -1], [0.25] * 4, 1)], dtype=old_dtype)
+    np.save(str(tmpdir.join('shard000000.npy')), records)
+
+    store = GameStore(str(tmpdir))
+    game_log = make_game(1, 2)
+    game_log[1] = game_log[1][:2] + (np.zeros(4), game_log[1][3], False)
+    store.append_game(game_log)
+    store.flush()
+    assert len(list(store.iter_games())) == 2
+    # New shards have the flag, even after an old shard.
+    assert list(store.iter_shards())[-1]['full_search'].tolist() == [True, False]
+
+    buffer = store.fill_replay_buffer(ReplayBuffer(4))
+    assert len(buffer) == 3
+    assert buffer.policy_counts[:3].tolist() == [1, 1, 0]
+    assert buffer.probs[:3].sum(axis=1).tolist() == [1, 1, 0]
+
+
+def test_self_play_data_is_stored(tmpdir):
+    class TrivialEstimator:
+        weights_version = 3
+
+        def create_estimate_fn(self):
+            return create_trivial_estimator(nac)
+
+    nac = NoughtsAndCrosses()
+    store = GameStore(str(tmpdir))
+    buffer = ReplayBuffer(100)
+
+    generate_self_play_data(nac, TrivialEstimator(), 5, 1.0, 3, verbose=False,
+                            replay_buffer=buffer, game_store=store)
+
+    records = np.concatenate(list(store.iter_shards()))
+    assert len(records) == len(buffer)
+    assert set(records['game']) == {0, 1, 2}
+    assert set(records['weights_version']) == {3}
+    assert np.array_equal(records['probs'], buffer.probs[:len(buffer)])
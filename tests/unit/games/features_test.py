@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from alphago.games import MNKGame, NoughtsAndCrosses
+from alphago.games.features import bitboard_features, unpack_bits
+
+
+def string_encoding(board, num_bits):
+    return [int(bit) for bit in '{0:0{1}b}'.format(board, num_bits)]
+
+
+@pytest.mark.parametrize("num_bits", [1, 9, 18, 64, 81])
+def test_msb_first_matches_binary_string(num_bits):
+    rng = np.random.RandomState(num_bits)
+    boards = [int(''.join(map(str, rng.randint(2, size=num_bits))), 2)
+              for _ in range(10)] + [0, 2 ** num_bits - 1]
+
+    bits = unpack_bits(boards, num_bits, msb_first=True)
+
+    assert bits.shape == (12, num_bits)
+    assert bits.tolist() == [string_encoding(board, num_bits) for board in boards]
+
+
+def test_lsb_first_gives_square_indices():
+    bits = unpack_bits([0b100101], 6)
+
+    assert bits.tolist() == [[1, 0, 1, 0, 0, 1]]
+
+
+def test_unpacking_keeps_shape_of_boards():
+    boards = np.arange(24).reshape(2, 3, 4)
+
+    bits = unpack_bits(boards, 5)
+
+    assert bits.shape == (2, 3, 4, 5)
+    assert bits[1, 2, 3].tolist() == [1, 1, 1, 0, 1]
+
+
+def test_features_of_noughts_and_crosses_states():
+    nac = NoughtsAndCrosses(rows=3, columns=6)
+    states = [nac.initial_state]
+    for _ in range(6):
+        states.append(list(nac.legal_actions(states[-1]).values())[-1])
+
+    features = bitboard_features(states, num_bits=18)
+
+    assert features.shape == (7, 36)
+    assert features.dtype == np.float32
+    for state, row in zip(states, features):
+        expected = string_encoding(state[0], 18) + string_encoding(state[1], 18)
+        assert row.tolist() == expected
+
+
+def test_features_of_boards_larger_than_64_squares():
+    game = MNKGame(rows=9, columns=9, k=5)
+    state = game.initial_state
+    for _ in range(20):
+        state = list(game.legal_actions(state).values())[-1]
+
+    features = bitboard_features([state, state], num_bits=81, msb_first=False)
+
+    assert features.shape == (2, 162)
+    assert features[0, :81].sum() == bin(state[0]).count('1') == 10
+    assert features[0, 81:].sum() == bin(state[1]).count('1') == 10
+    assert np.flatnonzero(features[1, :81]).tolist() == [
+        square for square in range(81) if state[0] >> square & 1]
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from alphago.games import MNKGame, NoughtsAndCrosses
+from alphago.games.noughts_and_crosses import GameState
+
+
+def brute_force_k_in_a_row(board, rows, columns, k):
+    """Checks every square and direction for k in a row."""
+    def occupied(row, column):
+        return (0 <= row < rows and 0 <= column < columns and
+                board >> columns * row + column & 1)
+
+    for row in range(rows):
+        for column in range(columns):
+            for row_step, column_step in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                if all(occupied(row + i * row_step, column + i * column_step)
+                       for i in range(k)):
+                    return True
+    return False
+
+
+@pytest.mark.parametrize("rows, columns, k",
+                         [(3, 3, 3), (4, 7, 4), (9, 9, 5), (15, 15, 5),
+                          (6, 3, 3), (5, 5, 2), (4, 4, 1)])
+def test_k_in_a_row_matches_brute_force(rows, columns, k):
+    game = MNKGame(rows, columns, k)
+    random.seed(rows * columns + k)
+    for _ in range(300):
+        density = random.random()
+        board = sum(1 << square for square in range(rows * columns)
+                    if random.random() < density)
+
+        assert (game._has_k_in_a_row(board) is
+                bool(brute_force_k_in_a_row(board, rows, columns, k)))
+
+
+@pytest.mark.parametrize("board", [
+    # The end of one row and the start of the next are not in a row.
+    0b111 << 8,
+    # Nor are squares wrapping around the edge on a diagonal.
+    1 << 4 | 1 << 10 | 1 << 16,
+    1 << 0 | 1 << 4 | 1 << 8,
+])
+def test_runs_do_not_wrap_around_the_board(board):
+    game = MNKGame(5, 5, 3)
+
+    assert not game._has_k_in_a_row(board)
+
+
+def test_diagonal_win_on_rectangular_board():
+    game = MNKGame(4, 6, 4)
+    player1_board = sum(1 << 6 * i + (5 - i) for i in range(4))
+    state = GameState(player1_board, 0b11, 2)
+
+    assert game.is_terminal(state)
+    assert game.utility(state) == {1: 1, 2: -1}
+
+
+def test_3_3_3_game_agrees_with_noughts_and_crosses():
+    mnk, nac = MNKGame(3, 3, 3), NoughtsAndCrosses(3, 3)
+    random.seed(0)
+    for _ in range(100):
+        state = nac.initial_state
+        while not nac.is_terminal(state):
+            assert not mnk.is_terminal(state)
+            assert mnk.legal_actions(state) == nac.legal_actions(state)
+            state = random.choice(list(nac.legal_actions(state).values()))
+
+        assert mnk.is_terminal(state)
+        assert mnk.utility(state) == nac.utility(state)
+
+
+def test_draw_when_board_full_without_k_in_a_row():
+    game = MNKGame(2, 2, 3)
+    state = GameState(0b1001, 0b0110, 1)
+
+    assert game.is_terminal(state)
+    assert game.utility(state) == {1: 0, 2: 0}
+
+
+def test_exception_raised_when_utility_called_non_terminal_state():
+    game = MNKGame(9, 9, 5)
+    with pytest.raises(ValueError) as exception_info:
+        game.utility(game.initial_state)
+
+    assert str(exception_info.value) == ("Utility can not be calculated "
+                                         "for a non-terminal state.")
+
+
+def test_exception_raised_for_non_positive_k():
+    with pytest.raises(ValueError):
+        MNKGame(3, 3, 0)
@@ -180,7 +180,10 @@ class TestMByNNoughtsAndCrosses:
 
 
 class TestUltimateNoughtsAndCrosses:
-    initial_state = UltimateGameState(last_sub_action=(0, 0), board=(0,) * 81)
+    initial_state = UltimateGameState(
+        player1_boards=(0,) * 9, player2_boards=(0,) * 9,
+        player1_meta_board=0, player2_meta_board=0, closed_meta_board=0,
+        next_sub_board=-1, current_player=1)
 
     action_space = tuple(UltimateAction(sub_board, sub_action)
                          for sub_board in itertools.product(range(3), range(3))
@@ -193,203 +196,144 @@ class TestUltimateNoughtsAndCrosses:
         action_indices[action] = (sub_board_row * 27 + sub_board_col * 3 +
                                   sub_row * 9 + sub_col)
 
-    index_to_action = {index: action for action, index
-                       in action_indices.items()}
-
     def test_initial_state_is_correct(self, mocker):
         mock_game = mocker.MagicMock()
         UltimateNoughtsAndCrosses.__init__(mock_game)
 
         assert mock_game.initial_state == self.initial_state
 
-    terminal_board = [0] * 81
-    terminal_board[18:27] = [1] * 9
-    terminal_board[54:56] = [-1] * 2
-    terminal_board[57:63] = [-1] * 6
-    terminal_state1 = UltimateGameState(last_sub_action=(0, 0), board=tuple(terminal_board))
-    meta_board1 = (1, 1, 1, 0, 0, 0, 0, -1, -1)
-    utilities1 = ({1: 1, 2: -1}, {1: 1, 2: -1}, {1: 1, 2: -1},
-                  ValueError, ValueError, ValueError,
-                  ValueError, {1: -1, 2: 1}, {1: -1, 2: 1})
-
-    terminal_state2 = UltimateGameState(
-        last_sub_action=(0, 2),
-        board=(
-            1, 0, 1, -1, 0, 0, 0, 1, 0,
-            -1, 1, 1, 1, -1, 0, 0, -1, 0,
-            1, 0, -1, 0, 0, -1, 0, 1, 0,
-            0, 1, 0, 1, 1, 1, 0, 0, -1,
-            0, -1, 0, -1, -1, 1, 0, -1, 0,
-            -1, 1, 0, 0, 0, -1, -1, 0, 0,
-            0, -1, 0, -1, -1, -1, 0, 1, 0,
-            0, 1, 0, 0, 0, 0, 0, 1, 0,
-            0, 1, 0, 0, 0, 0, 0, 1, 0)
-    )
-    meta_board2 = (1, -1, 0, 0, 1, -1, 0, -1, 1)
-    utilities2 = ({1: 1, 2: -1}, {1: -1, 2: 1}, ValueError,
-                  ValueError, {1: 1, 2: -1}, {1: -1, 2: 1},
-                  ValueError, {1: -1, 2: 1}, {1: 1, 2: -1})
-
-    terminal_state3 = UltimateGameState(
-        last_sub_action=(0, 0),
-        board=(
-            0, -1, 0, -1, 0, 1, -1, 0, 0,
-            1, 0, 1, 0, 1, 0, -1, 1, 0,
-            0, 1, 1, 1, 0, 0, 1, 0, 0,
-            -1, 0, 0, 0, 1, 0, 0, -1, 1,
-            -1, 0, 1, 0, 1, 0, 0, 0, 0,
-            -1, 0, 1, -1, 1, -1, -1, 0, 0,
-            1, -1, 0, 1, 0, -1, 0, 0, -1,
-            0, -1, 0, 1, 0, 0, 0, -1, -1,
-            0, -1, 0, 1, -1, 0, 0, 0, 1)
-    )
-    meta_board3 = (0, 1, 0, -1, 1, 0, -1, 1, 0)
-    utilities3 = (ValueError, {1: 1, 2: -1}, ValueError,
-                  {1: -1, 2: 1}, {1: 1, 2: -1}, ValueError,
-                  {1: -1, 2: 1}, {1: 1, 2: -1}, ValueError)
-
-    terminal_state4 = UltimateGameState(
-        last_sub_action=(0, 1),
-        board=(
-            1, -1, 1, 0, 1, -1, 1, -1, -1,
-            0, -1, 1, 1, 1, 1, 0, 1, -1,
-            -1, 0, 1, -1, 1, 0, 0, 0, -1,
-            -1, -1, -1, -1, 0, 0, 0, 1, 1,
-            1, 1, -1, -1, 1, 0, -1, 1, -1,
-            1, -1, 0, -1, 0, 0, 0, 1, 0,
-            0, 1, 1, 0, -1, 1, 0, 0, 0,
-            1, 1, 0, 0, -1, 0, -1, -1, -1,
-            -1, 1, -1, 0, -1, 1, 0, 0, 1)
-    )
-    meta_board4 = (1, 1, -1, -1, -1, 1, 1, -1, -1)
-    utilities4 = ({1: 1, 2: -1}, {1: 1, 2: -1}, {1: -1, 2: 1},
-                  {1: -1, 2: 1}, {1: -1, 2: 1}, {1: 1, 2: -1},
-                  {1: 1, 2: -1}, {1: -1, 2: 1}, {1: -1, 2: 1})
-
-    terminal_states = (terminal_state1, terminal_state2, terminal_state3, terminal_state4)
-    meta_boards = (meta_board1, meta_board2, meta_board3, meta_board4)
-    utilities_list = (utilities1, utilities2, utilities3, utilities4)
-
-    @pytest.mark.parametrize("state, meta_board, utilities",
-                             zip(terminal_states, meta_boards, utilities_list))
-    def test_meta_board_delegates_to_sub_game_utility_method(self, state, meta_board,
-                                                             utilities, mocker):
-        mock_utility = mocker.MagicMock(side_effect=utilities)
-        mock_nac = mocker.MagicMock(utility=mock_utility)
-        mock_game = mocker.MagicMock(sub_game=mock_nac)
-        # split state into sub boards
-        board = np.array(state.board).reshape(9, 9)
-        sub_boards = [board[i * 3:(i + 1) * 3, j * 3:(j * 3) + 3]
-                      for i in range(3) for j in range(3)]
-
-        expected_calls = [mocker.call(tuple(sub_board.ravel()))
-                          for sub_board in sub_boards]
-
-        assert UltimateNoughtsAndCrosses._compute_meta_board(mock_game, state) == meta_board
-        mock_utility.assert_has_calls(expected_calls)
-
-    def test_is_terminal_calls_compute_meta_board(self, mocker):
-        mock_is_terminal = mocker.MagicMock()
+    def test_action_indices_are_correct(self, mocker):
         mock_game = mocker.MagicMock(
-            sub_game=mocker.MagicMock(is_terminal=mock_is_terminal),
-            _compute_meta_board=mocker.MagicMock(return_value="some_meta_board"))
-        mock_state = mocker.MagicMock()
-        UltimateNoughtsAndCrosses.is_terminal(mock_game, mock_state)
-        mock_game._compute_meta_board.assert_called_once_with(mock_state)
-        mock_is_terminal.assert_called_once_with("some_meta_board")
+            _action_to_index=UltimateNoughtsAndCrosses._action_to_index)
+        UltimateNoughtsAndCrosses.__init__(mock_game)
+
+        assert mock_game.action_space == self.action_space
+        assert mock_game.action_indices == self.action_indices
 
-    def test_utility_calls_compute_meta_board(self, mocker):
-        mock_utility = mocker.MagicMock()
+    @pytest.mark.parametrize("mask, is_win", [
+        (0b000000000, False), (0b000000111, True), (0b100100100, True),
+        (0b001010100, True), (0b100010001, True), (0b011011000, False),
+        (0b110001011, False), (0b111111111, True)])
+    def test_sub_board_win_lookup_table(self, mask, is_win):
+        assert len(UltimateNoughtsAndCrosses._sub_board_wins) == 512
+        assert UltimateNoughtsAndCrosses._sub_board_wins[mask] is is_win
+
+    def test_next_state_sends_opponent_to_corresponding_sub_board(self, mocker):
         mock_game = mocker.MagicMock(
-            sub_game=mocker.MagicMock(utility=mock_utility),
-            _compute_meta_board=mocker.MagicMock(return_value="some_meta_board"))
-        mock_state = mocker.MagicMock()
-        UltimateNoughtsAndCrosses.utility(mock_game, mock_state)
+            _sub_board_wins=UltimateNoughtsAndCrosses._sub_board_wins)
+        next_state = UltimateNoughtsAndCrosses._next_state(
+            mock_game, self.initial_state, 4, 2)
 
-        mock_game._compute_meta_board.assert_called_once_with(mock_state)
-        mock_utility.assert_called_once_with("some_meta_board")
+        assert next_state.player1_boards == (0, 0, 0, 0, 0b100, 0, 0, 0, 0)
+        assert next_state.player2_boards == (0,) * 9
+        assert next_state.next_sub_board == 2
+        assert next_state.current_player == 2
 
-    def test_current_player_delegates_to_sub_game_current_player(self, mocker):
-        mock_current_player = mocker.MagicMock()
-        mock_game = mocker.MagicMock(sub_game=mocker.MagicMock(current_player=mock_current_player))
-        mock_state = mocker.MagicMock()
-        UltimateNoughtsAndCrosses.current_player(mock_game, mock_state)
-        mock_current_player.assert_called_once_with(mock_state.board)
+    def test_next_state_updates_meta_board_when_sub_board_is_won(self, mocker):
+        mock_game = mocker.MagicMock(
+            _sub_board_wins=UltimateNoughtsAndCrosses._sub_board_wins)
+        state = self.initial_state._replace(
+            player2_boards=(0, 0, 0, 0b011, 0, 0, 0, 0, 0),
+            player1_boards=(0, 0b011, 0, 0, 0, 0, 0, 0, 0),
+            next_sub_board=3, current_player=2)
+        next_state = UltimateNoughtsAndCrosses._next_state(mock_game, state, 3, 2)
+
+        assert next_state.player2_boards[3] == 0b111
+        assert next_state.player2_meta_board == 0b000001000
+        assert next_state.closed_meta_board == 0b000001000
+        assert next_state.player1_meta_board == 0
+
+    def test_next_state_frees_choice_when_sent_to_closed_sub_board(self, mocker):
+        mock_game = mocker.MagicMock(
+            _sub_board_wins=UltimateNoughtsAndCrosses._sub_board_wins)
+        state = self.initial_state._replace(
+            player1_boards=(0b111, 0, 0, 0, 0, 0, 0, 0, 0),
+            player1_meta_board=0b1, closed_meta_board=0b1, next_sub_board=8)
+        next_state = UltimateNoughtsAndCrosses._next_state(mock_game, state, 8, 0)
+
+        assert next_state.next_sub_board == -1
+
+    @pytest.mark.parametrize("player1_meta_board, player2_meta_board, "
+                             "closed_meta_board, terminal", [
+                                 (0, 0, 0, False),
+                                 (0b000000111, 0b000111000, 0b000111111, True),
+                                 (0b000110000, 0b100010001 ^ 0b10000, 0b100110001, False),
+                                 (0b001010100, 0, 0b001010100, True),
+                                 (0b001100011, 0b110011100, 0b111111111, True),
+                             ])
+    def test_is_terminal_uses_meta_boards(self, player1_meta_board, player2_meta_board,
+                                          closed_meta_board, terminal, mocker):
+        mock_game = mocker.MagicMock(
+            _sub_board_wins=UltimateNoughtsAndCrosses._sub_board_wins)
+        state = self.initial_state._replace(
+            player1_meta_board=player1_meta_board,
+            player2_meta_board=player2_meta_board,
+            closed_meta_board=closed_meta_board)
+
+        assert bool(UltimateNoughtsAndCrosses.is_terminal(mock_game, state)) is terminal
+
+    @pytest.mark.parametrize("player1_meta_board, player2_meta_board, "
+                             "closed_meta_board, outcome", [
+                                 (0b000000111, 0b000111000, 0b000111111, {1: 1, 2: -1}),
+                                 (0b000101000, 0b100010001, 0b100111001, {1: -1, 2: 1}),
+                                 (0b001100011, 0b110011100, 0b111111111, {1: 0, 2: 0}),
+                             ])
+    def test_utility_returns_correct_outcomes(self, player1_meta_board, player2_meta_board,
+                                              closed_meta_board, outcome, mocker):
+        mock_game = mocker.MagicMock(
+            _sub_board_wins=UltimateNoughtsAndCrosses._sub_board_wins)
+        state = self.initial_state._replace(
+            player1_meta_board=player1_meta_board,
+            player2_meta_board=player2_meta_board,
+            closed_meta_board=closed_meta_board)
+
+        assert UltimateNoughtsAndCrosses.utility(mock_game, state) == outcome
+
+    def test_utility_raises_exception_on_non_terminal_input_state(self, mocker):
+        mock_game = mocker.MagicMock(
+            _sub_board_wins=UltimateNoughtsAndCrosses._sub_board_wins)
+        with pytest.raises(ValueError) as exception_info:
+            UltimateNoughtsAndCrosses.utility(mock_game, self.initial_state)
+        assert str(exception_info.value) == ("Utility can not be calculated "
+                                             "for a non-terminal state.")
 
-    def test_compute_next_states_raises_exception_on_terminal_input_state(self, mocker):
+    def test_legal_actions_raises_exception_on_terminal_input_state(self, mocker):
         mock_game = mocker.MagicMock()
         mock_game.is_terminal = mocker.MagicMock(return_value=True)
         mock_state = mocker.MagicMock()
         with pytest.raises(ValueError) as exception_info:
-            UltimateNoughtsAndCrosses.compute_next_states(mock_game, mock_state)
-        assert str(exception_info.value) == ("Next states can not be generated "
+            UltimateNoughtsAndCrosses.legal_actions(mock_game, mock_state)
+        assert str(exception_info.value) == ("Legal actions can not be computed "
                                              "for a terminal state.")
 
-    def test_compute_next_states_returns_correct_states_on_initial_state(self, mocker):
-        # generate dictionary of all next states (all of them)
-        next_states = {}
-        for action_index in range(81):
-            action = self.index_to_action[action_index]
-            board = list(self.initial_state.board)
-            board[action_index] = 1
-            next_state = UltimateGameState(last_sub_action=action.sub_action,
-                                           board=tuple(board))
-            next_states[action] = next_state
+    def test_legal_actions_on_initial_state_include_every_square(self):
+        unac = UltimateNoughtsAndCrosses()
 
-        mock_is_terminal = mocker.MagicMock(return_value=False)
-        mock_current_player = mocker.MagicMock(return_value=1)
-        mock_game = mocker.MagicMock(is_terminal=mock_is_terminal,
-                                     current_player=mock_current_player,
-                                     initial_state=self.initial_state,
-                                     index_to_action=self.index_to_action)
-        assert UltimateNoughtsAndCrosses.compute_next_states(
-            mock_game, self.initial_state) == next_states
-
-    def test_compute_next_states_returns_correct_states_for_incomplete_sub_board(self, mocker):
-        first_state = UltimateGameState(last_sub_action=(0, 0), board=(1,) + (0,) * 80)
-        next_states = {}
-        sub_actions = (sub_action for sub_action in itertools.product(range(3), range(3))
-                       if sub_action != (0, 0))
-        for (sub_row, sub_col) in sub_actions:
-            action = UltimateAction(sub_board=(0, 0),
-                                    sub_action=(sub_row, sub_col))
-            board_index = sub_row * 9 + sub_col
-            board = list(first_state.board)
-            board[board_index] = -1
-            next_state = UltimateGameState(last_sub_action=(sub_row, sub_col),
-                                           board=tuple(board))
-            next_states[action] = next_state
+        assert set(unac.legal_actions(self.initial_state)) == set(self.action_space)
 
-        mock_is_terminal = mocker.MagicMock(return_value=False)
-        mock_game = mocker.MagicMock(is_terminal=mock_is_terminal,
-                                     action_indices=self.action_indices,
-                                     sub_game=mocker.MagicMock(is_terminal=mock_is_terminal))
-        assert UltimateNoughtsAndCrosses.compute_next_states(
-            mock_game, first_state) == next_states
-
-    @pytest.mark.skip(reason="not implemented yet.")
-    def test_compute_next_states_returns_correct_state_on_complete_sub_board(self, mocker):
-        # board with completed top left sub board
-        board = [0] * 81
-        board[0] = board[10] = board[20] = 1
-        board[3] = board[30] = board[60] = -1
-        state = UltimateGameState(last_sub_action=(0, 0), board=tuple(board))
-        next_states = {}
-        for action_index in range(81):
-            if board[action_index] == 0:
-                action = self.index_to_action[action_index]
-                board = list(self.initial_state.board)
-                board[action_index] = 1
-                next_state = UltimateGameState(last_sub_action=action.sub_action,
-                                               board=tuple(board))
-                next_states[action] = next_state
+    def test_legal_actions_are_restricted_to_next_sub_board(self):
+        unac = UltimateNoughtsAndCrosses()
+        state = self.initial_state._replace(
+            player1_boards=(0, 0, 0, 0, 0, 0, 0, 0, 0b000000001),
+            player2_boards=(0, 0, 0, 0, 0, 0, 0, 0, 0b000010000),
+            next_sub_board=8)
+        expected_actions = {UltimateAction((2, 2), divmod(square, 3))
+                            for square in (1, 2, 3, 5, 6, 7, 8)}
 
-        mock_is_terminal = mocker.MagicMock(return_value=False)
-        mock_current_player = mocker.MagicMock(return_value=1)
-        mock_sub_game = mocker.MagicMock(is_terminal=mocker.MagicMock(return_value=True))
-        mock_game = mocker.MagicMock(is_terminal=mock_is_terminal,
-                                     current_player=mock_current_player,
-                                     index_to_action=self.index_to_action,
-                                     sub_game=mock_sub_game)
-        assert UltimateNoughtsAndCrosses.compute_next_states(
-            mock_game, state) == next_states
+        assert set(unac.legal_actions(state)) == expected_actions
+
+    def test_legal_actions_exclude_closed_sub_boards_on_free_choice(self):
+        unac = UltimateNoughtsAndCrosses()
+        state = self.initial_state._replace(
+            player1_boards=(0b111, 0, 0, 0, 0, 0, 0, 0, 0),
+            player1_meta_board=0b1, closed_meta_board=0b1)
+
+        actions = unac.legal_actions(state)
+        assert len(actions) == 72
+        assert all(action.sub_board != (0, 0) for action in actions)
+
+    def test_current_player_returns_correct_player(self, mocker):
+        mock_game = mocker.MagicMock()
+        state = self.initial_state._replace(current_player=2)
+
+        assert UltimateNoughtsAndCrosses.current_player(mock_game, state) == 2
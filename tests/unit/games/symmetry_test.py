@@ -0,0 +1,39 @@
+import pytest
+
+from alphago.games.symmetry import BitPermutation, grid_symmetries
+
+
+@pytest.mark.parametrize("rows, columns, num_symmetries",
+                         [(3, 3, 8), (3, 6, 4), (6, 3, 4), (9, 9, 8)])
+def test_grid_symmetries_are_distinct_permutations(rows, columns, num_symmetries):
+    symmetries = grid_symmetries(rows, columns)
+
+    assert len(symmetries) == num_symmetries
+    assert len(set(symmetries)) == num_symmetries
+    assert symmetries[0] == tuple(range(rows * columns))
+    for symmetry in symmetries:
+        assert sorted(symmetry) == list(range(rows * columns))
+
+
+def test_grid_symmetries_include_reflection_of_rectangle():
+    # Reflecting the 2x3 board left to right swaps the outer columns.
+    symmetries = grid_symmetries(2, 3)
+    assert (2, 1, 0, 5, 4, 3) in symmetries
+
+
+def test_bit_permutation_moves_bits_to_targets():
+    permute = BitPermutation([8, 7, 6, 5, 4, 3, 2, 1, 0])
+
+    assert permute(0b000000001) == 0b100000000
+    assert permute(0b000000110) == 0b011000000
+    assert permute(0) == 0
+
+
+def test_bit_permutation_inverse_undoes_permutation():
+    symmetry = grid_symmetries(9, 9)[5]
+    permute = BitPermutation(symmetry)
+    inverse = permute.inverse()
+
+    bitmask = 0b1011001110001011100100101110001110101
+    assert inverse(permute(bitmask)) == bitmask
+    assert permute(inverse(bitmask)) == bitmask
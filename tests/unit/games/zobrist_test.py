@@ -0,0 +1,36 @@
+import itertools
+
+from alphago.games.zobrist import MASK_64, ZobristTable, splitmix64
+
+
+def test_splitmix64_generates_known_sequence():
+    generator = splitmix64(0)
+    assert next(generator) == 0xE220A8397B1DCDAF
+    assert next(generator) == 0x6E789E6AA1B965F4
+
+
+def test_splitmix64_values_are_64_bit():
+    values = list(itertools.islice(splitmix64(1234), 1000))
+    assert all(0 <= value <= MASK_64 for value in values)
+    assert len(set(values)) == len(values)
+
+
+def test_zobrist_tables_with_same_arguments_are_identical():
+    table1 = ZobristTable(9)
+    table2 = ZobristTable(9)
+    assert table1.keys == table2.keys
+    assert table1.player_key == table2.player_key
+
+
+def test_zobrist_table_has_key_for_each_piece_and_square():
+    table = ZobristTable(42, num_pieces=3)
+    assert len(table.keys) == 3
+    assert all(len(piece_keys) == 42 for piece_keys in table.keys)
+
+
+def test_bitboard_key_is_xor_of_square_keys():
+    table = ZobristTable(9)
+    bitboard = 0b100010001
+    expected = table.keys[1][0] ^ table.keys[1][4] ^ table.keys[1][8]
+    assert table.bitboard_key(1, bitboard) == expected
+    assert table.bitboard_key(0, 0) == 0
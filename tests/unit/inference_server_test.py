@@ -0,0 +1,119 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from alphago import mcts, MCTSNode
+from alphago.games import NoughtsAndCrosses
+from alphago.inference_server import InferenceServer
+
+
+class BatchCountingEstimator:
+    """Evaluates noughts and crosses states to a fixed function of the
+    state, recording the size of each batch."""
+
+    def __init__(self, action_indices):
+        self.action_indices = action_indices
+        self.batch_sizes = []
+
+    def predict_batch(self, states):
+        self.batch_sizes.append(len(states))
+        values = np.array([np.tanh(state[0] - state[1]) for state in states])
+        probs = np.full((len(states), len(self.action_indices)),
+                        1 / len(self.action_indices))
+        return probs, values
+
+
+def test_server_returns_same_result_as_estimator():
+    nac = NoughtsAndCrosses()
+    estimator = BatchCountingEstimator(nac.action_indices)
+    state = nac.legal_actions(nac.initial_state)[(1, 1)]
+
+    with InferenceServer(estimator) as server:
+        probs, value = server(state)
+
+    assert value == np.tanh(state[0] - state[1])
+    assert probs == {action: 1 / 9 for action in nac.action_space}
+
+
+def test_concurrent_requests_are_batched():
+    nac = NoughtsAndCrosses()
+    estimator = BatchCountingEstimator(nac.action_indices)
+    states = list(nac.legal_actions(nac.initial_state).values())
+    results = {}
+
+    with InferenceServer(estimator, max_batch_size=4, max_wait=0.5) as server:
+        barrier = threading.Barrier(len(states))
+
+        def evaluate(state):
+            barrier.wait()
+            results[state] = server(state)
+
+        threads = [threading.Thread(target=evaluate, args=(state,))
+                   for state in states]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = server.stats()
+
+    assert len(results) == 9
+    for state, (_, value) in results.items():
+        assert value == np.tanh(state[0] - state[1])
+    assert max(estimator.batch_sizes) <= 4
+    assert len(estimator.batch_sizes) < 9
+    assert stats.requests == 9
+    assert sum(size * count for size, count
+               in stats.batch_size_histogram.items()) == 9
+    assert stats.queue_depth == 0
+    assert stats.max_latency >= stats.mean_latency > 0
+
+
+def test_coroutines_can_await_evaluations():
+    nac = NoughtsAndCrosses()
+    estimator = BatchCountingEstimator(nac.action_indices)
+    states = list(nac.legal_actions(nac.initial_state).values())
+
+    async def evaluate_all(server):
+        return await asyncio.gather(*(server.evaluate(state)
+                                      for state in states))
+
+    with InferenceServer(estimator, max_batch_size=9, max_wait=0.5) as server:
+        results = asyncio.run(evaluate_all(server))
+
+    assert [value for _, value in results] == [np.tanh(state[0] - state[1])
+                                               for state in states]
+    assert estimator.batch_sizes == [9]
+
+
+def test_server_can_be_used_as_estimator_in_mcts():
+    nac = NoughtsAndCrosses()
+    estimator = BatchCountingEstimator(nac.action_indices)
+
+    with InferenceServer(estimator) as server:
+        root = MCTSNode(nac.initial_state, player=1)
+        action_probs = mcts(root, nac, server, 20, 1.0)
+
+    assert np.isclose(sum(action_probs.values()), 1)
+
+
+def test_estimator_errors_are_raised_in_callers():
+    class FailingEstimator:
+        action_indices = {}
+
+        def predict_batch(self, states):
+            raise ValueError("Bad state.")
+
+    with InferenceServer(FailingEstimator()) as server:
+        with pytest.raises(ValueError):
+            server((0, 0, 1))
+
+
+def test_submitting_to_closed_server_raises():
+    nac = NoughtsAndCrosses()
+    server = InferenceServer(BatchCountingEstimator(nac.action_indices))
+    server.close()
+
+    with pytest.raises(RuntimeError):
+        server.submit(nac.initial_state)
@@ -0,0 +1,69 @@
+import pytest
+
+from alphago.evaluator import GameLog
+from alphago.games import NoughtsAndCrosses
+from alphago.match_runner import (EstimatorSpec, PlayerSpec, evaluate_parallel,
+                                  run_gauntlet_parallel, run_tournament_parallel)
+from alphago.player import MCTSPlayer, RandomPlayer
+
+
+@pytest.fixture
+def player_specs():
+    return {1: PlayerSpec.random(),
+            2: PlayerSpec.mcts(EstimatorSpec.trivial(), mcts_iters=5, c_puct=1.0),
+            3: PlayerSpec.mcts(EstimatorSpec.rollout(2), mcts_iters=5, c_puct=1.0)}
+
+
+def test_specs_build_players():
+    nac = NoughtsAndCrosses()
+    spec = PlayerSpec.mcts(EstimatorSpec.trivial(), mcts_iters=5, c_puct=0.5, tau=0.1)
+
+    player = spec.build(nac)
+
+    assert isinstance(player, MCTSPlayer)
+    assert (player.mcts_iters, player.c_puct, player.tau) == (5, 0.5, 0.1)
+    assert isinstance(PlayerSpec.random().build(nac), RandomPlayer)
+    with pytest.raises(ValueError):
+        EstimatorSpec('unknown').build(nac)
+
+
+def test_tournament_results_do_not_depend_on_number_of_workers(player_specs):
+    nac = NoughtsAndCrosses()
+
+    results = [run_tournament_parallel(nac, player_specs, 2, num_workers,
+                                       seed=0, verbose=False)
+               for num_workers in [1, 2]]
+
+    assert results[0] == results[1]
+    # Each of the 3 pairs plays 2 games in each of the 2 rounds.
+    assert sum(n for _, _, n in results[0]) == 3 * 2 * 2
+    assert {(i, j) for i, j, _ in results[0]} <= {
+        (i, j) for i in player_specs for j in player_specs if i != j}
+
+
+def test_evaluate_parallel_returns_game_logs_in_order(player_specs):
+    nac = NoughtsAndCrosses()
+    specs = {1: player_specs[2], 2: player_specs[1]}
+
+    player1_results, game_logs = evaluate_parallel(nac, specs, 6, num_workers=1,
+                                                   seed=1, verbose=False)
+
+    assert sum(player1_results.values()) == 6
+    assert len(game_logs) == 6
+    for game_log in game_logs:
+        assert isinstance(game_log, GameLog)
+        assert game_log.game_states[0] == nac.initial_state
+        assert nac.utility(game_log.game_states[-1])[1] == game_log.result
+    assert [game_log.result for game_log in game_logs].count(1) == player1_results[1]
+
+
+def test_gauntlet_plays_challenger_against_each_player(player_specs):
+    nac = NoughtsAndCrosses()
+    challenger = (1, player_specs[1])
+    gauntlet = {2: player_specs[2], 3: player_specs[3]}
+
+    results = run_gauntlet_parallel(nac, challenger, gauntlet, 2, num_workers=1,
+                                    seed=2, verbose=False)
+
+    assert sum(n for _, _, n in results) == 2 * 2 * 2
+    assert all(1 in (i, j) for i, j, _ in results)
@@ -0,0 +1,154 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from alphago.estimator import NACNetEstimator, NAC3x6NetEstimator, ConnectFourNet
+from alphago.games import NoughtsAndCrosses, ConnectFour
+from alphago.numpy_estimator import (BatchNorm, Conv2D, Dense, NumpyConnectFourNet,
+                                     NumpyNACNetEstimator, NumpyNAC3x6NetEstimator,
+                                     layer_from_params)
+
+
+def naive_conv(x, weights, biases):
+    """A direct implementation of a stride 1 'SAME' convolution."""
+    kernel_height, kernel_width, _, out_channels = weights.shape
+    batch, height, width, _ = x.shape
+    pad_top, pad_left = (kernel_height - 1) // 2, (kernel_width - 1) // 2
+    out = np.zeros((batch, height, width, out_channels))
+    for row in range(height):
+        for col in range(width):
+            for i in range(kernel_height):
+                for j in range(kernel_width):
+                    r, c = row + i - pad_top, col + j - pad_left
+                    if 0 <= r < height and 0 <= c < width:
+                        out[:, row, col, :] += x[:, r, c, :] @ weights[i, j]
+    return out + biases
+
+
+def random_connect_four_params(seed=0):
+    rng = np.random.RandomState(seed)
+    shapes = [(3, 3, 1, 8), (3, 3, 8, 16), (3, 3, 16, 32), (3, 3, 32, 64),
+              (42 * 64, 64), (64, 128), (128, 256), (256, 1), (256, 7)]
+    return [{'weights': (rng.randn(*shape) / np.sqrt(np.prod(shape[:-1]))).astype(np.float32),
+             'biases': rng.randn(shape[-1]).astype(np.float32)}
+            for shape in shapes]
+
+
+@pytest.mark.parametrize("kernel_size", [2, 3])
+def test_conv_matches_naive_convolution(kernel_size):
+    rng = np.random.RandomState(0)
+    x = rng.randn(4, 3, 6, 2)
+    weights = rng.randn(kernel_size, kernel_size, 2, 5)
+    biases = rng.randn(5)
+
+    computed = Conv2D(weights, biases)(x)
+
+    assert np.allclose(computed, naive_conv(x, weights, biases))
+
+
+def test_batch_norm_uses_moving_statistics():
+    rng = np.random.RandomState(0)
+    x = rng.randn(10, 4)
+    mean, variance, beta = rng.randn(4), rng.rand(4), rng.randn(4)
+
+    computed = BatchNorm(mean, variance, beta=beta)(x)
+
+    assert np.allclose(computed, (x - mean) / np.sqrt(variance + 1e-3) + beta)
+
+
+def test_layers_are_built_from_parameters():
+    assert isinstance(layer_from_params({'weights': np.ones((2, 2, 1, 3)),
+                                         'biases': np.ones(3)}), Conv2D)
+    assert isinstance(layer_from_params({'weights': np.ones((4, 3)),
+                                         'biases': np.ones(3)}), Dense)
+    assert isinstance(layer_from_params({'beta': np.ones(3),
+                                         'moving_mean': np.ones(3),
+                                         'moving_variance': np.ones(3)}), BatchNorm)
+    with pytest.raises(ValueError):
+        layer_from_params({'gamma': np.ones(3)})
+
+
+def test_predict_batch_matches_call():
+    game = ConnectFour()
+    net = NumpyConnectFourNet(random_connect_four_params(), game.action_indices)
+    states = [tuple(np.random.choice([-1, 0, 1], 42)) for _ in range(3)]
+
+    probs, values = net.predict_batch(states)
+
+    assert probs.shape == (3, 7)
+    assert values.shape == (3,)
+    assert np.allclose(probs.sum(axis=1), 1)
+    probs_dict, value = net(states[1])
+    assert np.isclose(value, values[1])
+    assert np.allclose([probs_dict[action] for action in game.action_space], probs[1])
+
+
+def test_save_and_load_round_trip(tmpdir):
+    game = ConnectFour()
+    net = NumpyConnectFourNet(random_connect_four_params(), game.action_indices)
+    save_file = str(tmpdir.join('weights.npz'))
+
+    net.save(save_file)
+    loaded_net = NumpyConnectFourNet.load(save_file, game.action_indices)
+
+    states = [tuple(np.random.choice([-1, 0, 1], 42)) for _ in range(3)]
+    probs, values = net.predict_batch(states)
+    loaded_probs, loaded_values = loaded_net.predict_batch(states)
+    assert np.array_equal(probs, loaded_probs)
+    assert np.array_equal(values, loaded_values)
+
+
+def assert_numpy_net_matches(net, numpy_net_class, states):
+    numpy_net = numpy_net_class.from_estimator(net)
+
+    probs, values = net.predict_batch(states)
+    numpy_probs, numpy_values = numpy_net.predict_batch(states)
+
+    assert np.allclose(probs, numpy_probs, atol=1e-5)
+    assert np.allclose(values, numpy_values, atol=1e-5)
+
+
+def test_numpy_nac_net_matches_tensorflow():
+    np.random.seed(0)
+    game = NoughtsAndCrosses()
+    net = NACNetEstimator(learning_rate=0.01, l2_weight=0.1,
+                          action_indices=game.action_indices)
+    states = [tuple(np.random.choice([-1, 0, 1], 9)) for _ in range(10)]
+
+    assert_numpy_net_matches(net, NumpyNACNetEstimator, states)
+
+
+def test_numpy_nac_3x6_net_matches_tensorflow():
+    np.random.seed(0)
+    game = NoughtsAndCrosses(rows=3, columns=6)
+    net = NAC3x6NetEstimator(learning_rate=0.01, l2_weight=0.1,
+                             action_indices=game.action_indices)
+
+    # Train briefly so the weights move away from their initial values.
+    batch = [(game.initial_state, np.full(18, 1 / 18), 0)] * 4
+    net.train_step(batch)
+
+    states = [game.initial_state]
+    for _ in range(9):
+        next_states = list(game.legal_actions(states[-1]).values())
+        states.append(next_states[np.random.randint(len(next_states))])
+    assert_numpy_net_matches(net, NumpyNAC3x6NetEstimator, states)
+
+
+def test_numpy_connect_four_net_matches_tensorflow():
+    np.random.seed(0)
+    game = ConnectFour()
+    net = ConnectFourNet(learning_rate=1e-4, l2_weight=1e-4,
+                         action_indices=game.action_indices)
+    states = [tuple(np.random.choice([-1, 0, 1], 42)) for _ in range(10)]
+
+    assert_numpy_net_matches(net, NumpyConnectFourNet, states)
+
+
+def test_numpy_backend_does_not_import_tensorflow():
+    code = ("import sys\n"
+            "import alphago.numpy_estimator\n"
+            "assert 'tensorflow' not in sys.modules, 'tensorflow was imported'\n")
+    subprocess.run([sys.executable, '-c', code], check=True)
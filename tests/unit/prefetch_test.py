@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from alphago.prefetch import BatchPrefetcher
+
+
+def test_batches_are_returned_in_order():
+    with BatchPrefetcher(lambda i: i * i, num_batches=10, queue_size=3) as batches:
+        assert list(batches) == [i * i for i in range(10)]
+
+    stats = batches.stats()
+    assert stats.batches == 10
+    assert 0 <= stats.starved_batches <= 10
+
+
+def test_batches_are_built_in_a_background_thread():
+    threads = set()
+
+    def batch_fn(i):
+        threads.add(threading.current_thread())
+        return i
+
+    with BatchPrefetcher(batch_fn, num_batches=3) as batches:
+        list(batches)
+
+    assert threading.current_thread() not in threads
+
+
+def test_producer_stays_at_most_queue_size_ahead():
+    produced = []
+
+    def batch_fn(i):
+        produced.append(i)
+        return i
+
+    with BatchPrefetcher(batch_fn, num_batches=100, queue_size=2) as batches:
+        next(batches)
+        time.sleep(0.05)
+        # One batch consumed, two queued and one waiting to be queued.
+        assert len(produced) <= 4
+
+
+def test_slow_producer_starves_consumer():
+    def batch_fn(i):
+        time.sleep(0.01)
+        return i
+
+    with BatchPrefetcher(batch_fn, num_batches=5) as batches:
+        list(batches)
+
+    stats = batches.stats()
+    assert stats.starvation_fraction > 0.5
+    assert stats.wait_time > 0.02
+
+
+def test_slow_consumer_is_not_starved():
+    with BatchPrefetcher(lambda i: i, num_batches=5, queue_size=5) as batches:
+        time.sleep(0.05)
+        for _ in batches:
+            time.sleep(0.01)
+
+    stats = batches.stats()
+    assert stats.starvation_fraction == 0
+    assert stats.mean_queue_depth > 1
+
+
+def test_producer_exceptions_are_raised_by_iterator():
+    def batch_fn(i):
+        if i == 2:
+            raise KeyError(i)
+        return i
+
+    batches = BatchPrefetcher(batch_fn, num_batches=5)
+    assert next(batches) == 0
+    assert next(batches) == 1
+    with pytest.raises(KeyError):
+        next(batches)
+
+
+def test_close_stops_producer():
+    batches = BatchPrefetcher(lambda i: i, num_batches=1000, queue_size=1)
+    next(batches)
+    batches.close()
+
+    assert not batches._producer.is_alive()
+    with pytest.raises(StopIteration):
+        next(batches)
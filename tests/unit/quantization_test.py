@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from alphago.games import ConnectFour
+from alphago.numpy_estimator import Conv2D, Dense, NumpyConnectFourNet
+from alphago.quantization import calibrate, compare_estimators, quantize
+
+from .numpy_estimator_test import random_connect_four_params
+
+
+def random_states(num_states, seed=0):
+    rng = np.random.RandomState(seed)
+    return [tuple(rng.choice([-1, 0, 1], 42)) for _ in range(num_states)]
+
+
+def create_net():
+    game = ConnectFour()
+    return NumpyConnectFourNet(random_connect_four_params(), game.action_indices)
+
+
+def test_calibration_records_input_range_of_each_weighted_layer():
+    net = create_net()
+    states = random_states(20)
+
+    input_ranges = calibrate(net, states)
+
+    assert len(input_ranges) == len(net.layers)
+    # The first layer sees the raw board.
+    assert input_ranges[0] == 1
+    assert all(input_range > 0 for input_range in input_ranges)
+    # The float layers are restored after calibration.
+    assert not any(hasattr(layer, 'input_range') for layer in net.layers)
+
+
+@pytest.mark.parametrize("mode, compression", [('int8', 4), ('float16', 2)])
+def test_quantized_net_is_close_to_float_net(mode, compression):
+    net = create_net()
+    quantized_net = quantize(net, mode)
+
+    # The compressed weights are converted back to float32 once.
+    for layer, float_layer in zip(quantized_net.layers, net.layers):
+        assert type(layer) is type(float_layer)
+        if isinstance(layer, (Conv2D, Dense)):
+            assert layer.weights.dtype == np.float32
+
+    report = compare_estimators(net, quantized_net, random_states(100, seed=1))
+    assert report.policy_agreement >= 0.9
+    assert report.value_mse < 1e-2
+    assert report.max_prob_error < 0.1
+    assert report.float_bytes / report.quantized_bytes > 0.9 * compression
+
+
+@pytest.mark.parametrize("mode", ['int8', 'float16'])
+def test_simulating_activations_leaves_quantized_net_unchanged(mode):
+    net = create_net()
+    quantized_net = quantize(net, mode, calibration_states=random_states(50))
+    states = random_states(100, seed=1)
+    probs, values = quantized_net.predict_batch(states)
+
+    report = compare_estimators(net, quantized_net, states,
+                                simulate_activations=True)
+
+    assert report.policy_agreement >= 0.9
+    assert report.max_prob_error < 0.1
+    simulated_report = compare_estimators(net, quantized_net, states)
+    assert report.value_mse != simulated_report.value_mse
+    new_probs, new_values = quantized_net.predict_batch(states)
+    assert np.array_equal(probs, new_probs)
+    assert np.array_equal(values, new_values)
+
+
+def test_quantized_net_save_and_load(tmpdir):
+    net = quantize(create_net(), 'int8', calibration_states=random_states(10))
+    save_file = str(tmpdir.join('weights.npz'))
+
+    net.save(save_file)
+    loaded_net = NumpyConnectFourNet.load(save_file, net.action_indices)
+
+    states = random_states(5, seed=2)
+    assert np.array_equal(net.predict_batch(states)[0],
+                          loaded_net.predict_batch(states)[0])
+    assert loaded_net.layer_params[0]['weights_int8'].dtype == np.int8
+
+
+def test_simulating_int8_activations_requires_calibration_states():
+    net = create_net()
+    with pytest.raises(ValueError):
+        compare_estimators(net, quantize(net, 'int8'), random_states(5),
+                           simulate_activations=True)
+
+
+def test_unknown_mode_raises():
+    with pytest.raises(ValueError):
+        quantize(create_net(), 'int4')
+
+
+def test_comparing_on_no_states_raises():
+    net = create_net()
+    with pytest.raises(ValueError):
+        compare_estimators(net, quantize(net, 'float16'), [])
@@ -0,0 +1,272 @@
+import numpy as np
+import pytest
+
+from alphago.alphago import generate_self_play_data
+from alphago.estimator import create_trivial_estimator
+from alphago.games import NoughtsAndCrosses
+from alphago.replay_buffer import PrioritizedReplayBuffer, ReplayBuffer
+
+
+def fill(buffer, num_positions):
+    for i in range(num_positions):
+        buffer.append(np.array([i, -i]), np.array([i, 1.0]), i % 3 - 1)
+
+
+def test_buffer_keeps_positions_in_order_until_full():
+    buffer = ReplayBuffer(5)
+    fill(buffer, 3)
+
+    assert len(buffer) == 3
+    assert [buffer[i][0][0] for i in range(3)] == [0, 1, 2]
+    state, probs, z = buffer[-1]
+    assert np.array_equal(state, [2, -2])
+    assert np.array_equal(probs, [2, 1])
+    assert z == 1
+
+
+def test_full_buffer_overwrites_oldest_positions():
+    buffer = ReplayBuffer(4)
+    fill(buffer, 10)
+
+    assert len(buffer) == 4
+    assert buffer.num_added == 10
+    assert [buffer[i][0][0] for i in range(4)] == [6, 7, 8, 9]
+    with pytest.raises(IndexError):
+        buffer[4]
+
+
+def test_gather_matches_indexing():
+    buffer = ReplayBuffer(4)
+    fill(buffer, 6)
+
+    states, probs, outcomes = buffer.gather([3, 0, 1])
+
+    for row, index in enumerate([3, 0, 1]):
+        state, pi, z = buffer[index]
+        assert np.array_equal(states[row], state)
+        assert np.array_equal(probs[row], pi)
+        assert outcomes[row] == z
+
+
+def test_sampling_only_returns_stored_positions():
+    buffer = ReplayBuffer(8)
+    fill(buffer, 20)
+
+    states, probs, outcomes = buffer.sample(100, np.random.RandomState(0))
+
+    assert states.shape == (100, 2)
+    assert probs.shape == (100, 2)
+    assert outcomes.shape == (100,)
+    assert set(states[:, 0]) <= set(range(12, 20))
+
+
+def test_sampling_from_empty_buffer_raises():
+    with pytest.raises(ValueError):
+        ReplayBuffer(8).sample_indices(4)
+
+
+def test_self_play_data_can_be_added_to_buffer():
+    class TrivialEstimator:
+        def create_estimate_fn(self):
+            return create_trivial_estimator(nac)
+
+    nac = NoughtsAndCrosses()
+    estimator = TrivialEstimator()
+    buffer = ReplayBuffer(1000)
+
+    generate_self_play_data(nac, estimator, 5, 1.0, 3, verbose=False,
+                            replay_buffer=buffer)
+
+    # Each game lasts between 5 and 9 moves.
+    assert 15 <= len(buffer) <= 27
+    assert buffer.probs.shape[1:] == (9,)
+    assert np.allclose(buffer.probs[:len(buffer)].sum(axis=1), 1)
+
+
+def test_staleness_of_positions():
+    buffer = ReplayBuffer(4)
+    assert buffer.staleness(3) == (0.0, 0)
+
+    game_log = [(np.zeros(2), 0, np.ones(2), 1)] * 2
+    for version in [0, 1, 2]:
+        buffer.extend(game_log, weights_version=version)
+
+    # Only the positions played with versions 1 and 2 remain.
+    assert buffer.staleness(3) == (1.5, 2)
+
+
+@pytest.mark.parametrize("num_before, num_added", [(0, 3), (2, 3), (3, 10)])
+def test_extend_arrays_matches_appending(num_before, num_added):
+    appended, extended = ReplayBuffer(5), ReplayBuffer(5)
+    fill(appended, num_before)
+    fill(extended, num_before)
+
+    states = np.array([[i, -i] for i in range(num_added)])
+    probs = np.array([[i, 1.0] for i in range(num_added)])
+    outcomes = np.arange(num_added) % 3 - 1
+    for row in range(num_added):
+        appended.append(states[row], probs[row], outcomes[row], row)
+    extended.extend_arrays(states, probs, outcomes, np.arange(num_added))
+
+    assert len(extended) == len(appended)
+    assert extended.num_added == appended.num_added
+    for index in range(len(appended)):
+        for expected, computed in zip(appended[index], extended[index]):
+            assert np.array_equal(expected, computed)
+    assert np.array_equal(extended.weights_versions, appended.weights_versions)
+
+
+def test_deduplicated_buffer_merges_repeated_positions():
+    buffer = ReplayBuffer(4, deduplicate=True)
+    buffer.append(np.array([1, 0]), np.array([1.0, 0.0]), 1, weights_version=0)
+    buffer.append(np.array([2, 0]), np.array([0.5, 0.5]), 0)
+    buffer.append(np.array([1, 0]), np.array([0.0, 1.0]), -1, weights_version=3)
+    buffer.append(np.array([1, 0]), np.array([0.0, 1.0]), -1, weights_version=4)
+
+    assert len(buffer) == 2
+    assert buffer.num_added == 2
+    assert buffer.num_occurrences == 4
+    state, probs, z = buffer[0]
+    assert np.array_equal(state, [1, 0])
+    assert np.allclose(probs, [1 / 3, 2 / 3])
+    assert np.isclose(z, -1 / 3)
+    assert buffer.counts[:2].tolist() == [3, 1]
+    assert buffer.weights_versions[0] == 4
+
+
+def test_deduplicated_buffer_evicts_oldest_distinct_position():
+    buffer = ReplayBuffer(3, deduplicate=True)
+    fill(buffer, 4)
+    assert [buffer[i][0][0] for i in range(3)] == [1, 2, 3]
+
+    # The evicted position is added afresh, and a stored one is merged.
+    buffer.append(np.array([0, 0]), np.array([0, 1.0]), 1)
+    buffer.append(np.array([3, -3]), np.array([3, 1.0]), 0)
+    assert [buffer[i][0][0] for i in range(3)] == [2, 3, 0]
+    assert buffer.counts[buffer._slots([0, 1, 2])].tolist() == [1, 2, 1]
+
+
+def test_deduplicated_sampling_follows_occurrence_counts():
+    buffer = ReplayBuffer(8, deduplicate=True)
+    for state, occurrences in [(0, 1), (1, 3), (2, 6)]:
+        for _ in range(occurrences):
+            buffer.append(np.array([state]), np.ones(2), 0)
+
+    indices = buffer.sample_indices(20000, np.random.RandomState(0))
+    frequencies = np.bincount(indices, minlength=3) / len(indices)
+    assert np.allclose(frequencies, [0.1, 0.3, 0.6], atol=0.02)
+
+    # Adding a position updates the sampling weights.
+    buffer.append(np.array([3]), np.ones(2), 0)
+    assert 3 in buffer.sample_indices(2000, np.random.RandomState(0))
+
+
+def test_deduplicated_extend_arrays_matches_appending():
+    appended = ReplayBuffer(4, deduplicate=True)
+    extended = ReplayBuffer(4, deduplicate=True)
+    states = np.array([[i % 3, 0] for i in range(7)])
+    probs = np.array([[i, 1.0] for i in range(7)])
+    outcomes = np.arange(7) % 3 - 1
+    for row in range(7):
+        appended.append(states[row], probs[row], outcomes[row], row)
+    extended.extend_arrays(states, probs, outcomes, np.arange(7))
+
+    assert len(extended) == len(appended) == 3
+    for index in range(3):
+        for expected, computed in zip(appended[index], extended[index]):
+            assert np.array_equal(expected, computed)
+    assert np.array_equal(extended.counts, appended.counts)
+
+
+def test_reindex_restores_merging():
+    buffer = ReplayBuffer(4, deduplicate=True)
+    fill(buffer, 3)
+    restored = ReplayBuffer(4, deduplicate=True)
+    restored.states, restored.probs = buffer.states.copy(), buffer.probs.copy()
+    restored.num_added = buffer.num_added
+    restored.reindex()
+
+    restored.append(np.array([1, -1]), np.array([1, 1.0]), 0)
+    assert len(restored) == 3
+    assert restored.counts[1] == 2
+
+
+def test_positions_record_whether_they_had_a_full_search():
+    buffer = ReplayBuffer(4)
+    buffer.extend([(np.array([0, 0]), 0, np.array([1.0, 0.0]), 1, True),
+                   (np.array([1, 0]), 1, np.zeros(2), -1, False),
+                   (np.array([2, 0]), 0, np.array([0.0, 1.0]), 1)])
+    assert buffer.policy_counts[:3].tolist() == [1, 0, 1]
+
+    extended = ReplayBuffer(4)
+    extended.extend_arrays(buffer.states[:3], buffer.probs[:3], buffer.outcomes[:3],
+                           full_search=[True, False, True])
+    assert np.array_equal(extended.policy_counts, buffer.policy_counts)
+
+
+def test_merging_averages_policy_targets_of_full_searches_only():
+    buffer = ReplayBuffer(4, deduplicate=True)
+    buffer.append(np.array([1, 0]), np.zeros(2), 1, full_search=False)
+    buffer.append(np.array([1, 0]), np.array([1.0, 0.0]), 1)
+    buffer.append(np.array([1, 0]), np.zeros(2), -1, full_search=False)
+    buffer.append(np.array([1, 0]), np.array([0.0, 1.0]), 0)
+
+    state, probs, z = buffer[0]
+    assert np.allclose(probs, [0.5, 0.5])
+    assert np.isclose(z, 1 / 4)
+    assert buffer.counts[0] == 4
+    assert buffer.policy_counts[0] == 2
+
+
+def test_prioritized_buffer_samples_by_priority():
+    buffer = PrioritizedReplayBuffer(4, alpha=1, epsilon=1e-9)
+    fill(buffer, 6)
+    buffer.update_priorities([0, 1, 2, 3], [1, 0, 3, 0])
+
+    indices = buffer.sample_indices(20000, np.random.RandomState(0))
+    frequencies = np.bincount(indices, minlength=4) / len(indices)
+    assert np.allclose(frequencies, [0.25, 0, 0.75, 0], atol=0.02)
+    # Indices count from the oldest position, as for ReplayBuffer.
+    states, _, _ = buffer.gather(indices[:10])
+    assert set(states[:, 0]) <= {2, 4}
+
+
+def test_new_positions_get_the_largest_priority():
+    buffer = PrioritizedReplayBuffer(4)
+    fill(buffer, 2)
+    buffer.update_priorities([0, 1], [5, 0.5])
+    fill(buffer, 1)
+    assert buffer.priorities[buffer._slots(2)] == pytest.approx(5 + buffer.epsilon)
+
+
+def test_importance_weights_undo_the_priorities():
+    buffer = PrioritizedReplayBuffer(4, alpha=0.5, beta=1)
+    fill(buffer, 3)
+    buffer.update_priorities([0, 1, 2], [4 - buffer.epsilon, 1 - buffer.epsilon,
+                                         1 - buffer.epsilon])
+
+    weights = buffer.importance_weights([0, 1, 2])
+    assert np.allclose(weights, [0.5, 1, 1])
+    # Sampling probability times weight is the same for every position.
+    probabilities = np.array([2, 1, 1]) / 4
+    assert np.allclose(probabilities * weights, probabilities[0] * weights[0])
+
+
+def test_prioritized_buffer_weights_merged_positions_by_count():
+    buffer = PrioritizedReplayBuffer(4, deduplicate=True, alpha=1)
+    for state, occurrences in [(0, 1), (1, 3)]:
+        for _ in range(occurrences):
+            buffer.append(np.array([state]), np.ones(2), 0)
+
+    indices = buffer.sample_indices(20000, np.random.RandomState(0))
+    assert np.isclose(np.mean(indices == 1), 0.75, atol=0.02)
+
+
+def test_prioritized_buffer_reindex_rebuilds_the_tree():
+    buffer = PrioritizedReplayBuffer(4, alpha=1)
+    fill(buffer, 2)
+    buffer.priorities[:2] = [0.0001, 3]
+    buffer.reindex()
+    assert set(buffer.sample_indices(100, np.random.RandomState(0))) <= {0, 1}
+    assert buffer.max_priority == 3
+    assert np.mean(buffer.sample_indices(1000, np.random.RandomState(0))) > 0.99
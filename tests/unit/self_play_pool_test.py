@@ -0,0 +1,99 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from alphago.alphago import generate_self_play_data
+from alphago.games import ConnectFour
+from alphago.numpy_estimator import NumpyConnectFourNet, to_numpy_estimator
+from alphago.replay_buffer import ReplayBuffer
+from alphago.self_play_pool import SelfPlayPool
+
+from .numpy_estimator_test import random_connect_four_params
+
+
+@pytest.fixture(scope='module')
+def game():
+    return ConnectFour()
+
+
+@pytest.fixture(scope='module')
+def estimator(game):
+    return NumpyConnectFourNet(random_connect_four_params(), game.action_indices)
+
+
+@pytest.fixture(scope='module')
+def pool(game):
+    with SelfPlayPool(game, num_workers=2, mcts_iters=5, c_puct=1.0,
+                      seed=0) as pool:
+        yield pool
+
+
+def game_key(game_log):
+    return tuple(tuple(state) for state, *_ in game_log)
+
+
+def test_pool_plays_requested_number_of_games(game, estimator, pool):
+    game_logs = list(pool.play(estimator, 6))
+    # The weights are exported again for each call.
+    game_logs += list(pool.play(estimator, 2))
+
+    assert len(game_logs) == 8
+    for game_log in game_logs:
+        assert 7 <= len(game_log) <= 42
+        state, action, probs, z, full_search = game_log[0]
+        assert tuple(state) == game.initial_state
+        assert probs.shape == (7,)
+        assert z in (-1, 0, 1)
+        assert full_search
+
+
+def test_calls_to_play_may_overlap(game, estimator):
+    with SelfPlayPool(game, num_workers=1, mcts_iters=5, c_puct=1.0,
+                      seed=0) as pool:
+        first = pool.play(estimator, 3)
+        second = pool.play(estimator, 2)
+        assert len(list(second)) == 2
+        # The weights of the first call are kept until its games are in.
+        assert len(list(first)) == 3
+        assert len(os.listdir(pool._weights_dir)) == 1
+
+
+def test_games_are_reproducible_with_seed(game, estimator):
+    games = []
+    for num_workers in [1, 2]:
+        with SelfPlayPool(game, num_workers, mcts_iters=5, c_puct=1.0,
+                          seed=1) as pool:
+            games.append(sorted(map(game_key, pool.play(estimator, 6))))
+
+    assert games[0] == games[1]
+    # Each game is played with a different seed.
+    assert len(set(games[0])) > 1
+
+
+def test_self_play_data_from_pool_fills_replay_buffer(game, estimator, pool):
+    buffer = ReplayBuffer(1000)
+    generate_self_play_data(game, estimator, 5, 1.0, 4, verbose=False,
+                            replay_buffer=buffer, pool=pool)
+
+    assert 4 * 7 <= len(buffer) <= 4 * 42
+    assert np.allclose(buffer.probs[:len(buffer)].sum(axis=1), 1)
+
+
+def test_workers_do_not_import_tensorflow():
+    code = ("import sys\n"
+            "import alphago.async_training, alphago.self_play_pool\n"
+            "assert 'tensorflow' not in sys.modules, 'tensorflow was imported'\n")
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_pool_needs_at_least_one_worker(game):
+    with pytest.raises(ValueError):
+        SelfPlayPool(game, num_workers=0, mcts_iters=5, c_puct=1.0)
+
+
+def test_estimators_without_numpy_counterpart_are_rejected():
+    with pytest.raises(ValueError):
+        to_numpy_estimator(object())
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from alphago.sprt import SPRT
+
+
+def run_sprt(sprt, success_rate, rng, max_games=10000):
+    while sprt.decision is None and sprt.num_games < max_games:
+        sprt.update(rng.rand() < success_rate)
+    return sprt.decision
+
+
+def test_clear_results_are_decided_quickly():
+    rng = np.random.RandomState(0)
+
+    strong = SPRT.for_win_rate(0.55, margin=0.05)
+    assert run_sprt(strong, 0.9, rng) is True
+    assert strong.num_games < 50
+
+    weak = SPRT.for_win_rate(0.55, margin=0.05)
+    assert run_sprt(weak, 0.2, rng) is False
+    assert weak.num_games < 50
+
+
+@pytest.mark.parametrize("success_rate, hypothesis", [(0.5, False), (0.6, True)])
+def test_error_rates_are_controlled(success_rate, hypothesis):
+    rng = np.random.RandomState(1)
+    decisions = [run_sprt(SPRT(0.5, 0.6, alpha=0.05, beta=0.05), success_rate, rng)
+                 for _ in range(200)]
+
+    assert None not in decisions
+    errors = sum(decision is not hypothesis for decision in decisions)
+    assert errors / len(decisions) < 0.1
+
+
+def test_llr_matches_counts():
+    sprt = SPRT(0.4, 0.6)
+    for success in [True, True, False, True]:
+        sprt.update(success)
+
+    assert sprt.num_games == 4
+    assert sprt.num_successes == 3
+    assert np.isclose(sprt.llr, 3 * np.log(0.6 / 0.4) + np.log(0.4 / 0.6))
+
+
+def test_hypotheses_are_clipped_to_valid_rates():
+    sprt = SPRT.for_win_rate(0.99, margin=0.05)
+
+    assert sprt.p0 == pytest.approx(0.94)
+    assert sprt.p1 < 1
+
+
+@pytest.mark.parametrize("p0, p1, alpha, beta", [
+    (0.6, 0.5, 0.05, 0.05), (0, 0.5, 0.05, 0.05), (0.4, 0.6, 0, 0.05),
+    (0.4, 0.6, 0.05, 1)])
+def test_invalid_parameters_raise(p0, p1, alpha, beta):
+    with pytest.raises(ValueError):
+        SPRT(p0, p1, alpha, beta)
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from alphago.sum_tree import SumTree
+
+
+def test_total_and_values_follow_updates():
+    tree = SumTree(5)
+    tree.update([0, 2, 4], [1.0, 2.0, 3.0])
+    assert tree.total == 6
+    assert tree[[0, 1, 2, 3, 4]].tolist() == [1, 0, 2, 0, 3]
+
+    tree.update([2], [0.5])
+    assert tree.total == 4.5
+
+
+def test_repeated_indices_keep_the_last_value():
+    tree = SumTree(4)
+    tree.update([1, 1, 3], [5.0, 2.0, 1.0])
+    assert tree[1] == 2
+    assert tree.total == 3
+
+
+def test_find_returns_the_index_covering_each_value():
+    tree = SumTree(4)
+    tree.update([0, 1, 2, 3], [1.0, 0.0, 2.0, 1.0])
+    assert tree.find([0, 0.5, 1, 2.9, 3, 3.99]).tolist() == [0, 0, 2, 2, 3, 3]
+
+
+@pytest.mark.parametrize("capacity", [1, 2, 7, 64])
+def test_sampling_is_proportional_to_values(capacity):
+    values = np.arange(1, capacity + 1, dtype=float)
+    tree = SumTree(capacity)
+    tree.update(np.arange(capacity), values)
+
+    samples = tree.sample(50000, np.random.RandomState(0))
+    frequencies = np.bincount(samples, minlength=capacity) / len(samples)
+    assert np.allclose(frequencies, values / values.sum(), atol=0.01)
+
+
+def test_zero_values_are_never_sampled():
+    tree = SumTree(6)
+    tree.update([1, 4], [1.0, 1e-12])
+    assert set(tree.sample(1000, np.random.RandomState(0))) <= {1, 4}
+    assert tree.find([tree.total])[0] in {1, 4}
+
+
+def test_invalid_arguments_raise():
+    with pytest.raises(ValueError):
+        SumTree(0)
+    with pytest.raises(ValueError):
+        SumTree(3).update([0], [-1.0])
+    with pytest.raises(ValueError):
+        SumTree(3).sample(1)
@@ -0,0 +1,196 @@
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from alphago import training_state
+from alphago.replay_buffer import PrioritizedReplayBuffer, ReplayBuffer
+from alphago.training_state import (SnapshotWriter, capture_training_state,
+                                    load_training_state, restore_training_state,
+                                    save_training_state)
+
+
+class DictEstimator:
+    """An estimator whose weights are held in a dictionary, with an
+    optimiser slot that is only exposed with include_optimizer."""
+
+    def __init__(self, seed):
+        random_state = np.random.RandomState(seed)
+        self.weights = {'dense/kernel': random_state.randn(3, 2),
+                        'dense/bias': random_state.randn(2),
+                        'dense/kernel/Momentum': random_state.randn(3, 2)}
+        self.global_step = 0
+        self.weights_version = 0
+
+    def get_weights(self, include_optimizer=False):
+        return {name: value.copy() for name, value in self.weights.items()
+                if include_optimizer or 'Momentum' not in name}
+
+    def set_weights(self, weights):
+        for name, value in weights.items():
+            self.weights[name] = value.copy()
+        self.weights_version += 1
+
+
+def fill_buffer(replay_buffer, num_positions):
+    for i in range(num_positions):
+        replay_buffer.append(np.array([i, -i]), np.full(3, i / 3), (-1) ** i, i // 4)
+
+
+def take_snapshot(replay_buffer):
+    training, self_play = DictEstimator(0), DictEstimator(1)
+    training.global_step, training.weights_version = 7, 5
+    self_play.weights_version = 3
+    return capture_training_state(4, training, self_play, replay_buffer)
+
+
+def test_snapshot_round_trips_through_a_file(tmpdir):
+    replay_buffer = ReplayBuffer(8)
+    fill_buffer(replay_buffer, 11)
+    np.random.seed(1)
+    random.seed(2)
+    state = take_snapshot(replay_buffer)
+
+    path = str(tmpdir.join('snapshot.npz'))
+    save_training_state(state, path)
+    loaded = load_training_state(path)
+
+    assert loaded.alphago_step == 4
+    assert loaded.training_global_step == 7
+    assert loaded.training_weights_version == 5
+    assert loaded.self_play_weights_version == 3
+    assert set(loaded.training_weights) == set(state.training_weights)
+    assert 'dense/kernel/Momentum' not in loaded.self_play_weights
+    for name, value in state.training_weights.items():
+        assert np.array_equal(loaded.training_weights[name], value)
+    for name in ['states', 'probs', 'outcomes', 'weights_versions', 'policy_counts']:
+        assert np.array_equal(loaded.replay_buffer[name], state.replay_buffer[name])
+    assert loaded.replay_buffer['num_added'] == 11
+    assert loaded.python_random_state == state.python_random_state
+    assert np.array_equal(loaded.numpy_random_state[1], state.numpy_random_state[1])
+    assert not tmpdir.join('snapshot.npz.tmp').exists()
+
+
+def test_restored_run_continues_like_the_original(tmpdir):
+    replay_buffer = ReplayBuffer(8)
+    fill_buffer(replay_buffer, 11)
+    np.random.seed(1)
+    random.seed(2)
+    state = take_snapshot(replay_buffer)
+    path = str(tmpdir.join('snapshot.npz'))
+    save_training_state(state, path)
+
+    # Carry on the original run.
+    fill_buffer(replay_buffer, 3)
+    expected = (replay_buffer.sample(16), random.random())
+
+    training, self_play = DictEstimator(2), DictEstimator(3)
+    restored_buffer = ReplayBuffer(8)
+    assert restore_training_state(load_training_state(path), training, self_play,
+                                  restored_buffer) == 4
+    fill_buffer(restored_buffer, 3)
+    actual = (restored_buffer.sample(16), random.random())
+
+    for expected_array, actual_array in zip(expected[0], actual[0]):
+        assert np.array_equal(expected_array, actual_array)
+    assert expected[1] == actual[1]
+    assert restored_buffer.num_added == replay_buffer.num_added
+    assert np.array_equal(restored_buffer.weights_versions,
+                          replay_buffer.weights_versions)
+
+    assert training.global_step == 7
+    assert (training.weights_version, self_play.weights_version) == (5, 3)
+    for name, value in state.training_weights.items():
+        assert np.array_equal(training.weights[name], value)
+    # The self-play estimator keeps its own optimiser slots.
+    assert np.array_equal(self_play.weights['dense/kernel/Momentum'],
+                          DictEstimator(3).weights['dense/kernel/Momentum'])
+
+
+def test_snapshot_of_an_empty_buffer_is_restored(tmpdir):
+    state = take_snapshot(ReplayBuffer(8))
+    path = str(tmpdir.join('snapshot.npz'))
+    save_training_state(state, path)
+
+    replay_buffer = ReplayBuffer(8)
+    restore_training_state(load_training_state(path), DictEstimator(0),
+                           DictEstimator(1), replay_buffer)
+    assert len(replay_buffer) == 0
+    assert replay_buffer.states is None
+
+
+def test_restoring_into_a_buffer_of_another_capacity_raises():
+    state = take_snapshot(ReplayBuffer(8))
+    with pytest.raises(ValueError):
+        restore_training_state(state, DictEstimator(0), DictEstimator(1),
+                               ReplayBuffer(9))
+
+
+def test_snapshot_is_independent_of_later_changes():
+    replay_buffer = ReplayBuffer(8)
+    fill_buffer(replay_buffer, 4)
+    state = take_snapshot(replay_buffer)
+    fill_buffer(replay_buffer, 4)
+    assert state.replay_buffer['states'][4:].sum() == 0
+
+
+def test_writer_writes_in_a_background_thread(tmpdir, monkeypatch):
+    threads = []
+    save = training_state.save_training_state
+
+    def recording_save(state, path):
+        threads.append(threading.current_thread())
+        save(state, path)
+
+    monkeypatch.setattr(training_state, 'save_training_state', recording_save)
+    state = take_snapshot(ReplayBuffer(8))
+    with SnapshotWriter() as writer:
+        for i in range(3):
+            writer.write(state, str(tmpdir.join('snapshot{}.npz'.format(i))))
+    assert writer.num_written == 3
+    assert all(thread is not threading.current_thread() for thread in threads)
+    assert load_training_state(str(tmpdir.join('snapshot2.npz'))).alphago_step == 4
+
+
+def test_writer_reraises_errors(tmpdir):
+    state = take_snapshot(ReplayBuffer(8))
+    writer = SnapshotWriter()
+    writer.write(state, str(tmpdir.join('missing', 'snapshot.npz')))
+    with pytest.raises(OSError):
+        writer.wait()
+    writer.close()
+    with pytest.raises(ValueError):
+        writer.write(state, str(tmpdir.join('snapshot.npz')))
+
+
+def test_deduplicated_buffer_is_restored_with_counts(tmpdir):
+    replay_buffer = ReplayBuffer(8, deduplicate=True)
+    fill_buffer(replay_buffer, 3)
+    fill_buffer(replay_buffer, 2)
+    path = str(tmpdir.join('snapshot.npz'))
+    save_training_state(take_snapshot(replay_buffer), path)
+
+    restored = ReplayBuffer(8, deduplicate=True)
+    restore_training_state(load_training_state(path), DictEstimator(0),
+                           DictEstimator(1), restored)
+    assert restored.counts[:3].tolist() == [2, 2, 1]
+    fill_buffer(restored, 1)
+    assert len(restored) == 3
+    assert restored.num_occurrences == 6
+
+
+def test_prioritized_buffer_is_restored_with_priorities(tmpdir):
+    replay_buffer = PrioritizedReplayBuffer(8)
+    fill_buffer(replay_buffer, 3)
+    replay_buffer.update_priorities([0, 1, 2], [0.5, 2, 1])
+    path = str(tmpdir.join('snapshot.npz'))
+    save_training_state(take_snapshot(replay_buffer), path)
+
+    restored = PrioritizedReplayBuffer(8)
+    restore_training_state(load_training_state(path), DictEstimator(0),
+                           DictEstimator(1), restored)
+    assert np.array_equal(restored.priorities, replay_buffer.priorities)
+    assert restored.max_priority == replay_buffer.max_priority
+    assert np.array_equal(restored.sample_indices(50, np.random.RandomState(0)),
+                          replay_buffer.sample_indices(50, np.random.RandomState(0)))
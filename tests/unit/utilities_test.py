@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from alphago.utilities import LRUCache, memoize, memoize_instance
+
+
+def test_lru_cache_evicts_least_recently_used_entry():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert cache.info().evictions == 1
+    assert cache.info().currsize == 2
+
+
+def test_lru_cache_respects_byte_budget():
+    cache = LRUCache(maxsize=None, max_bytes=3000)
+    for i in range(10):
+        cache.put(i, np.zeros(100))
+
+    assert cache.info().nbytes <= 3000
+    assert 0 < len(cache) < 10
+    assert cache.info().evictions == 10 - len(cache)
+
+
+def test_lru_cache_raises_for_negative_maxsize():
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=-1)
+
+
+def test_memoize_counts_hits_and_misses():
+    calls = []
+
+    @memoize
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert [square(x) for x in (1, 2, 1, 1, 3)] == [1, 4, 1, 1, 9]
+    assert calls == [1, 2, 3]
+
+    info = square.cache_info()
+    assert (info.hits, info.misses, info.evictions, info.currsize) == (2, 3, 0, 3)
+
+
+def test_memoize_with_maxsize_is_bounded():
+    @memoize(maxsize=10)
+    def identity(x):
+        return x
+
+    for x in range(100):
+        identity(x)
+
+    info = identity.cache_info()
+    assert info.currsize == 10
+    assert info.evictions == 90
+    assert info.maxsize == 10
+
+
+def test_memoize_passes_through_unhashable_arguments():
+    @memoize
+    def total(values):
+        return sum(values)
+
+    assert total([1, 2, 3]) == 6
+    assert total([1, 2, 3]) == 6
+    assert total.cache_info().currsize == 0
+    assert total.cache_info().misses == 2
+
+
+def test_memoize_distinguishes_keyword_arguments():
+    @memoize
+    def power(x, exponent=2):
+        return x ** exponent
+
+    assert power(2) == 4
+    assert power(2, exponent=3) == 8
+    assert power(2, exponent=3) == 8
+    assert power.cache_info().hits == 1
+
+
+def test_memoize_instance_caches_each_method_separately():
+    class Counter:
+        def __init__(self):
+            self.calls = 0
+
+        def double(self, x):
+            self.calls += 1
+            return 2 * x
+
+        def triple(self, x):
+            self.calls += 1
+            return 3 * x
+
+    counter = Counter()
+    memoize_instance(counter, maxsize=5)
+    for _ in range(3):
+        assert counter.double(2) == 4
+        assert counter.triple(2) == 6
+
+    assert counter.calls == 2
+    assert counter.double.cache_info().hits == 2
+    assert counter.double.cache_info().maxsize == 5